@@ -1,147 +1,798 @@
-import json
+import os
+import time
+import uuid
+import atexit
 import logging
-from typing import Literal
-from collections.abc import Callable
+import functools
+import itertools
+import threading
+from typing import Any, Literal
+from pathlib import Path
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
 
 import pika
-import pika.exceptions
-from pika.exceptions import AMQPError, AMQPConnectionError
 
+from .dedup import SEQUENCE_HEADER, PRODUCER_ID_HEADER, Deduplicator
+from .spool import DiskSpool, SpoolDrainer, SpooledMessage, claim_spool
 from .types import (
     BookData,
+    UserData,
     AddBookMessage,
     LibraryMessage,
     BorrowedBookData,
     BorrowBookMessage,
     RemoveBookMessage,
     ReturnBookMessage,
+    RegisterUserMessage,
 )
+from .codecs import JSON_CONTENT_TYPE, Codec, DecodeError, require_codec
+from .metrics import (
+    TRACE_ID_HEADER,
+    PUBLISHED_AT_HEADER,
+    ConsumerMetrics,
+    QueueDepthSampler,
+    start_metrics_server,
+)
+from .retries import (
+    RETRY_COUNT_HEADER,
+    RetryPolicy,
+    PartialBatchError,
+    park,
+    retry_later,
+    parking_lot_name,
+    declare_retry_queues,
+)
+from .routing import (
+    EXCHANGE_NAME,
+    DEFAULT_BINDINGS,
+    Lane,
+    routing_key,
+    bulk_prefetch,
+    bulk_lane_name,
+    lane_routing_key,
+)
+from .workers import ParallelConsumer
+from .eventlog import EventLog, read_event_log
+from .envelopes import ENVELOPE_HEADER, ReceivedEvent, unpack
+from .publisher import AsyncPublisher, OverflowPolicy
+from .transports import Delivery, Transport, TransportError, transport_factory
 
 logger = logging.getLogger(__name__)
 
 QueueName = Literal['management', 'transaction']
 
 
+@dataclass
+class ThreadTransport:
+    """The transport a single thread publishes and consumes on."""
+
+    thread: threading.Thread
+    transport: Transport | None = None
+    last_used: float = 0
+
+
+def _using_transport(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Mark the calling thread's transport as used once `method` returns."""
+
+    @functools.wraps(method)
+    def wrapper(self: 'BookCourier', *args: Any, **kwargs: Any) -> Any:
+        thread_transport = self._thread_transport()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            thread_transport.last_used = time.monotonic()
+
+    return wrapper
+
+
 class BookCourier:
-    """A service for publishing and consuming book-related events via RabbitMQ."""
+    """A service for publishing and consuming book-related events.
 
-    def __init__(self, rabbitmq_url: str) -> None:
-        self.rabbitmq_url = rabbitmq_url
+    Events travel over the transport `url` selects, see `transports.transport_factory`, and are routed to
+    the queues whose `bindings` match them. Every thread gets its own transport, opened on first use.
+    Consumer callbacks signal failure by raising, and the event is then retried according to `retry_policy`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        # either hands events to an `AsyncPublisher`, which applies `overflow_policy` once it holds
+        # `max_pending_publishes` unsent events. RabbitMQ only.
+        publisher_confirms: bool = False,
+        background_publishing: bool = False,
+        max_pending_publishes: int = 10_000,
+        overflow_policy: OverflowPolicy = 'block',
+        # sent along with every message, so consumers decode each one with the codec it was produced with.
+        content_type: str = JSON_CONTENT_TYPE,
+        retry_policy: RetryPolicy | None = None,
+        # the routing keys each queue receives, see `routing`.
+        bindings: dict[QueueName, list[str]] | None = None,
+        # the most events `publish_many` packs into one message.
+        max_envelope_size: int = 100,
+        # transports idle this many seconds are serviced before their next use, and replaced if they were lost.
+        keepalive_interval: float | None = None,
+        # events published while the broker is unreachable are spooled here until it is back, see `spool`.
+        spool_directory: str | None = None,
+        # the share of a queue's prefetch given to its bulk lane, which `publish_many` publishes on.
+        bulk_prefetch_ratio: float = 0.2,
+        # events that took longer to propagate from publish to commit are logged with their trace id.
+        propagation_outlier_seconds: float = 5,
+        # consumers log the events they commit here, one `EventLog` per queue, for `replay_event_log`.
+        event_log_directory: str | None = None,
+    ) -> None:
+        if (publisher_confirms or background_publishing) and urlsplit(url).scheme not in ('amqp', 'amqps'):
+            msg = 'publisher confirms and background publishing are only available with RabbitMQ'
+            raise ValueError(msg)
+
+        self.url = url
+        self._open_transport = transport_factory(url)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = ConsumerMetrics(propagation_outlier_seconds=propagation_outlier_seconds)
+        self.codec: Codec = require_codec(content_type)
+        self.overflow_policy = overflow_policy
+        self.publisher_confirms = publisher_confirms
+        self.background_publishing = background_publishing
+        self.max_pending_publishes = max_pending_publishes
         self.queues: dict[QueueName, str] = {
             'management': 'bookcourier_management_events',
             'transaction': 'bookcourier_transaction_events',
         }
-        self.channel: pika.channel.Channel | None = None
-        self.connection: pika.BlockingConnection | None = None
+        self.bindings = bindings or DEFAULT_BINDINGS
+        self.max_envelope_size = max_envelope_size
+        self.keepalive_interval = keepalive_interval
+        self.spool_directory = spool_directory
+        self.bulk_prefetch_ratio = bulk_prefetch_ratio
+        self.event_log_directory = event_log_directory
+        self._reset_pool()
+
+    def _reset_pool(self) -> None:
+        """Forget every transport, including those inherited from a parent process.
+
+        A forked child also becomes a new producer, so its sequence numbers never collide with its parent's.
+        """
+        self._pid = os.getpid()
+        self._producer_id = uuid.uuid4().hex
+        self._last_sequence = 0
+        self._sequence_lock = threading.Lock()
+        self._connections_opened = 0
+        self._reconnects = 0
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._thread_transports: dict[int, ThreadTransport] = {}
+        self._publisher: AsyncPublisher | None = None
+        self._publisher_lock = threading.Lock()
+        self._spool: DiskSpool | None = None
+        self._spool_drainer: SpoolDrainer | None = None
+        self._spool_lock = threading.Lock()
+        self._event_logs: dict[str, EventLog] = {}
+        self._event_logs_lock = threading.Lock()
+
+    def _check_fork(self) -> None:
+        if self._pid != os.getpid():
+            logger.info('Process forked, discarding transports inherited from %d', self._pid)
+            self._reset_pool()
+
+    def _thread_transport(self) -> ThreadTransport:
+        """Return the calling thread's transport slot, starting afresh after a fork."""
+        self._check_fork()
+        thread_transport = getattr(self._local, 'thread_transport', None)
+        if thread_transport is None:
+            thread_transport = self._local.thread_transport = ThreadTransport(thread=threading.current_thread())
+            with self._pool_lock:
+                self._prune_pool()
+                self._thread_transports[threading.get_ident()] = thread_transport
+
+        return thread_transport
+
+    def _prune_pool(self) -> None:
+        """Close the transports of threads that have exited. Must be called with the pool lock held."""
+        for ident, thread_transport in list(self._thread_transports.items()):
+            if thread_transport.thread.is_alive():
+                continue
+
+            del self._thread_transports[ident]
+            if thread_transport.transport and thread_transport.transport.is_open:
+                thread_transport.transport.close()
+
+    @property
+    def transport(self) -> Transport | None:
+        """The calling thread's transport, if it has opened one."""
+        return self._thread_transport().transport
+
+    def pool_stats(self) -> dict[str, int]:
+        """Return a snapshot of the transports held by this process."""
+        self._check_fork()
+        with self._pool_lock:
+            self._prune_pool()
+            thread_transports = list(self._thread_transports.values())
+
+        publisher = self._publisher
+        return {
+            'pid': self._pid,
+            'threads': len(thread_transports),
+            'open_connections': sum(1 for tt in thread_transports if tt.transport and tt.transport.is_open),
+            'connections_opened': self._connections_opened,
+            'reconnects': self._reconnects,
+            'pending_publishes': publisher.pending if publisher else 0,
+            'unconfirmed_publishes': publisher.unconfirmed if publisher else 0,
+        }
+
+    def _ensure_transport(self) -> Transport:
+        """Return the calling thread's transport, opening it and declaring the queues if needed."""
+        thread_transport = self._thread_transport()
+        if thread_transport.transport is not None and self._is_idle(thread_transport):
+            self._keep_transport_alive(thread_transport)
+        if thread_transport.transport is not None and thread_transport.transport.is_open:
+            return thread_transport.transport
+
+        thread_transport.transport = self._open_declared_transport()
+        return thread_transport.transport
+
+    def _open_declared_transport(self) -> Transport:
+        transport = self._open_transport()
+        transport.declare_exchange(EXCHANGE_NAME)
+        for queue, queue_name in self.queues.items():
+            for lane, lane_queue_name in (('interactive', queue_name), ('bulk', bulk_lane_name(queue_name))):
+                transport.declare_queue(lane_queue_name)
+                declare_retry_queues(transport, lane_queue_name, self.retry_policy)
+                # publishers bind too, so that events published before a consumer first starts are kept.
+                for binding_key in self.bindings.get(queue, []):
+                    transport.bind_queue(lane_queue_name, EXCHANGE_NAME, lane_routing_key(binding_key, lane))
 
-    def _ensure_connection(self) -> None:
-        """Ensure a connection to RabbitMQ is established."""
-        if self.connection and self.connection.is_open:
-            return
+        with self._pool_lock:
+            self._connections_opened += 1
 
+        return transport
+
+    def _record_reconnect(self, reason: str) -> None:
+        with self._pool_lock:
+            self._reconnects += 1
+        self.metrics.reconnects.inc(reason=reason)
+
+    def _is_idle(self, thread_transport: ThreadTransport) -> bool:
+        return (
+            self.keepalive_interval is not None
+            and time.monotonic() - thread_transport.last_used >= self.keepalive_interval
+        )
+
+    def _keep_transport_alive(self, thread_transport: ThreadTransport) -> None:
+        """Service the calling thread's idle transport, or replace it if it was lost while idle.
+
+        Transports are not thread-safe, so each one is only ever serviced by the thread that uses it.
+        """
+        transport = thread_transport.transport
+        alive = transport.is_open
         try:
-            parameters = pika.URLParameters(self.rabbitmq_url)
-            self.connection = pika.BlockingConnection(parameters)
-            self.channel = self.connection.channel()
+            if alive:
+                transport.keepalive()
+        except TransportError:
+            logger.warning('Idle transport was lost', exc_info=True)
+            alive = False
+
+        if not alive:
+            logger.info('Reconnecting an idle transport')
+            thread_transport.transport = None
+            _close_quietly(transport)
+            thread_transport.transport = self._open_declared_transport()
+            self._record_reconnect('idle')
+
+    def close(self, timeout: float | None = 5) -> None:
+        """Close every pooled transport, giving pending publishes up to `timeout` seconds to settle.
+
+        Only call this once no other thread is using the courier.
+        """
+        if self._publisher is not None:
+            self._publisher.close(timeout)
+            self._publisher = None
+            atexit.unregister(self.close)
+        if self._spool is not None:
+            # whatever is still spooled stays on disk for the next process to claim the spool.
+            self._spool_drainer.stop(timeout)
+            self._spool.close()
+            self._spool, self._spool_drainer = None, None
+        with self._event_logs_lock:
+            for event_log in self._event_logs.values():
+                event_log.close()
+            self._event_logs = {}
+
+        with self._pool_lock:
+            thread_transports = list(self._thread_transports.values())
+
+        for thread_transport in thread_transports:
+            if thread_transport.transport and thread_transport.transport.is_open:
+                thread_transport.transport.close()
+            thread_transport.transport = None
+
+        logger.info('Transports closed')
+
+    def _get_publisher(self) -> AsyncPublisher:
+        """Return the background publisher, starting its I/O thread on first use.
+
+        Events still queued when the interpreter exits are flushed before it does.
+        """
+        self._check_fork()
+        with self._publisher_lock:
+            if self._publisher is None:
+                self._publisher = AsyncPublisher(
+                    self.url,
+                    queues=[name for queue in self.queues for name in self._lane_names(queue)],
+                    exchange=EXCHANGE_NAME,
+                    bindings={
+                        name: [lane_routing_key(key, lane) for key in keys]
+                        for queue, keys in self.bindings.items()
+                        for lane, name in zip(('interactive', 'bulk'), self._lane_names(queue), strict=True)
+                    },
+                    confirm=self.publisher_confirms,
+                    max_pending=self.max_pending_publishes,
+                    overflow=self.overflow_policy,
+                )
+                self._publisher.start()
+                atexit.register(self.close)
+
+            return self._publisher
 
-            for queue_name in self.queues.values():
-                self.channel.queue_declare(queue=queue_name, durable=True)
+    def _get_spool(self) -> DiskSpool:
+        """Return this process's spool, claiming it and starting its drainer on first use."""
+        self._check_fork()
+        with self._spool_lock:
+            if self._spool is None:
+                self._spool = claim_spool(self.spool_directory)
+                self._spool_drainer = SpoolDrainer(self._spool, self._open_declared_transport)
+                self._spool_drainer.start()
 
-            logger.info('Connected to RabbitMQ at %s', self.rabbitmq_url)
-        except AMQPConnectionError:
-            logger.exception('Failed to connect to RabbitMQ')
+            return self._spool
 
-    def close(self) -> None:
-        """Close the RabbitMQ connection if it's open."""
-        if self.connection and self.connection.is_open:
-            self.connection.close()
-            logger.info('RabbitMQ connection closed')
+    def _get_event_log(self, queue: QueueName) -> EventLog | None:
+        """Return the log the events consumed from `queue` are appended to, if there is one."""
+        if self.event_log_directory is None:
+            return None
 
-    def publish_book_added(self, book_data: BookData) -> None:
+        self._check_fork()
+        with self._event_logs_lock:
+            queue_name = self.queues[queue]
+            if queue_name not in self._event_logs:
+                self._event_logs[queue_name] = EventLog(Path(self.event_log_directory) / queue_name)
+            return self._event_logs[queue_name]
+
+    def publish_book_added(self, book_data: BookData) -> Future | None:
         """Publish an event when a new book is added to the catalogue."""
         message: AddBookMessage = {'event': 'book_added', 'book': book_data}
-        self._publish_event(message, 'management')
+        return self._publish_event(message)
 
-    def publish_book_removed(self, book_id: str) -> None:
+    def publish_book_removed(self, book_id: str) -> Future | None:
         """Publish an event when a book is removed from the catalogue."""
         message: RemoveBookMessage = {'event': 'book_removed', 'book_id': book_id}
-        self._publish_event(message, 'management')
+        return self._publish_event(message)
 
-    def publish_book_borrowed(self, borrowed_book_data: BorrowedBookData) -> None:
+    def publish_book_borrowed(self, borrowed_book_data: BorrowedBookData) -> Future | None:
         """Publish an event when a book is borrowed."""
         message: BorrowBookMessage = {'event': 'book_borrowed', 'borrowed_book': borrowed_book_data}
-        self._publish_event(message, 'transaction')
+        return self._publish_event(message)
 
-    def publish_book_returned(self, *, borrowed_book_id: str, actual_return_date: str) -> None:
+    def publish_book_returned(self, *, borrowed_book_id: str, actual_return_date: str) -> Future | None:
         """Publish an event when a book is returned."""
         message: ReturnBookMessage = {
             'event': 'book_returned',
             'borrowed_book_id': borrowed_book_id,
             'actual_return_date': actual_return_date,
         }
-        self._publish_event(message, 'transaction')
+        return self._publish_event(message)
+
+    def publish_user_registered(self, user_data: UserData) -> Future | None:
+        """Publish an event when a new user enrolls with the library."""
+        message: RegisterUserMessage = {'event': 'user_registered', 'user': user_data}
+        return self._publish_event(message)
+
+    def publish_many(self, events: Iterable[LibraryMessage], *, lane: Lane = 'bulk') -> list[Future]:
+        """Publish `events` on `lane`, packed into envelopes of up to `max_envelope_size` events each.
+
+        Bulk operations pay the per-message costs of encoding, publishing and logging once per envelope
+        instead of once per event. Consecutive events with the same routing key share an envelope, so
+        events keep their order, and consumers unpack envelopes and hand each event to their callback as
+        if it had been published on its own. In background mode the futures of the envelopes are returned.
+        """
+        futures = []
+        for key, group in itertools.groupby(
+            events, key=lambda event: lane_routing_key(routing_key(event['event']), lane)
+        ):
+            group_events = list(group)
+            for start in range(0, len(group_events), self.max_envelope_size):
+                future = self._publish(key, group_events[start : start + self.max_envelope_size])
+                if future is not None:
+                    futures.append(future)
+
+        return futures
+
+    def _publish_event(self, event: LibraryMessage) -> Future | None:
+        """Publish an event to the exchange, with the routing key of its type.
+
+        In background mode this does not wait for the broker: the returned future resolves once the
+        event has been written to the connection or, with publisher confirms, once the broker has taken
+        responsibility for it, and fails with `publisher.PublishError` otherwise.
+        """
+        return self._publish(routing_key(event['event']), [event])
+
+    @_using_transport
+    def _publish(self, key: str, events: list[LibraryMessage]) -> Future | None:
+        """Publish `events` as one message, in an envelope unless there is just one of them."""
+        body = self.codec.encode(events[0] if len(events) == 1 else events)
+        properties = self._message_properties(len(events))
+        if self.background_publishing or self.publisher_confirms:
+            future = self._get_publisher().publish(key, body, properties)
+            future.add_done_callback(lambda future: _log_published(key, events, future.exception()))
+            return future
+
+        if self.spool_directory is not None:
+            self._publish_or_spool(key, events, body, properties)
+            return None
 
-    def _publish_event(self, event: LibraryMessage, queue: QueueName) -> None:
-        """Publish an event to the specified RabbitMQ queue."""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                self._ensure_connection()
-                if not self.channel or not self.channel.is_open:
-                    raise AMQPError('Channel is not open')  # noqa: TRY301, TRY003, EM101
-
-                self.channel.basic_publish(
-                    exchange='',
-                    routing_key=self.queues[queue],
-                    body=json.dumps(event),
-                    properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE),
-                )
-                logger.info('Published event to %s: %s', self.queues[queue], event)
-                return  # noqa: TRY300
-            except (AMQPError, pika.exceptions.StreamLostError):
+                self._ensure_transport().publish(key, body, properties, exchange=EXCHANGE_NAME)
+                _log_published(key, events)
+                return None  # noqa: TRY300
+            except TransportError:
                 logger.warning('Failed to publish event. Attempt %d of %d', attempt + 1, max_retries)
                 if attempt < max_retries - 1:
-                    self._reset_connection()
+                    self._reset_transport()
+                    self._record_reconnect('publish_failed')
                 else:
                     logger.exception('Failed to publish event after %d attempts', max_retries)
                     raise
 
-    def _reset_connection(self) -> None:
-        """Reset the connection and channel."""
-        if self.connection:
-            try:
-                if self.connection.is_open:
-                    self.connection.close()
-            except Exception:
-                logger.exception('Error while closing connection')
-        self.connection = None
-        self.channel = None
-
-    def consume_events(self, *, queue: QueueName, callback: Callable[[LibraryMessage], None]) -> None:
-        """Consume events from the specified RabbitMQ queue."""
-        self._ensure_connection()
-
-        def event_handler(
-            ch: pika.channel.Channel,
-            method: pika.spec.Basic.Deliver,
-            properties: pika.spec.BasicProperties,  # noqa: ARG001
-            body: bytes,
-        ) -> None:
+        return None
+
+    def _publish_or_spool(
+        self, key: str, events: list[LibraryMessage], body: bytes, properties: pika.BasicProperties
+    ) -> None:
+        """Publish a message, or spool it if the broker is unreachable or earlier messages are still spooled."""
+        spool = self._get_spool()
+        if not spool.pending:
             try:
-                event: LibraryMessage = json.loads(body)
-                callback(event)
-            except json.JSONDecodeError:
-                logger.exception('Failed to decode event')
-            finally:
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self._ensure_transport().publish(key, body, properties, exchange=EXCHANGE_NAME)
+            except TransportError:
+                logger.warning('Failed to publish event, spooling it until the broker is back', exc_info=True)
+                self._reset_transport()
+            else:
+                _log_published(key, events)
+                return
+
+        spool.append(SpooledMessage(EXCHANGE_NAME, key, properties, body))
+        logger.info('Spooled %d %s event(s)', len(events), key)
 
+    def _message_properties(self, event_count: int = 1) -> pika.BasicProperties:
+        """Return the properties of a message carrying `event_count` events, one sequence number each."""
+        with self._sequence_lock:
+            sequence = self._last_sequence + 1
+            self._last_sequence += event_count
+
+        now = time.time()
+        headers = {
+            PRODUCER_ID_HEADER: self._producer_id,
+            SEQUENCE_HEADER: sequence,
+            PUBLISHED_AT_HEADER: int(now * 1000),
+            TRACE_ID_HEADER: uuid.uuid4().hex,
+        }
+        if event_count > 1:
+            headers[ENVELOPE_HEADER] = event_count
+        return pika.BasicProperties(
+            content_type=self.codec.content_type,
+            delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+            message_id=f'{self._producer_id}:{sequence}',
+            timestamp=int(now),
+            headers=headers,
+        )
+
+    def _reset_transport(self) -> None:
+        """Close the calling thread's transport so the next use opens a new one."""
+        thread_transport = self._thread_transport()
+        if thread_transport.transport:
+            _close_quietly(thread_transport.transport)
+        thread_transport.transport = None
+
+    @_using_transport
+    def consume_events(
+        self,
+        *,
+        queue: QueueName,
+        callback: Callable[[LibraryMessage], None],
+        deduplicator: Deduplicator | None = None,
+    ) -> None:
+        """Consume events from the specified queue, skipping those `deduplicator` has seen."""
+        transport = self._ensure_transport()
         queue_name = self.queues[queue]
-        self.channel.basic_qos(prefetch_count=1)
-        self.channel.basic_consume(queue=queue_name, on_message_callback=event_handler)
+        event_log = self._get_event_log(queue)
+        self._subscribe(transport, queue, prefetch_count=1)
 
         logger.info('Waiting for events on %s. To exit press CTRL+C', queue_name)
         try:
-            self.channel.start_consuming()
+            while True:
+                for delivery in transport.receive(max_messages=1, timeout=None):
+                    self._process_event(transport, delivery, callback, deduplicator, event_log=event_log)
         except KeyboardInterrupt:
-            self.channel.stop_consuming()
+            transport.cancel()
             logger.info('Stopped consuming events from %s', queue_name)
+
+    def _lane_names(self, queue: QueueName) -> list[str]:
+        """Return the names of the interactive and bulk lanes of `queue`."""
+        return [self.queues[queue], bulk_lane_name(self.queues[queue])]
+
+    def _subscribe(self, transport: Transport, queue: QueueName, *, prefetch_count: int) -> None:
+        """Subscribe to both lanes of `queue`, the bulk one with its share of `prefetch_count`."""
+        interactive, bulk = self._lane_names(queue)
+        transport.subscribe(interactive, prefetch_count=prefetch_count)
+        transport.subscribe(bulk, prefetch_count=bulk_prefetch(prefetch_count, self.bulk_prefetch_ratio))
+
+    def _process_event(
+        self,
+        transport: Transport,
+        delivery: Delivery,
+        callback: Callable[[LibraryMessage], None],
+        deduplicator: Deduplicator | None,
+        *,
+        event_log: EventLog | None = None,
+    ) -> None:
+        queue_name = delivery.queue_name
+        try:
+            received = unpack(delivery)
+        except DecodeError as e:
+            logger.exception('Failed to decode event')
+            park(transport, queue_name=queue_name, properties=delivery.properties, body=delivery.body, error=e)
+            self.metrics.record_outcome(queue_name, None, outcome='undecodable')
+            received = []
+
+        for item in received:
+            try:
+                with self.metrics.track(queue_name, item.event, item.properties) as tracked:
+                    if deduplicator is None:
+                        callback(item.event)
+                    else:
+                        tracked.applied = not deduplicator.process(
+                            [(item.properties, item.event)], lambda events: callback(events[0])
+                        )
+            except Exception as e:
+                logger.exception('Failed to process event from %s', queue_name)
+                retry_later(
+                    transport,
+                    queue_name=queue_name,
+                    policy=self.retry_policy,
+                    properties=item.properties,
+                    body=item.body,
+                    error=e,
+                )
+            else:
+                if event_log is not None and tracked.applied:
+                    event_log.append(item.event)
+
+        transport.ack(delivery.delivery_tag)
+
+    @_using_transport
+    def consume_batches(
+        self,
+        *,
+        queue: QueueName,
+        callback: Callable[[list[LibraryMessage]], None],
+        batch_size: int = 100,
+        max_wait: float = 0.2,
+        prefetch_count: int | None = None,
+        deduplicator: Deduplicator | None = None,
+    ) -> None:
+        """Consume events from the specified queue in batches.
+
+        `callback` receives the events of up to `batch_size` messages, or of whatever arrived within
+        `max_wait` seconds of the first one, and the whole batch is then acknowledged with a single
+        `multiple` ack. Envelopes are unpacked, so a batch may hold more than `batch_size` events.
+        If `callback` raises `PartialBatchError`, only the events it names are retried, any other
+        error retries the whole batch.
+        """
+        transport = self._ensure_transport()
+        queue_name = self.queues[queue]
+        event_log = self._get_event_log(queue)
+        self._subscribe(transport, queue, prefetch_count=prefetch_count or batch_size)
+
+        logger.info('Waiting for batches of events on %s. To exit press CTRL+C', queue_name)
+        try:
+            while True:
+                batch = self._fill_batch(transport, batch_size=batch_size, max_wait=max_wait)
+                self._process_batch(transport, queue_name, batch, callback, deduplicator, event_log=event_log)
+        except KeyboardInterrupt:
+            transport.cancel()
+            logger.info('Stopped consuming events from %s', queue_name)
+
+    def _fill_batch(self, transport: Transport, *, batch_size: int, max_wait: float) -> list[Delivery]:
+        """Wait for deliveries until there are `batch_size` of them or `max_wait` has passed since the first."""
+        batch = transport.receive(max_messages=batch_size, timeout=None)
+        deadline = time.monotonic() + max_wait
+        while len(batch) < batch_size and (remaining := deadline - time.monotonic()) > 0:
+            batch += transport.receive(max_messages=batch_size - len(batch), timeout=remaining)
+
+        return batch
+
+    def _process_batch(
+        self,
+        transport: Transport,
+        queue_name: str,
+        batch: list[Delivery],
+        callback: Callable[[list[LibraryMessage]], None],
+        deduplicator: Deduplicator | None,
+        *,
+        event_log: EventLog | None = None,
+    ) -> None:
+        decoded: list[ReceivedEvent] = []
+        for delivery in batch:
+            try:
+                decoded += unpack(delivery)
+            except DecodeError as e:
+                logger.exception('Failed to decode event')
+                park(
+                    transport,
+                    queue_name=delivery.queue_name,
+                    properties=delivery.properties,
+                    body=delivery.body,
+                    error=e,
+                )
+                self.metrics.record_outcome(delivery.queue_name, None, outcome='undecodable')
+
+        for item in decoded:
+            self.metrics.record_received(item.delivery.queue_name, item.event, item.properties)
+
+        failures: dict[int, Exception] = {}
+        skipped: set[int] = set()
+        started = time.perf_counter()
+        try:
+            if decoded and deduplicator is None:
+                callback([item.event for item in decoded])
+            elif decoded:
+                skipped = deduplicator.process([(item.properties, item.event) for item in decoded], callback)
+        except PartialBatchError as e:
+            failures, skipped = e.failures, e.skipped
+        except Exception as e:
+            logger.exception('Failed to process batch of %d events from %s', len(decoded), queue_name)
+            failures = dict.fromkeys(range(len(decoded)), e)
+
+        if decoded:
+            self.metrics.batch_handling_seconds.observe(time.perf_counter() - started, queue=queue_name)
+        for index, item in enumerate(decoded):
+            outcome = 'failed' if index in failures else 'duplicate' if index in skipped else 'processed'
+            self.metrics.record_outcome(item.delivery.queue_name, item.event, outcome=outcome)
+            if outcome == 'processed':
+                self.metrics.record_committed(item.delivery.queue_name, item.event, item.properties)
+                if event_log is not None:
+                    event_log.append(item.event)
+
+        for index, error in failures.items():
+            retry_later(
+                transport,
+                queue_name=decoded[index].delivery.queue_name,
+                policy=self.retry_policy,
+                properties=decoded[index].properties,
+                body=decoded[index].body,
+                error=error,
+            )
+
+        transport.ack(batch[-1].delivery_tag, multiple=True)
+
+    @_using_transport
+    def consume_parallel(
+        self,
+        *,
+        queue: QueueName,
+        callback: Callable[[LibraryMessage], None],
+        workers: int,
+        prefetch_per_worker: int = 10,
+        drain_timeout: float = 30,
+        deduplicator: Deduplicator | None = None,
+    ) -> None:
+        """Consume events from the specified queue on `workers` threads, keeping per-key ordering."""
+        ParallelConsumer(
+            transport=self._ensure_transport(),
+            queue_name=self.queues[queue],
+            bulk_queue_name=bulk_lane_name(self.queues[queue]),
+            bulk_prefetch_ratio=self.bulk_prefetch_ratio,
+            callback=callback,
+            workers=workers,
+            retry_policy=self.retry_policy,
+            deduplicator=deduplicator,
+            metrics=self.metrics,
+            event_log=self._get_event_log(queue),
+            prefetch_per_worker=prefetch_per_worker,
+            drain_timeout=drain_timeout,
+        ).run()
+        logger.info('Stopped consuming events from %s', self.queues[queue])
+
+    def serve_metrics(
+        self, *, port: int, host: str = '', queues: list[QueueName] | None = None, depth_interval: float = 15
+    ) -> None:
+        """Serve consumer metrics at `http://<host>:<port>/metrics` from a background thread.
+
+        The depths of `queues` and their parking lots, all queues by default, are sampled every
+        `depth_interval` seconds over a transport of their own.
+        """
+        queue_names = [name for queue in queues or self.queues for name in self._lane_names(queue)]
+        QueueDepthSampler(
+            self.metrics,
+            self._open_transport,
+            [name for queue_name in queue_names for name in (queue_name, parking_lot_name(queue_name))],
+            interval=depth_interval,
+        ).start()
+        start_metrics_server(self.metrics, port=port, host=host)
+
+    @_using_transport
+    def replay_parked_events(self, *, queue: QueueName, limit: int | None = None) -> int:
+        """Move up to `limit` events from the queue's parking lots back onto their lanes, with fresh retries.
+
+        Returns the number of events replayed.
+        """
+        transport = self._ensure_transport()
+
+        replayed = 0
+        for queue_name in self._lane_names(queue):
+            lane_replayed = 0
+            while limit is None or replayed < limit:
+                delivery = transport.get(parking_lot_name(queue_name))
+                if delivery is None:
+                    break
+
+                headers = dict(delivery.properties.headers or {})
+                headers.pop(RETRY_COUNT_HEADER, None)
+                delivery.properties.headers = headers
+                transport.publish(queue_name, delivery.body, delivery.properties)
+                transport.ack(delivery.delivery_tag)
+                lane_replayed += 1
+                replayed += 1
+
+            logger.info('Replayed %d parked events onto %s', lane_replayed, queue_name)
+
+        return replayed
+
+    def replay_event_log(
+        self,
+        *,
+        queue: QueueName,
+        callback: Callable[[list[LibraryMessage]], None],
+        batch_size: int = 5000,
+        start: int = 1,
+    ) -> int:
+        """Pass the events logged for `queue`, from sequence number `start` on, to `callback` in batches.
+
+        Nothing is consumed or published, so this only rebuilds what `callback` writes. If `callback` raises,
+        the replay stops and the sequence number to resume from is logged. Returns the number of events replayed.
+        """
+        if self.event_log_directory is None:
+            msg = 'replaying needs an event_log_directory'
+            raise ValueError(msg)
+
+        replayed = 0
+        directory = Path(self.event_log_directory) / self.queues[queue]
+        for batch in read_event_log(directory, start=start, batch_size=batch_size):
+            try:
+                callback([logged.event for logged in batch])
+            except Exception:
+                logger.exception('Replay of %s failed, resume it from sequence %d', directory, batch[0].sequence)
+                raise
+
+            replayed += len(batch)
+            logger.info('Replayed %d events from %s, up to sequence %d', replayed, directory, batch[-1].sequence)
+
+        return replayed
+
+
+def _close_quietly(transport: Transport) -> None:
+    try:
+        transport.close()
+    except Exception:
+        logger.exception('Error while closing transport')
+
+
+def _log_published(key: str, events: list[LibraryMessage], error: BaseException | None = None) -> None:
+    if error is not None:
+        logger.error('Failed to publish %d events as %s', len(events), key, exc_info=error)
+    elif len(events) == 1:
+        logger.info('Published event as %s: %s', key, events[0])
+    else:
+        logger.info('Published an envelope of %d events as %s', len(events), key)
@@ -0,0 +1,78 @@
+"""Measures the cost of encoding and decoding one event with each available codec.
+
+The `json (dict)` row is the original wire path: `json.dumps` on publish, and `json.loads` followed by
+the `.get()` lookups the consumers used to make. Every other row decodes into the validated event structs.
+
+    python -m bookcourier.benchmarks.codecs [--number 20000]
+"""
+
+import sys
+import json
+import timeit
+import argparse
+
+from bookcourier.codecs import CODECS, JSONCodec
+from bookcourier.events import parse_event
+
+MESSAGE = {
+    'event': 'book_borrowed',
+    'borrowed_book': {
+        'id': 'borrowed_2hH9sbuWbBvUPCHwEXCm5LK',
+        'book_id': 'book_Lj5qnX5FM3h7cbMDHnJjVr',
+        'user_id': 'user_oFcFEJaXSFXeaNVa3Ltf4x',
+        'created_at': '2024-09-01T10:00:00.123456+00:00',
+        'updated_at': '2024-09-01T10:00:00.123456+00:00',
+        'proposed_return_date': '2024-09-15T10:00:00.123456+00:00',
+    },
+}
+
+
+def read_dict(body: bytes) -> None:
+    event = json.loads(body)
+    data = event.get('borrowed_book')
+    for field in ('id', 'book_id', 'user_id', 'created_at', 'updated_at', 'proposed_return_date'):
+        data.get(field)
+
+
+def measure(number: int) -> list[tuple[str, int, float, float]]:
+    legacy_body = json.dumps(MESSAGE).encode()
+    rows = [
+        (
+            'json (dict)',
+            len(legacy_body),
+            timeit.timeit(lambda: json.dumps(MESSAGE), number=number),
+            timeit.timeit(lambda: read_dict(legacy_body), number=number),
+        )
+    ]
+
+    codecs = {'json (struct)': JSONCodec()} | {
+        f'{type(codec).__name__} (struct)': codec for codec in CODECS.values() if not isinstance(codec, JSONCodec)
+    }
+    for name, codec in codecs.items():
+        body = codec.encode(MESSAGE)
+        rows.append(
+            (
+                name,
+                len(body),
+                timeit.timeit(lambda codec=codec: codec.encode(MESSAGE), number=number),
+                timeit.timeit(lambda codec=codec, body=body: parse_event(codec.decode(body)), number=number),
+            )
+        )
+
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20_000, help='Events to encode and decode per codec')
+    args = parser.parse_args()
+
+    sys.stdout.write(f'{"codec":<24}{"bytes":>8}{"encode µs":>12}{"decode µs":>12}\n')
+    for name, size, encode_seconds, decode_seconds in measure(args.number):
+        encode_us = encode_seconds / args.number * 1e6
+        decode_us = decode_seconds / args.number * 1e6
+        sys.stdout.write(f'{name:<24}{size:>8}{encode_us:>12.2f}{decode_us:>12.2f}\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import json
+from typing import Any, Protocol
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+
+class DecodeError(ValueError):
+    """Raised when a message body cannot be decoded with the codec its content type names."""
+
+
+class Codec(Protocol):
+    content_type: str
+
+    def encode(self, message: Any) -> bytes: ...
+
+    def decode(self, body: bytes) -> Any: ...
+
+
+class JSONCodec:
+    """The standard library JSON codec, used whenever a faster one is not installed."""
+
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, message: Any) -> bytes:
+        return json.dumps(message, separators=(',', ':')).encode()
+
+    def decode(self, body: bytes) -> Any:
+        return json.loads(body)
+
+
+class OrjsonCodec:
+    """JSON through orjson, which produces the same wire format several times faster."""
+
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, message: Any) -> bytes:
+        return orjson.dumps(message)
+
+    def decode(self, body: bytes) -> Any:
+        return orjson.loads(body)
+
+
+class MsgpackCodec:
+    """A compact binary encoding of the same message structure."""
+
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, message: Any) -> bytes:
+        return msgpack.packb(message)
+
+    def decode(self, body: bytes) -> Any:
+        return msgpack.unpackb(body)
+
+
+# codecs whose library is not installed are left out, JSON is always available.
+CODECS: dict[str, Codec] = {JSON_CONTENT_TYPE: OrjsonCodec() if orjson else JSONCodec()}
+if msgpack:
+    CODECS[MSGPACK_CONTENT_TYPE] = MsgpackCodec()
+
+# the package each optional codec needs, installed by the bookcourier extra of the same name.
+CODEC_PACKAGES = {MSGPACK_CONTENT_TYPE: 'msgpack'}
+
+
+def require_codec(content_type: str) -> Codec:
+    """Return the codec for `content_type`, failing with the package to install if its library is missing."""
+    codec = CODECS.get(content_type)
+    if codec is not None:
+        return codec
+
+    package = CODEC_PACKAGES.get(content_type)
+    if package is None:
+        msg = f'no codec is available for content type {content_type!r}'
+        raise ValueError(msg)
+
+    msg = f'content type {content_type!r} needs the {package} package, install bookcourier[{package}]'
+    raise ModuleNotFoundError(msg, name=package)
+
+
+def get_codec(content_type: str | None) -> Codec:
+    """Return the codec for `content_type`. Messages without one predate codecs and are JSON."""
+    try:
+        return require_codec(content_type or JSON_CONTENT_TYPE)
+    except (ValueError, ImportError) as e:
+        raise DecodeError(str(e)) from None
+
+
+def decode(body: bytes, content_type: str | None) -> Any:
+    try:
+        return get_codec(content_type).decode(body)
+    except DecodeError:
+        raise
+    except ValueError as e:
+        msg = f'message body is not valid {content_type or JSON_CONTENT_TYPE}'
+        raise DecodeError(msg) from e
@@ -0,0 +1,195 @@
+import time
+import logging
+import threading
+from typing import TypeVar, Protocol
+from contextlib import AbstractContextManager
+from collections import OrderedDict
+from dataclasses import field, dataclass
+from collections.abc import Callable
+
+import pika
+
+from .metrics import PUBLISHED_AT_HEADER
+from .retries import PartialBatchError
+
+logger = logging.getLogger(__name__)
+
+PRODUCER_ID_HEADER = 'x-producer-id'
+SEQUENCE_HEADER = 'x-sequence'
+
+T = TypeVar('T')
+
+
+@dataclass(slots=True)
+class _ProducerRange:
+    start: int
+    end: int
+    ahead: set[int] = field(default_factory=set)
+
+
+class SequenceWindow:
+    """Remembers which sequence numbers of recently seen producers have been processed.
+
+    A producer's sequences are kept as one contiguous range plus the few that arrived ahead of it, so the
+    window costs a handful of integers per producer however many of its events were seen. At most
+    `max_producers` producers and `max_ahead` out-of-order sequences per producer are kept. Forgetting is
+    always safe, a sequence missing from the window is checked against the store instead.
+    """
+
+    def __init__(self, *, max_producers: int = 1024, max_ahead: int = 1024) -> None:
+        self.max_ahead = max_ahead
+        self.max_producers = max_producers
+        self._producers: OrderedDict[str, _ProducerRange] = OrderedDict()
+
+    def __contains__(self, key: tuple[str, int]) -> bool:
+        producer_id, sequence = key
+        sequences = self._producers.get(producer_id)
+        if sequences is None:
+            return False
+
+        return sequences.start <= sequence <= sequences.end or sequence in sequences.ahead
+
+    def add(self, producer_id: str, sequence: int) -> None:
+        sequences = self._producers.get(producer_id)
+        if sequences is None:
+            self._producers[producer_id] = _ProducerRange(start=sequence, end=sequence)
+            if len(self._producers) > self.max_producers:
+                self._producers.popitem(last=False)
+            return
+
+        self._producers.move_to_end(producer_id)
+        if sequence == sequences.start - 1:
+            sequences.start = sequence
+        elif sequence == sequences.end + 1:
+            sequences.end = sequence
+            while sequences.end + 1 in sequences.ahead:
+                sequences.end += 1
+                sequences.ahead.remove(sequences.end)
+        elif sequence > sequences.end:
+            sequences.ahead.add(sequence)
+            if len(sequences.ahead) > self.max_ahead:
+                sequences.ahead.pop()
+
+
+class DeduplicationStore(Protocol):
+    """Durable record of processed message ids, shared by every consumer of a queue."""
+
+    def atomic(self) -> AbstractContextManager:
+        """Return the transaction that both the claimed ids and the events' changes are written in."""
+
+    def claim(self, message_ids: list[str]) -> set[str]:
+        """Record `message_ids` as processed and return the ones that already were."""
+
+    def release(self, message_ids: list[str]) -> None:
+        """Forget `message_ids`, whose events failed and will be delivered again."""
+
+    def purge(self, older_than: float) -> int:
+        """Delete ids recorded more than `older_than` seconds ago and return how many were deleted."""
+
+
+class Deduplicator:
+    """Skips events that have already been processed, so redeliveries are harmless.
+
+    Recently processed events are recognised from their producer and sequence number without touching the
+    store. Every other event's id is claimed in `store` within the same transaction as the changes the
+    callback makes, so an event is either applied and recorded, or neither. Events without an id were
+    published before ids existed and are always processed. Ids older than `ttl` seconds are purged at
+    most every `purge_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        store: DeduplicationStore,
+        *,
+        ttl: float = 7 * 24 * 60 * 60,
+        purge_interval: float = 60 * 60,
+        window: SequenceWindow | None = None,
+        # events published before this time are in the snapshot the consumer was loaded from, see `snapshots`.
+        applied_before: float | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.store = store
+        self.purge_interval = purge_interval
+        self.window = window or SequenceWindow()
+        self.applied_before = applied_before
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def process(self, messages: list[tuple[pika.BasicProperties, T]], callback: Callable[[list[T]], None]) -> set[int]:
+        """Call `callback` with the events of `messages` that have not been processed yet.
+
+        Returns the indexes of the events skipped as already processed, which `callback` never saw.
+        `PartialBatchError` raised by `callback` is re-raised with indexes into `messages`, and with the
+        skipped indexes as its `skipped`.
+        """
+        with self._lock:
+            fresh = [
+                index
+                for index, (properties, _) in enumerate(messages)
+                if not self._seen_recently(properties) and not self._in_snapshot(properties)
+            ]
+
+        # the first copy of each id is claimed, a redelivered event can share a batch with its original.
+        first_copies: dict[str, int] = {}
+        for index in fresh:
+            if (message_id := messages[index][0].message_id) is not None:
+                first_copies.setdefault(message_id, index)
+
+        failures: dict[int, Exception] = {}
+        with self.store.atomic():
+            seen = self.store.claim(list(first_copies)) if first_copies else set()
+            indexes = []
+            for index in fresh:
+                message_id = messages[index][0].message_id
+                if message_id is None or (message_id not in seen and first_copies[message_id] == index):
+                    indexes.append(index)
+
+            if len(indexes) < len(messages):
+                logger.info('Skipping %d already processed events', len(messages) - len(indexes))
+
+            try:
+                if indexes:
+                    callback([messages[index][1] for index in indexes])
+            except PartialBatchError as e:
+                failures = {indexes[index]: error for index, error in e.failures.items()}
+                failed_ids = [messages[index][0].message_id for index in failures]
+                self.store.release([message_id for message_id in failed_ids if message_id is not None])
+
+        skipped = set(range(len(messages))).difference(indexes)
+        failed = {_sequence(messages[index][0]) for index in failures}
+        with self._lock:
+            for properties, _ in messages:
+                if (sequence := _sequence(properties)) is not None and sequence not in failed:
+                    self.window.add(*sequence)
+
+        self._purge_if_due()
+        if failures:
+            raise PartialBatchError(failures, skipped=skipped)
+        return skipped
+
+    def _seen_recently(self, properties: pika.BasicProperties) -> bool:
+        sequence = _sequence(properties)
+        return sequence is not None and sequence in self.window
+
+    def _in_snapshot(self, properties: pika.BasicProperties) -> bool:
+        published_at = (properties.headers or {}).get(PUBLISHED_AT_HEADER)
+        return (
+            self.applied_before is not None and published_at is not None and published_at < self.applied_before * 1000
+        )
+
+    def _purge_if_due(self) -> None:
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+
+        self._last_purge = time.monotonic()
+        purged = self.store.purge(self.ttl)
+        logger.info('Purged %d processed event ids older than %ss', purged, self.ttl)
+
+
+def _sequence(properties: pika.BasicProperties) -> tuple[str, int] | None:
+    headers = properties.headers or {}
+    producer_id, sequence = headers.get(PRODUCER_ID_HEADER), headers.get(SEQUENCE_HEADER)
+    if producer_id is None or sequence is None:
+        return None
+
+    return producer_id, sequence
@@ -0,0 +1,62 @@
+import copy
+from dataclasses import dataclass
+
+import pika
+
+from .dedup import SEQUENCE_HEADER, PRODUCER_ID_HEADER
+from .types import LibraryMessage
+from .codecs import DecodeError, decode, get_codec
+from .transports import Delivery
+
+ENVELOPE_HEADER = 'x-envelope-size'
+
+
+@dataclass(slots=True)
+class ReceivedEvent:
+    """One event taken from a delivery, which carries either just this event or an envelope of them.
+
+    Events unpacked from an envelope get properties of their own, with the sequence number the producer
+    reserved for them, so each one is deduplicated and retried on its own.
+    """
+
+    delivery: Delivery
+    properties: pika.BasicProperties
+    event: LibraryMessage
+    enveloped: bool = False
+
+    @property
+    def body(self) -> bytes:
+        """The body to retry this event with, re-encoded on its own if it came in an envelope."""
+        if not self.enveloped:
+            return self.delivery.body
+
+        return get_codec(self.properties.content_type).encode(self.event)
+
+
+def unpack(delivery: Delivery) -> list[ReceivedEvent]:
+    """Decode the events carried by `delivery`, raising `DecodeError` if its body is not a valid message."""
+    properties = delivery.properties
+    message = decode(delivery.body, properties.content_type)
+    headers = properties.headers or {}
+    if ENVELOPE_HEADER not in headers:
+        return [ReceivedEvent(delivery, properties, message)]
+
+    if not isinstance(message, list) or len(message) != headers[ENVELOPE_HEADER]:
+        msg = f'envelope does not hold the {headers[ENVELOPE_HEADER]} events it declares'
+        raise DecodeError(msg)
+
+    return [
+        ReceivedEvent(delivery, _event_properties(properties, index), event, enveloped=True)
+        for index, event in enumerate(message)
+    ]
+
+
+def _event_properties(properties: pika.BasicProperties, index: int) -> pika.BasicProperties:
+    headers = dict(properties.headers)
+    del headers[ENVELOPE_HEADER]
+    event_properties = copy.copy(properties)
+    event_properties.headers = headers
+    if SEQUENCE_HEADER in headers and PRODUCER_ID_HEADER in headers:
+        headers[SEQUENCE_HEADER] += index
+        event_properties.message_id = f'{headers[PRODUCER_ID_HEADER]}:{headers[SEQUENCE_HEADER]}'
+    return event_properties
@@ -0,0 +1,231 @@
+import os
+import time
+import zlib
+import fcntl
+import bisect
+import struct
+import logging
+import threading
+from typing import IO
+from pathlib import Path
+from dataclasses import dataclass
+from collections.abc import Iterator
+
+from .types import LibraryMessage
+from .codecs import JSON_CONTENT_TYPE, get_codec
+
+logger = logging.getLogger(__name__)
+
+# every record is its length, the CRC32 of its sequence number and event, its sequence number, then the event.
+_RECORD_HEADER = struct.Struct('>IIQ')
+
+# every index entry is the sequence number of a record and its offset within the segment.
+_INDEX_ENTRY = struct.Struct('>QQ')
+
+LOCK_FILE_NAME = 'lock'
+
+SEGMENT_SUFFIX = '.log'
+
+INDEX_SUFFIX = '.index'
+
+# events are logged as JSON whatever they were published as, so a log outlives changes of content type.
+_CODEC = get_codec(JSON_CONTENT_TYPE)
+
+
+class EventLogInUseError(Exception):
+    """Raised when opening an event log another process is appending to."""
+
+
+@dataclass(slots=True)
+class LoggedEvent:
+    sequence: int
+    event: LibraryMessage
+
+
+def _encode(sequence: int, event: LibraryMessage) -> bytes:
+    body = _CODEC.encode(event)
+    sequence_bytes = sequence.to_bytes(8)
+    return _RECORD_HEADER.pack(len(body), zlib.crc32(body, zlib.crc32(sequence_bytes)), sequence) + body
+
+
+def _read_record(file: IO[bytes]) -> tuple[int, bytes] | None:
+    """Read the next record's sequence number and body, or return `None` at the end of the file or at a torn write."""
+    header = file.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        return None
+
+    length, checksum, sequence = _RECORD_HEADER.unpack(header)
+    body = file.read(length)
+    if len(body) < length or zlib.crc32(body, zlib.crc32(sequence.to_bytes(8))) != checksum:
+        return None
+    return sequence, body
+
+
+def _segments(directory: Path) -> list[int]:
+    """Return the first sequence numbers of the segments in `directory`, in order."""
+    return sorted(int(path.stem) for path in directory.glob(f'*{SEGMENT_SUFFIX}'))
+
+
+def _segment_path(directory: Path, first_sequence: int) -> Path:
+    return directory / f'{first_sequence:020d}{SEGMENT_SUFFIX}'
+
+
+def _load_index(path: Path) -> tuple[list[int], list[int]]:
+    """Return the sequence numbers and offsets of the index at `path`, ignoring a torn last entry."""
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return [], []
+
+    entries = list(_INDEX_ENTRY.iter_unpack(data[: len(data) - len(data) % _INDEX_ENTRY.size]))
+    return [sequence for sequence, _ in entries], [offset for _, offset in entries]
+
+
+class EventLog:
+    """An append-only log of events on local disk, numbered from 1 in the order they are appended.
+
+    Records are kept in segment files named after the sequence number of their first record, and a new
+    segment is started once one holds `segment_size` bytes. Next to every segment is a sparse index with
+    the offset of a record every `index_interval` bytes, so reading from a sequence number seeks close to
+    it instead of scanning its segment from the start.
+
+    Appends are written through to the operating system at once, and fsynced at most every `sync_interval`
+    seconds, when a segment is finished and on `close`. A record torn by a crash is dropped when the log is
+    next opened, together with anything after it.
+
+    Only one process may append to a log at a time, any number may read it with `read_event_log`.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        *,
+        segment_size: int = 64 * 1024 * 1024,
+        index_interval: int = 4096,
+        sync_interval: float = 1,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.sync_interval = sync_interval
+        self.index_interval = index_interval
+
+        self._lock_file = (self.directory / LOCK_FILE_NAME).open('ab')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            self._lock_file.close()
+            msg = f'{self.directory} is in use by another process'
+            raise EventLogInUseError(msg) from e
+
+        self._lock = threading.Lock()
+        self._synced_at = time.monotonic()
+        segments = _segments(self.directory)
+        self._first_sequence = segments[-1] if segments else 1
+        self._next_sequence, self._offset, self._indexed_offset = self._recover()
+        self._file = _segment_path(self.directory, self._first_sequence).open('ab')
+        self._index_file = _segment_path(self.directory, self._first_sequence).with_suffix(INDEX_SUFFIX).open('ab')
+
+    def _recover(self) -> tuple[int, int, int]:
+        """Cut a torn record off the last segment and rewrite its index to match.
+
+        Returns the next sequence number, the length of the segment and the offset last indexed.
+        """
+        path = _segment_path(self.directory, self._first_sequence)
+        next_sequence, valid, indexed = self._first_sequence, 0, -self.index_interval
+        index = bytearray()
+        if path.exists():
+            with path.open('r+b') as file:
+                while (record := _read_record(file)) is not None:
+                    if valid - indexed >= self.index_interval:
+                        index += _INDEX_ENTRY.pack(record[0], valid)
+                        indexed = valid
+                    next_sequence, valid = record[0] + 1, file.tell()
+                if valid != path.stat().st_size:
+                    logger.warning('Dropping a torn record at the end of %s', path)
+                    file.truncate(valid)
+
+        path.with_suffix(INDEX_SUFFIX).write_bytes(index)
+        return next_sequence, valid, indexed
+
+    @property
+    def next_sequence(self) -> int:
+        """The sequence number the next event appended will get."""
+        with self._lock:
+            return self._next_sequence
+
+    def append(self, event: LibraryMessage) -> int:
+        """Append `event` and return its sequence number."""
+        with self._lock:
+            sequence = self._next_sequence
+            record = _encode(sequence, event)
+            if self._offset and self._offset + len(record) > self.segment_size:
+                self._roll(sequence)
+
+            if self._offset - self._indexed_offset >= self.index_interval:
+                self._index_file.write(_INDEX_ENTRY.pack(sequence, self._offset))
+                self._index_file.flush()
+                self._indexed_offset = self._offset
+
+            self._file.write(record)
+            self._file.flush()
+            self._offset += len(record)
+            self._next_sequence += 1
+            if time.monotonic() - self._synced_at >= self.sync_interval:
+                self._sync()
+            return sequence
+
+    def _roll(self, first_sequence: int) -> None:
+        self._sync()
+        self._file.close()
+        self._index_file.close()
+        self._first_sequence = first_sequence
+        self._offset, self._indexed_offset = 0, -self.index_interval
+        self._file = _segment_path(self.directory, first_sequence).open('ab')
+        self._index_file = _segment_path(self.directory, first_sequence).with_suffix(INDEX_SUFFIX).open('ab')
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        os.fsync(self._index_file.fileno())
+        self._synced_at = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            self._file.close()
+            self._index_file.close()
+            self._lock_file.close()
+
+
+def _seek(file: IO[bytes], index_path: Path, sequence: int) -> None:
+    """Move `file` to the last indexed record at or before `sequence`."""
+    sequences, offsets = _load_index(index_path)
+    position = bisect.bisect_right(sequences, sequence) - 1
+    if position >= 0:
+        file.seek(offsets[position])
+
+
+def read_event_log(directory: str | Path, *, start: int = 1, batch_size: int = 1000) -> Iterator[list[LoggedEvent]]:
+    """Yield the events logged under `directory` from sequence number `start` on, in batches of `batch_size`.
+
+    Reads up to the last complete record, so a log can be read while another process appends to it.
+    """
+    directory = Path(directory)
+    segments = _segments(directory)
+    batch: list[LoggedEvent] = []
+    for position in range(max(bisect.bisect_right(segments, start) - 1, 0), len(segments)):
+        path = _segment_path(directory, segments[position])
+        with path.open('rb', buffering=1024 * 1024) as file:
+            _seek(file, path.with_suffix(INDEX_SUFFIX), start)
+            while (record := _read_record(file)) is not None:
+                sequence, body = record
+                if sequence < start:
+                    continue
+
+                batch.append(LoggedEvent(sequence, _CODEC.decode(body)))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+
+    if batch:
+        yield batch
@@ -0,0 +1,142 @@
+import datetime
+import dataclasses
+from typing import Any, ClassVar, get_type_hints
+from functools import cache
+from collections.abc import Callable
+
+from .types import LibraryMessage
+
+
+class InvalidEventError(ValueError):
+    """Raised when a decoded message does not match the structure of its event."""
+
+
+@dataclasses.dataclass(slots=True)
+class Book:
+    id: str
+    isbn: str
+    title: str
+    author: str
+    added_by: str
+    category: str
+    publisher: str
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+@dataclasses.dataclass(slots=True)
+class BorrowedBook:
+    id: str
+    book_id: str
+    user_id: str
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    proposed_return_date: datetime.datetime
+
+
+@dataclasses.dataclass(slots=True)
+class User:
+    id: str
+    email: str
+    is_admin: bool
+    last_name: str
+    first_name: str
+
+
+@dataclasses.dataclass(slots=True)
+class BookAdded:
+    event: ClassVar[str] = 'book_added'
+    book: Book
+
+
+@dataclasses.dataclass(slots=True)
+class BookRemoved:
+    event: ClassVar[str] = 'book_removed'
+    book_id: str
+
+
+@dataclasses.dataclass(slots=True)
+class BookBorrowed:
+    event: ClassVar[str] = 'book_borrowed'
+    borrowed_book: BorrowedBook
+
+
+@dataclasses.dataclass(slots=True)
+class BookReturned:
+    event: ClassVar[str] = 'book_returned'
+    borrowed_book_id: str
+    actual_return_date: datetime.datetime
+
+
+@dataclasses.dataclass(slots=True)
+class UserRegistered:
+    event: ClassVar[str] = 'user_registered'
+    user: User
+
+
+Event = BookAdded | BookRemoved | BookBorrowed | BookReturned | UserRegistered
+
+EVENT_TYPES: dict[str, type[Event]] = {
+    event_class.event: event_class
+    for event_class in (BookAdded, BookRemoved, BookBorrowed, BookReturned, UserRegistered)
+}
+
+
+def parse_event(message: LibraryMessage) -> Event | None:
+    """Validate a decoded message into its event struct, or return `None` for unknown event types."""
+    if not isinstance(message, dict):
+        msg = f'expected an event object, got {type(message).__name__}'
+        raise InvalidEventError(msg)
+
+    event_class = EVENT_TYPES.get(message.get('event'))
+    if event_class is None:
+        return None
+
+    return _build(event_class, message)
+
+
+def _build(struct: type, data: Any) -> Any:
+    if not isinstance(data, dict):
+        msg = f'expected an object for {struct.__name__}, got {type(data).__name__}'
+        raise InvalidEventError(msg)
+
+    try:
+        values = {name: convert(data[name]) for name, convert in _converters(struct)}
+    except KeyError as e:
+        msg = f'{struct.__name__} is missing {e.args[0]!r}'
+        raise InvalidEventError(msg) from None
+
+    return struct(**values)
+
+
+@cache
+def _converters(struct: type) -> list[tuple[str, Callable[[Any], Any]]]:
+    hints = get_type_hints(struct)
+    return [(field.name, _converter(hints[field.name])) for field in dataclasses.fields(struct)]
+
+
+def _converter(hint: type) -> Callable[[Any], Any]:
+    if dataclasses.is_dataclass(hint):
+        return lambda value: _build(hint, value)
+
+    if hint is datetime.datetime:
+        return _parse_datetime
+
+    def check(value: Any) -> Any:
+        if not isinstance(value, hint):
+            msg = f'expected {hint.__name__}, got {type(value).__name__}'
+            raise InvalidEventError(msg)
+        return value
+
+    return check
+
+
+def _parse_datetime(value: Any) -> datetime.datetime:
+    if isinstance(value, datetime.datetime):
+        return value
+
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError) as e:
+        msg = f'expected an ISO 8601 datetime, got {value!r}'
+        raise InvalidEventError(msg) from e
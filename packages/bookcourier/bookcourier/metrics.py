@@ -0,0 +1,352 @@
+"""Consumer metrics, exposed over HTTP in the Prometheus text format.
+
+Metrics are kept in process and are cheap to record, so consumers always record them. Nothing is
+served until `start_metrics_server` is called.
+
+Producers stamp every message with the time it was published, in milliseconds, and a trace id, so
+consumers can measure how long each event took to propagate from the publishing service until their
+changes for it were committed, and name the events that took too long.
+"""
+
+import abc
+import math
+import time
+import logging
+import threading
+import contextlib
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections.abc import Callable, Iterable, Iterator
+
+import pika
+
+from .types import LibraryMessage
+from .transports import Transport, TransportError
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+AGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, 6 * 3600, 24 * 3600)
+
+PUBLISHED_AT_HEADER = 'x-published-at'
+TRACE_ID_HEADER = 'x-trace-id'
+
+
+class Metric(abc.ABC):
+    """A named family of samples, one per combination of `labelnames` values."""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            msg = f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}'
+            raise ValueError(msg)
+
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], **extra: str) -> str:
+        pairs = [*zip(self.labelnames, key, strict=True), *extra.items()]
+        if not pairs:
+            return ''
+
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped, strict=True)) + '}'
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}', *self._samples()]
+
+    @abc.abstractmethod
+    def _samples(self) -> list[str]: ...
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{self._labels(key)} {_format(value)}' for key, value in values]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+        # per label combination: the count of each bucket (not cumulative), the sum and the count.
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        bucket = next(index for index, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[bucket] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        counts, _ = self._values.get(self._key(labels), ([0], [0.0]))
+        return sum(counts)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                samples.append(f'{self.name}_bucket{self._labels(key, le=_format(bound))} {cumulative}')
+            samples.append(f'{self.name}_sum{self._labels(key)} {_format(total)}')
+            samples.append(f'{self.name}_count{self._labels(key)} {cumulative}')
+        return samples
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+@dataclass(slots=True)
+class TrackedEvent:
+    """The event `ConsumerMetrics.track` is timing, `applied` is cleared when it turns out to be a duplicate."""
+
+    applied: bool = True
+
+
+class ConsumerMetrics:
+    """What BookCourier records about the events its consumers handle, and about its connections.
+
+    Events that took longer than `propagation_outlier_seconds` from publishing to being applied are
+    counted, and logged with their trace id.
+    """
+
+    def __init__(self, *, propagation_outlier_seconds: float = 5) -> None:
+        self.propagation_outlier_seconds = propagation_outlier_seconds
+        self.events = Counter(
+            'bookcourier_events_total',
+            'Events consumed, by outcome: processed, failed or undecodable.',
+            ('queue', 'event', 'outcome'),
+        )
+        self.handling_seconds = Histogram(
+            'bookcourier_event_handling_seconds',
+            'Time spent applying a single event.',
+            ('queue', 'event'),
+        )
+        self.batch_handling_seconds = Histogram(
+            'bookcourier_batch_handling_seconds',
+            'Time spent applying a batch of events.',
+            ('queue',),
+        )
+        self.age_seconds = Histogram(
+            'bookcourier_event_age_seconds',
+            'Time between publishing an event and consuming it, including retry delays.',
+            ('queue', 'event'),
+            buckets=AGE_BUCKETS,
+        )
+        self.propagation_seconds = Histogram(
+            'bookcourier_event_propagation_seconds',
+            'Time between publishing an event and committing its changes, including retries.',
+            ('queue', 'event'),
+            buckets=AGE_BUCKETS,
+        )
+        self.propagation_outliers = Counter(
+            'bookcourier_event_propagation_outliers_total',
+            'Events whose propagation took longer than the outlier threshold.',
+            ('queue', 'event'),
+        )
+        self.queue_depth = Gauge('bookcourier_queue_depth', 'Messages ready for delivery.', ('queue',))
+        self.reconnects = Counter(
+            'bookcourier_reconnects_total',
+            'Transports replaced after their connection was lost, by whether a publish or the idle check found out.',
+            ('reason',),
+        )
+
+    @property
+    def metrics(self) -> list[Metric]:
+        return [
+            self.events,
+            self.handling_seconds,
+            self.batch_handling_seconds,
+            self.age_seconds,
+            self.propagation_seconds,
+            self.propagation_outliers,
+            self.queue_depth,
+            self.reconnects,
+        ]
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+    def record_received(self, queue_name: str, event: LibraryMessage, properties: pika.BasicProperties) -> None:
+        """Record how long `event` waited to be consumed, if its producer stamped it."""
+        if (published_at := published_at_of(properties)) is not None:
+            age = max(time.time() - published_at, 0)
+            self.age_seconds.observe(age, queue=queue_name, event=event_type(event))
+
+    @contextlib.contextmanager
+    def track(
+        self, queue_name: str, event: LibraryMessage, properties: pika.BasicProperties
+    ) -> Iterator[TrackedEvent]:
+        """Record the age of `event`, then how long the block applying it took and whether it raised.
+
+        The block is expected to commit the event's changes, its propagation is recorded once it returns
+        unless it marked the event as not applied, which is then counted as a duplicate.
+        """
+        self.record_received(queue_name, event, properties)
+        started = time.perf_counter()
+        tracked = TrackedEvent()
+        try:
+            yield tracked
+        except Exception:
+            self.record_outcome(queue_name, event, outcome='failed')
+            raise
+        else:
+            if tracked.applied:
+                self.record_outcome(queue_name, event, outcome='processed')
+                self.record_committed(queue_name, event, properties)
+            else:
+                self.record_outcome(queue_name, event, outcome='duplicate')
+        finally:
+            self.handling_seconds.observe(time.perf_counter() - started, queue=queue_name, event=event_type(event))
+
+    def record_outcome(self, queue_name: str, event: LibraryMessage | None, *, outcome: str) -> None:
+        self.events.inc(queue=queue_name, event=event_type(event), outcome=outcome)
+
+    def record_committed(self, queue_name: str, event: LibraryMessage, properties: pika.BasicProperties) -> None:
+        """Record how long `event` took from being published until its changes were committed."""
+        headers = properties.headers or {}
+        if PUBLISHED_AT_HEADER not in headers:
+            return
+
+        latency = max(time.time() - headers[PUBLISHED_AT_HEADER] / 1000, 0)
+        self.propagation_seconds.observe(latency, queue=queue_name, event=event_type(event))
+        if latency > self.propagation_outlier_seconds:
+            self.propagation_outliers.inc(queue=queue_name, event=event_type(event))
+            logger.warning(
+                'Event %s took %.3fs to propagate to %s (trace %s)',
+                properties.message_id,
+                latency,
+                queue_name,
+                headers.get(TRACE_ID_HEADER),
+            )
+
+
+def published_at_of(properties: pika.BasicProperties) -> float | None:
+    """Return when a message was published, to the millisecond unless only its AMQP timestamp is set."""
+    headers = properties.headers or {}
+    if PUBLISHED_AT_HEADER in headers:
+        return headers[PUBLISHED_AT_HEADER] / 1000
+    return properties.timestamp
+
+
+def event_type(event: LibraryMessage | None) -> str:
+    return (event or {}).get('event') or 'unknown'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics: ConsumerMetrics
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.partition('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        logger.debug('Metrics request from %s: %s', self.address_string(), format % args)
+
+
+class QueueDepthSampler(threading.Thread):
+    """Updates the queue depth gauge every `interval` seconds on a transport of its own."""
+
+    def __init__(
+        self,
+        metrics: ConsumerMetrics,
+        open_transport: Callable[[], Transport],
+        queue_names: list[str],
+        *,
+        interval: float,
+    ) -> None:
+        super().__init__(name='bookcourier-queue-depth', daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        self.queue_names = queue_names
+        self.open_transport = open_transport
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        transport: Transport | None = None
+        while not self._stopped.is_set():
+            try:
+                if transport is None or not transport.is_open:
+                    transport = self.open_transport()
+                for queue_name in self.queue_names:
+                    self.metrics.queue_depth.set(transport.queue_depth(queue_name), queue=queue_name)
+            except TransportError:
+                logger.warning('Failed to sample queue depths, retrying in %ss', self.interval, exc_info=True)
+                transport = None
+
+            self._stopped.wait(self.interval)
+
+        if transport is not None:
+            transport.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def start_metrics_server(metrics: ConsumerMetrics, *, port: int, host: str = '') -> ThreadingHTTPServer:
+    """Serve `metrics` at `/metrics` from a background thread until the returned server is shut down."""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='bookcourier-metrics', daemon=True).start()
+    logger.info('Serving metrics on port %d', server.server_port)
+    return server
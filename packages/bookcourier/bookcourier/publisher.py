@@ -0,0 +1,328 @@
+import logging
+import threading
+from typing import Literal
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from concurrent.futures import Future
+
+import pika
+from pika.adapters.select_connection import IOLoop
+
+logger = logging.getLogger(__name__)
+
+
+OverflowPolicy = Literal['block', 'drop', 'raise']
+
+
+class PublishError(Exception):
+    """Raised through a publish future when the broker did not take responsibility for a message."""
+
+
+class PublisherOverflowError(PublishError):
+    """Raised when the publisher already holds `max_pending` unsent messages."""
+
+
+@dataclass(slots=True)
+class OutgoingMessage:
+    routing_key: str
+    body: bytes
+    properties: pika.BasicProperties
+    future: Future
+
+
+class ConfirmTracker:
+    """Tracks unconfirmed publishes on a channel by their delivery tag.
+
+    Delivery tags are assigned by the broker in publish order, starting at 1 for every
+    new channel, so they can be predicted locally and an `Ack`/`Nack` with `multiple`
+    set settles every outstanding tag up to and including the one it carries.
+    """
+
+    def __init__(self) -> None:
+        self._next_tag = 1
+        self._pending: OrderedDict[int, Future] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def track(self, future: Future) -> int:
+        tag = self._next_tag
+        self._next_tag += 1
+        self._pending[tag] = future
+        return tag
+
+    def ack(self, delivery_tag: int, *, multiple: bool) -> None:
+        for future in self._settle(delivery_tag, multiple=multiple):
+            future.set_result(None)
+
+    def nack(self, delivery_tag: int, *, multiple: bool) -> None:
+        for future in self._settle(delivery_tag, multiple=multiple):
+            future.set_exception(PublishError('message was rejected by the broker'))
+
+    def reset(self, error: Exception) -> None:
+        """Fail every outstanding publish and start counting from 1 again, as a new channel does."""
+        pending, self._pending = self._pending, OrderedDict()
+        self._next_tag = 1
+        for future in pending.values():
+            future.set_exception(error)
+
+    def _settle(self, delivery_tag: int, *, multiple: bool) -> list[Future]:
+        if not multiple:
+            future = self._pending.pop(delivery_tag, None)
+            return [future] if future is not None else []
+
+        settled = []
+        while self._pending:
+            tag = next(iter(self._pending))
+            if tag > delivery_tag:
+                break
+            settled.append(self._pending.pop(tag))
+        return settled
+
+
+class AsyncPublisher:
+    """Publishes messages from a dedicated I/O thread over a `SelectConnection`.
+
+    `publish` never touches the socket itself: it hands the message to the I/O thread and
+    returns a future. With `confirm` enabled the channel is put in confirm mode and the future
+    resolves once the broker acks the message, or fails if it is nacked or the connection drops
+    first. Any number of publishes can be outstanding, so confirms cost no extra round trips.
+
+    Messages published while the connection is down, or while the broker has blocked it for flow
+    control, are held back and sent once it is usable again. At most `max_pending` messages may be
+    waiting to be sent; beyond that `overflow` decides whether `publish` blocks for up to
+    `overflow_timeout` seconds, drops the message by failing its future, or raises.
+
+    Messages are published to `exchange`, the default exchange unless given, and `queues` are declared
+    and bound to it with the routing keys `bindings` lists for them.
+    """
+
+    def __init__(
+        self,
+        rabbitmq_url: str,
+        *,
+        queues: list[str],
+        exchange: str = '',
+        bindings: dict[str, list[str]] | None = None,
+        confirm: bool = True,
+        max_pending: int = 10_000,
+        overflow: OverflowPolicy = 'block',
+        overflow_timeout: float | None = 5,
+        reconnect_delay: float = 1,
+    ) -> None:
+        if overflow not in {'block', 'drop', 'raise'}:
+            msg = f'unknown overflow policy: {overflow!r}'
+            raise ValueError(msg)
+
+        self.queues = queues
+        self.exchange = exchange
+        self.bindings = bindings or {}
+        self.confirm = confirm
+        self.overflow = overflow
+        self.max_pending = max_pending
+        self.rabbitmq_url = rabbitmq_url
+        self.reconnect_delay = reconnect_delay
+        self.overflow_timeout = overflow_timeout
+
+        self._unsent = 0
+        self._ready = False
+        self._blocked = False
+        self._stopping = False
+        self._tracker = ConfirmTracker()
+        self._backlog: deque[OutgoingMessage] = deque()
+        self._channel: pika.channel.Channel | None = None
+        self._connection: pika.SelectConnection | None = None
+
+        self._ioloop = IOLoop()
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='bookcourier-publisher', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def publish(self, routing_key: str, body: bytes, properties: pika.BasicProperties) -> Future:
+        future: Future = Future()
+        with self._idle:
+            if self._unsent >= self.max_pending and not self._wait_for_room():
+                if self.overflow == 'drop':
+                    logger.warning('Publisher is full, dropping message for %s', routing_key)
+                    future.set_exception(PublisherOverflowError('publisher is full, message was dropped'))
+                    return future
+
+                msg = f'publisher already holds {self._unsent} unsent messages'
+                raise PublisherOverflowError(msg)
+
+            self._unsent += 1
+
+        message = OutgoingMessage(routing_key=routing_key, body=body, properties=properties, future=future)
+        self._ioloop.add_callback_threadsafe(lambda: self._publish(message))
+        return future
+
+    @property
+    def pending(self) -> int:
+        """The number of messages accepted by `publish` but not yet written to the connection."""
+        return self._unsent
+
+    @property
+    def unconfirmed(self) -> int:
+        """The number of messages written to the connection and awaiting a broker confirm."""
+        return len(self._tracker)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait up to `timeout` seconds for every message to be sent and, with `confirm`, settled.
+
+        Returns whether everything was flushed in time.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._unsent and not self._tracker, timeout=timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Flush outstanding publishes for up to `timeout` seconds, then close the connection."""
+        if not self._thread.is_alive():
+            return
+
+        if not self.flush(timeout):
+            logger.warning(
+                'Closing publisher with %d unsent and %d unconfirmed messages', self._unsent, len(self._tracker)
+            )
+
+        self._ioloop.add_callback_threadsafe(self._shutdown)
+        self._thread.join(timeout)
+
+    def _wait_for_room(self) -> bool:
+        if self.overflow != 'block':
+            return False
+
+        return self._idle.wait_for(lambda: self._unsent < self.max_pending, timeout=self.overflow_timeout)
+
+    def _run(self) -> None:
+        self._connect()
+        self._ioloop.start()
+
+        error = PublishError('publisher was closed before the message was sent')
+        while self._backlog:
+            self._backlog.popleft().future.set_exception(error)
+            self._release()
+        logger.info('Publisher I/O loop stopped')
+
+    def _connect(self) -> None:
+        self._connection = pika.SelectConnection(
+            pika.URLParameters(self.rabbitmq_url),
+            custom_ioloop=self._ioloop,
+            on_open_callback=self._on_connection_open,
+            on_open_error_callback=self._on_connection_open_error,
+            on_close_callback=self._on_connection_closed,
+        )
+
+    def _shutdown(self) -> None:
+        self._stopping = True
+        if self._connection is not None and not (self._connection.is_closing or self._connection.is_closed):
+            self._connection.close()
+        else:
+            self._ioloop.stop()
+
+    def _on_connection_open(self, connection: pika.SelectConnection) -> None:
+        logger.info('Publisher connected to RabbitMQ at %s', self.rabbitmq_url)
+        connection.add_on_connection_blocked_callback(self._on_connection_blocked)
+        connection.add_on_connection_unblocked_callback(self._on_connection_unblocked)
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_blocked(self, connection: pika.SelectConnection, method_frame: pika.frame.Method) -> None:
+        logger.warning('Broker blocked the publisher connection: %s', method_frame.method.reason)
+        self._blocked = True
+
+    def _on_connection_unblocked(self, connection: pika.SelectConnection, method_frame: pika.frame.Method) -> None:
+        logger.info('Broker unblocked the publisher connection')
+        self._blocked = False
+        self._drain()
+
+    def _on_connection_open_error(self, connection: pika.SelectConnection, error: Exception) -> None:
+        logger.warning('Publisher failed to connect to RabbitMQ: %s', error)
+        self._schedule_reconnect()
+
+    def _on_connection_closed(self, connection: pika.SelectConnection, reason: Exception) -> None:
+        self._ready = False
+        self._blocked = False
+        self._channel = None
+        self._tracker.reset(PublishError(f'connection closed before the broker confirmed the message: {reason}'))
+        self._notify_idle()
+
+        if self._stopping:
+            self._ioloop.stop()
+        else:
+            logger.warning('Publisher connection closed: %s', reason)
+            self._schedule_reconnect()
+
+    def _on_channel_open(self, channel: pika.channel.Channel) -> None:
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        if self.confirm:
+            channel.confirm_delivery(ack_nack_callback=self._on_delivery_confirmation)
+
+        if self.exchange:
+            channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+        for queue_name in self.queues:
+            channel.queue_declare(queue=queue_name, durable=True)
+            for binding_key in self.bindings.get(queue_name, []):
+                channel.queue_bind(queue=queue_name, exchange=self.exchange, routing_key=binding_key)
+
+        self._ready = True
+        self._drain()
+
+    def _on_channel_closed(self, channel: pika.channel.Channel, reason: Exception) -> None:
+        logger.warning('Publisher channel closed: %s', reason)
+        self._ready = False
+        self._channel = None
+        self._tracker.reset(PublishError(f'channel closed before the broker confirmed the message: {reason}'))
+        if self._connection is not None and self._connection.is_open and not self._stopping:
+            self._connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_delivery_confirmation(self, method_frame: pika.frame.Method) -> None:
+        method = method_frame.method
+        if isinstance(method, pika.spec.Basic.Ack):
+            self._tracker.ack(method.delivery_tag, multiple=method.multiple)
+        else:
+            logger.warning('Broker nacked delivery tag %d (multiple=%s)', method.delivery_tag, method.multiple)
+            self._tracker.nack(method.delivery_tag, multiple=method.multiple)
+        self._notify_idle()
+
+    def _schedule_reconnect(self) -> None:
+        if not self._stopping:
+            self._ioloop.call_later(self.reconnect_delay, self._connect)
+
+    def _publish(self, message: OutgoingMessage) -> None:
+        if self._ready and not self._blocked and not self._backlog:
+            self._send(message)
+        else:
+            self._backlog.append(message)
+
+    def _drain(self) -> None:
+        while self._backlog and self._ready and not self._blocked:
+            self._send(self._backlog.popleft())
+
+    def _send(self, message: OutgoingMessage) -> None:
+        try:
+            self._channel.basic_publish(
+                exchange=self.exchange,
+                routing_key=message.routing_key,
+                body=message.body,
+                properties=message.properties,
+            )
+        except Exception as e:  # noqa: BLE001
+            message.future.set_exception(e)
+        else:
+            if self.confirm:
+                self._tracker.track(message.future)
+            else:
+                message.future.set_result(None)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        with self._idle:
+            self._unsent -= 1
+            self._idle.notify_all()
+
+    def _notify_idle(self) -> None:
+        with self._idle:
+            self._idle.notify_all()
@@ -0,0 +1,110 @@
+import copy
+import logging
+from dataclasses import dataclass
+
+import pika
+
+from .transports import Transport
+
+logger = logging.getLogger(__name__)
+
+RETRY_COUNT_HEADER = 'x-retry-count'
+LAST_ERROR_HEADER = 'x-last-error'
+
+
+class PartialBatchError(Exception):
+    """Raised by a batch callback when only some events of the batch failed.
+
+    `failures` maps the index of each failed event in the batch to its error, every other event is acked.
+    `skipped` holds the indexes of the events a `Deduplicator` skipped as already processed.
+    """
+
+    def __init__(self, failures: dict[int, Exception], *, skipped: set[int] | None = None) -> None:
+        super().__init__(f'{len(failures)} events of the batch failed')
+        self.failures = failures
+        self.skipped = skipped or set()
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often, and after how long, a failed event is retried before it is parked.
+
+    Each retry tier is a queue whose messages expire after the tier's delay and are dead-lettered back
+    onto the queue they came from, so waiting for a retry never holds up the consumer. Delays grow
+    exponentially from `base_delay` by `multiplier`, and an event that fails `max_retries` times is moved
+    to the queue's parking lot.
+    """
+
+    max_retries: int = 4
+    base_delay: float = 1
+    multiplier: float = 5
+
+    @property
+    def delays(self) -> list[float]:
+        return [self.base_delay * self.multiplier**tier for tier in range(self.max_retries)]
+
+
+def retry_queue_name(queue_name: str, delay: float) -> str:
+    # the delay is part of the name because a queue's TTL cannot change once it has been declared.
+    return f'{queue_name}.retry.{int(delay * 1000)}ms'
+
+
+def parking_lot_name(queue_name: str) -> str:
+    return f'{queue_name}.parking_lot'
+
+
+def declare_retry_queues(transport: Transport, queue_name: str, policy: RetryPolicy) -> None:
+    for delay in policy.delays:
+        transport.declare_queue(retry_queue_name(queue_name, delay), message_ttl=delay, dead_letter_queue=queue_name)
+
+    transport.declare_queue(parking_lot_name(queue_name))
+
+
+def retry_later(
+    transport: Transport,
+    *,
+    queue_name: str,
+    policy: RetryPolicy,
+    properties: pika.BasicProperties,
+    body: bytes,
+    error: BaseException,
+) -> None:
+    """Move a failed message to its next retry tier, or to the parking lot once its retries are exhausted.
+
+    The caller still has to ack the original delivery.
+    """
+    headers = dict(properties.headers or {})
+    attempt = headers.get(RETRY_COUNT_HEADER, 0)
+    headers[RETRY_COUNT_HEADER] = attempt + 1
+    headers[LAST_ERROR_HEADER] = f'{type(error).__name__}: {error}'[:500]
+
+    if attempt < policy.max_retries:
+        routing_key = retry_queue_name(queue_name, policy.delays[attempt])
+        logger.warning('Retrying event from %s in %ss (attempt %d)', queue_name, policy.delays[attempt], attempt + 1)
+    else:
+        routing_key = parking_lot_name(queue_name)
+        logger.error('Parking event from %s after %d attempts', queue_name, attempt + 1)
+
+    retry_properties = copy.copy(properties)
+    retry_properties.headers = headers
+    retry_properties.delivery_mode = pika.spec.PERSISTENT_DELIVERY_MODE
+    transport.publish(routing_key, body, retry_properties)
+
+
+def park(
+    transport: Transport,
+    *,
+    queue_name: str,
+    properties: pika.BasicProperties,
+    body: bytes,
+    error: BaseException,
+) -> None:
+    """Move a message that can never succeed, such as one that cannot be decoded, straight to the parking lot."""
+    retry_later(
+        transport,
+        queue_name=queue_name,
+        policy=RetryPolicy(max_retries=0),
+        properties=properties,
+        body=body,
+        error=error,
+    )
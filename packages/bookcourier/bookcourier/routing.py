@@ -0,0 +1,53 @@
+"""How events are routed from publishers to the queues that consume them.
+
+Events are published to a topic exchange with a routing key per event type, and each queue is bound to
+just the routing keys of the events its consumer handles, so an event type nobody subscribed to is never
+delivered to, or decoded by, existing consumers. Bindings may use topic wildcards: `*` matches one word of
+a routing key and `#` any number of words, e.g. `book.*` matches every book event.
+
+Every queue has a bulk lane next to it, a second queue for events published in bulk, such as catalogue
+imports, so that draining them never delays interactive events. Bulk events are published with their
+routing key under `bulk.`, which the bulk lane is bound to instead.
+"""
+
+from typing import Literal
+
+EXCHANGE_NAME = 'bookcourier_events'
+
+Lane = Literal['interactive', 'bulk']
+
+ROUTING_KEYS: dict[str, str] = {
+    'book_added': 'book.added',
+    'book_removed': 'book.removed',
+    'book_borrowed': 'book.borrowed',
+    'book_returned': 'book.returned',
+    'user_registered': 'user.registered',
+}
+
+# bookworm keeps the catalogue in sync on `management`, librarian records loans and users on `transaction`.
+DEFAULT_BINDINGS: dict[str, list[str]] = {
+    'management': ['book.added', 'book.removed'],
+    'transaction': ['book.borrowed', 'book.returned', 'user.registered'],
+}
+
+
+def lane_routing_key(key: str, lane: Lane) -> str:
+    """Return the routing key events routed by `key` are published with on `lane`."""
+    return f'bulk.{key}' if lane == 'bulk' else key
+
+
+def bulk_lane_name(queue_name: str) -> str:
+    return f'{queue_name}.bulk'
+
+
+def bulk_prefetch(prefetch_count: int, ratio: float) -> int:
+    """Return the prefetch of the bulk lane of a queue consumed with `prefetch_count`, at least one."""
+    return max(1, round(prefetch_count * ratio))
+
+
+def routing_key(event_type: str) -> str:
+    try:
+        return ROUTING_KEYS[event_type]
+    except KeyError:
+        msg = f'no routing key is registered for {event_type!r} events'
+        raise ValueError(msg) from None
@@ -0,0 +1,47 @@
+"""Snapshots of a table, which seed a consumer's copy of it instead of replaying every event since the start.
+
+A snapshot file is one line of JSON describing the snapshot, followed by its rows as CSV. `taken_at` is
+when the transaction the rows were read in started, in seconds since the epoch: every event published
+before then is reflected in the rows, so a consumer that loads the snapshot resumes consuming with a
+`Deduplicator` that takes those events as processed, see its `applied_before`.
+"""
+
+import json
+from typing import IO
+from dataclasses import asdict, dataclass
+
+SNAPSHOT_FORMAT = 'bookcourier-snapshot/1'
+
+
+class SnapshotError(ValueError):
+    """Raised when a file is not a snapshot this version can read."""
+
+
+@dataclass(slots=True)
+class SnapshotHeader:
+    table: str
+    columns: list[str]
+    rows: int
+    taken_at: float
+
+
+def write_snapshot_header(file: IO[str], header: SnapshotHeader) -> None:
+    file.write(json.dumps({'format': SNAPSHOT_FORMAT, **asdict(header)}) + '\n')
+
+
+def read_snapshot_header(file: IO[str]) -> SnapshotHeader:
+    """Read the header of the snapshot in `file`, leaving it at the first row."""
+    try:
+        metadata = json.loads(file.readline())
+    except ValueError:
+        metadata = None
+
+    if not isinstance(metadata, dict) or metadata.pop('format', None) != SNAPSHOT_FORMAT:
+        msg = f'not a {SNAPSHOT_FORMAT} file'
+        raise SnapshotError(msg)
+
+    try:
+        return SnapshotHeader(**metadata)
+    except TypeError as e:
+        msg = f'malformed {SNAPSHOT_FORMAT} header'
+        raise SnapshotError(msg) from e
@@ -0,0 +1,323 @@
+import os
+import json
+import zlib
+import fcntl
+import struct
+import logging
+import threading
+from typing import IO
+from pathlib import Path
+from dataclasses import dataclass
+from collections.abc import Callable
+
+import pika
+
+from .transports import Transport, TransportError, dump_properties, load_properties
+
+logger = logging.getLogger(__name__)
+
+# every record is its length and CRC32, then the JSON metadata length, the metadata and the body.
+_RECORD_HEADER = struct.Struct('>II')
+_METADATA_LENGTH = struct.Struct('>I')
+
+CURSOR_FILE_NAME = 'cursor'
+
+LOCK_FILE_NAME = 'lock'
+
+SEGMENT_SUFFIX = '.seg'
+
+# the most processes that can spool under one directory at once.
+MAX_SPOOLS = 1024
+
+# a position in the spool: a segment number and a byte offset within that segment.
+Position = tuple[int, int]
+
+
+class SpoolInUseError(Exception):
+    """Raised when opening a spool directory another process holds."""
+
+
+@dataclass(slots=True)
+class SpooledMessage:
+    exchange: str
+    routing_key: str
+    properties: pika.BasicProperties
+    body: bytes
+
+
+def _encode(message: SpooledMessage) -> bytes:
+    metadata = json.dumps(
+        {
+            'exchange': message.exchange,
+            'routing_key': message.routing_key,
+            'properties': dump_properties(message.properties),
+        }
+    ).encode()
+    payload = _METADATA_LENGTH.pack(len(metadata)) + metadata + message.body
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(payload: bytes) -> SpooledMessage:
+    (length,) = _METADATA_LENGTH.unpack_from(payload)
+    metadata = json.loads(payload[_METADATA_LENGTH.size : _METADATA_LENGTH.size + length])
+    return SpooledMessage(
+        exchange=metadata['exchange'],
+        routing_key=metadata['routing_key'],
+        properties=load_properties(metadata['properties']),
+        body=payload[_METADATA_LENGTH.size + length :],
+    )
+
+
+def _read_record(file: IO[bytes]) -> bytes | None:
+    """Read the next record's payload, or return `None` at the end of the file or at a torn write."""
+    header = file.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        return None
+
+    length, checksum = _RECORD_HEADER.unpack(header)
+    payload = file.read(length)
+    if len(payload) < length or zlib.crc32(payload) != checksum:
+        return None
+    return payload
+
+
+class DiskSpool:
+    """An append-only log of messages on local disk, kept in numbered segment files.
+
+    Appends are durable when `append` returns. Concurrent appends share fsyncs: whichever caller syncs
+    first covers every record written before it, so the others return without syncing again. Records
+    are read back in order from a cursor that `commit` advances and persists, and segments are deleted
+    once they have been read entirely. A record torn by a crash is dropped together with anything after it.
+
+    Only one process may open a spool directory at a time, see `claim_spool`.
+    """
+
+    def __init__(self, directory: str | Path, *, segment_size: int = 16 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+
+        self._lock_file = (self.directory / LOCK_FILE_NAME).open('ab')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            self._lock_file.close()
+            msg = f'{self.directory} is in use by another process'
+            raise SpoolInUseError(msg) from e
+
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._appends = 0
+        self._synced = 0
+        self._retired: list[IO[bytes]] = []
+
+        self._committed = self._load_cursor()
+        segments = self._segments()
+        self._segment = segments[-1] if segments else self._committed[0]
+        self._offset = self._truncate_torn_tail(self._segment_path(self._segment))
+        self._file = self._segment_path(self._segment).open('ab')
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f'{segment:012d}{SEGMENT_SUFFIX}'
+
+    def _segments(self) -> list[int]:
+        return sorted(int(path.stem) for path in self.directory.glob(f'*{SEGMENT_SUFFIX}'))
+
+    def _load_cursor(self) -> Position:
+        try:
+            segment, offset = (self.directory / CURSOR_FILE_NAME).read_text().split()
+        except FileNotFoundError:
+            segments = self._segments()
+            return (segments[0] if segments else 1, 0)
+        return int(segment), int(offset)
+
+    @staticmethod
+    def _truncate_torn_tail(path: Path) -> int:
+        """Cut a record left incomplete by a crash off the end of `path`, returning its valid length."""
+        if not path.exists():
+            return 0
+
+        with path.open('r+b') as file:
+            valid = 0
+            while _read_record(file) is not None:
+                valid = file.tell()
+            if valid != path.stat().st_size:
+                logger.warning('Dropping a torn record at the end of %s', path)
+                file.truncate(valid)
+        return valid
+
+    @property
+    def pending(self) -> bool:
+        """Whether some records have not been committed yet."""
+        with self._lock:
+            return self._committed < (self._segment, self._offset)
+
+    def append(self, message: SpooledMessage) -> None:
+        record = _encode(message)
+        with self._lock:
+            if self._offset and self._offset + len(record) > self.segment_size:
+                # the segment is synced and closed by the next `_sync`, which then covers its records too.
+                self._retired.append(self._file)
+                self._segment += 1
+                self._offset = 0
+                self._file = self._segment_path(self._segment).open('ab')
+
+            self._file.write(record)
+            self._file.flush()
+            self._offset += len(record)
+            self._appends += 1
+            ticket = self._appends
+            self._appended.notify_all()
+
+        self._sync(ticket)
+
+    def _sync(self, ticket: int) -> None:
+        with self._sync_lock:
+            if self._synced >= ticket:
+                return
+
+            with self._lock:
+                target = self._appends
+                retired, self._retired = self._retired, []
+                file = self._file
+
+            for retired_file in retired:
+                os.fsync(retired_file.fileno())
+                retired_file.close()
+            os.fsync(file.fileno())
+            self._synced = target
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait up to `timeout` seconds for uncommitted records, returning whether there are any."""
+        with self._appended:
+            return self._appended.wait_for(lambda: self._committed < (self._segment, self._offset), timeout)
+
+    def read(self, limit: int) -> list[tuple[Position, SpooledMessage]]:
+        """Return up to `limit` uncommitted messages in order, each with the position just after it."""
+        with self._lock:
+            segment, offset = self._committed
+            end = (self._segment, self._offset)
+
+        messages: list[tuple[Position, SpooledMessage]] = []
+        while len(messages) < limit and (segment, offset) < end:
+            path = self._segment_path(segment)
+            if path.exists():
+                with path.open('rb') as file:
+                    file.seek(offset)
+                    while len(messages) < limit and (segment, offset) < end:
+                        payload = _read_record(file)
+                        if payload is None:
+                            break
+                        offset = file.tell()
+                        messages.append(((segment, offset), _decode(payload)))
+
+            if len(messages) < limit and segment < end[0]:
+                segment, offset = segment + 1, 0
+            else:
+                break
+
+        return messages
+
+    def commit(self, position: Position) -> None:
+        """Mark every record before `position` as handled, deleting the segments that are done."""
+        cursor_path = self.directory / CURSOR_FILE_NAME
+        temporary_path = cursor_path.with_suffix('.tmp')
+        temporary_path.write_text(f'{position[0]} {position[1]}')
+        temporary_path.replace(cursor_path)
+
+        with self._lock:
+            self._committed = position
+            for segment in self._segments():
+                if segment < position[0]:
+                    self._segment_path(segment).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self._sync_lock, self._lock:
+            for file in [*self._retired, self._file]:
+                file.flush()
+                os.fsync(file.fileno())
+                file.close()
+            self._retired = []
+            self._lock_file.close()
+
+
+def claim_spool(directory: str | Path, *, segment_size: int = 16 * 1024 * 1024) -> DiskSpool:
+    """Open the first spool under `directory` that no other process holds.
+
+    Every process publishing from the same host gets a spool of its own, and a spool left behind by a process
+    that exited is picked up, and drained, by the next one to claim it.
+    """
+    for slot in range(MAX_SPOOLS):
+        try:
+            return DiskSpool(Path(directory) / str(slot), segment_size=segment_size)
+        except SpoolInUseError:
+            continue
+
+    msg = f'all {MAX_SPOOLS} spools under {directory} are in use'
+    raise SpoolInUseError(msg)
+
+
+class SpoolDrainer(threading.Thread):
+    """Publishes spooled messages in order on a transport of its own, whenever the broker is reachable.
+
+    After a failure the transport is reopened with delays doubling from `retry_delay` up to `max_retry_delay`.
+    Messages are committed only once published, so a crash may publish some twice, never lose them.
+    """
+
+    def __init__(
+        self,
+        spool: DiskSpool,
+        open_transport: Callable[[], Transport],
+        *,
+        batch_size: int = 100,
+        retry_delay: float = 1,
+        max_retry_delay: float = 30,
+    ) -> None:
+        super().__init__(name='bookcourier-spool-drainer', daemon=True)
+        self.spool = spool
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.open_transport = open_transport
+        self.max_retry_delay = max_retry_delay
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        transport: Transport | None = None
+        delay = self.retry_delay
+        while not self._stopped.is_set():
+            if not self.spool.wait(timeout=0.5):
+                continue
+
+            try:
+                if transport is None or not transport.is_open:
+                    transport = self.open_transport()
+                self._drain_batch(transport)
+                delay = self.retry_delay
+            except TransportError:
+                logger.warning('Broker unavailable, retrying spooled messages in %ss', delay, exc_info=True)
+                if transport is not None:
+                    transport.close()
+                transport = None
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+        if transport is not None:
+            transport.close()
+
+    def _drain_batch(self, transport: Transport) -> None:
+        published = None
+        try:
+            for position, message in self.spool.read(self.batch_size):
+                transport.publish(message.routing_key, message.body, message.properties, exchange=message.exchange)
+                published = position
+        finally:
+            if published is not None:
+                self.spool.commit(published)
+
+        if not self.spool.pending:
+            logger.info('Spool drained, publishing directly again')
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        self.join(timeout)
@@ -0,0 +1,33 @@
+from secrets import token_hex
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bookcourier.transports import MemoryTransport
+
+
+@pytest.fixture
+def blocking_connection():
+    with patch('pika.BlockingConnection', side_effect=lambda _: MagicMock(is_open=True)) as connection_class:
+        yield connection_class
+
+
+@pytest.fixture
+def memory_url() -> str:
+    """The URL of an in-memory broker no other test shares."""
+    return f'memory://{token_hex(8)}'
+
+
+@pytest.fixture
+def stop_when_idle():
+    """Interrupt consumers, as CTRL+C would, when they block on a memory transport with nothing left to deliver."""
+    receive = MemoryTransport.receive
+
+    def receive_until_idle(self: MemoryTransport, *, max_messages: int, timeout: float | None) -> list:
+        deliveries = receive(self, max_messages=max_messages, timeout=0.05 if timeout is None else timeout)
+        if not deliveries and timeout is None:
+            raise KeyboardInterrupt
+        return deliveries
+
+    with patch.object(MemoryTransport, 'receive', receive_until_idle):
+        yield
@@ -0,0 +1,46 @@
+import pytest
+
+from bookcourier import BookCourier
+from bookcourier.codecs import (
+    CODECS,
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    JSONCodec,
+    DecodeError,
+    decode,
+    get_codec,
+)
+
+MESSAGE = {'event': 'book_removed', 'book_id': 'book_1'}
+
+
+@pytest.mark.parametrize('content_type', sorted(CODECS))
+def test_codecs_round_trip(content_type: str) -> None:
+    codec = get_codec(content_type)
+
+    assert decode(codec.encode(MESSAGE), content_type) == MESSAGE
+
+
+def test_messages_without_a_content_type_are_json() -> None:
+    assert decode(JSONCodec().encode(MESSAGE), None) == MESSAGE
+    assert get_codec(None).content_type == JSON_CONTENT_TYPE
+
+
+def test_unknown_content_types_are_rejected() -> None:
+    with pytest.raises(DecodeError, match='no codec'):
+        decode(b'', 'application/xml')
+
+
+def test_invalid_bodies_raise_decode_error() -> None:
+    with pytest.raises(DecodeError):
+        decode(b'{"event": ', JSON_CONTENT_TYPE)
+
+
+def test_codecs_whose_library_is_missing_name_the_package(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delitem(CODECS, MSGPACK_CONTENT_TYPE, raising=False)
+
+    with pytest.raises(ModuleNotFoundError, match=r'install bookcourier\[msgpack\]') as excinfo:
+        BookCourier('memory://codecs', content_type=MSGPACK_CONTENT_TYPE)
+    assert excinfo.value.name == 'msgpack'
+    with pytest.raises(DecodeError, match='needs the msgpack package'):
+        decode(b'\x80', MSGPACK_CONTENT_TYPE)
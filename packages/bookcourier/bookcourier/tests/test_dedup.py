@@ -0,0 +1,184 @@
+import contextlib
+from pathlib import Path
+
+import pika
+import pytest
+
+from bookcourier import BookCourier, PartialBatchError
+from bookcourier.dedup import SEQUENCE_HEADER, PRODUCER_ID_HEADER, Deduplicator, SequenceWindow
+from bookcourier.metrics import PUBLISHED_AT_HEADER
+from bookcourier.eventlog import read_event_log
+from bookcourier.transports import transport_factory
+
+
+class MemoryStore:
+    """A `DeduplicationStore` whose transactions roll back claims when they raise."""
+
+    def __init__(self) -> None:
+        self.ids: set[str] = set()
+        self.claims = 0
+
+    @contextlib.contextmanager
+    def atomic(self):
+        snapshot = set(self.ids)
+        try:
+            yield
+        except Exception:
+            self.ids = snapshot
+            raise
+
+    def claim(self, message_ids: list[str]) -> set[str]:
+        self.claims += 1
+        seen = self.ids & set(message_ids)
+        self.ids.update(message_ids)
+        return seen
+
+    def release(self, message_ids: list[str]) -> None:
+        self.ids.difference_update(message_ids)
+
+    def purge(self, older_than: float) -> int:
+        purged = len(self.ids)
+        self.ids.clear()
+        return purged
+
+
+def message(sequence: int, producer_id: str = 'producer') -> tuple[pika.BasicProperties, int]:
+    properties = pika.BasicProperties(
+        message_id=f'{producer_id}:{sequence}',
+        headers={PRODUCER_ID_HEADER: producer_id, SEQUENCE_HEADER: sequence},
+    )
+    return properties, sequence
+
+
+def test_window_keeps_a_range_and_the_sequences_ahead_of_it() -> None:
+    window = SequenceWindow()
+    for sequence in (5, 6, 8, 4, 7, 10):
+        window.add('producer', sequence)
+
+    assert [sequence for sequence in range(1, 12) if ('producer', sequence) in window] == [4, 5, 6, 7, 8, 10]
+    assert ('other', 5) not in window
+
+
+def test_window_forgets_the_least_recent_producer() -> None:
+    window = SequenceWindow(max_producers=2)
+    for producer_id in ('a', 'b', 'a', 'c'):
+        window.add(producer_id, 1)
+
+    assert ('a', 1) in window
+    assert ('b', 1) not in window
+
+
+def test_redelivered_events_are_skipped() -> None:
+    store = MemoryStore()
+    deduplicator = Deduplicator(store)
+    applied = []
+
+    assert deduplicator.process([message(1), message(2), message(1)], applied.extend) == {2}
+    assert deduplicator.process([message(2), message(3)], applied.extend) == {0}
+
+    assert applied == [1, 2, 3]
+    assert store.claims == 2  # sequence 2 was recognised without asking the store
+
+
+def test_events_are_skipped_after_a_restart_from_the_store() -> None:
+    store = MemoryStore()
+    Deduplicator(store).process([message(1)], lambda _: None)
+    applied = []
+
+    Deduplicator(store).process([message(1), message(2)], applied.extend)
+
+    assert applied == [2]
+
+
+def test_events_without_an_id_are_always_processed() -> None:
+    applied = []
+    Deduplicator(MemoryStore()).process([(pika.BasicProperties(), 'legacy')] * 2, applied.extend)
+
+    assert applied == ['legacy', 'legacy']
+
+
+def test_failed_events_are_not_recorded() -> None:
+    store = MemoryStore()
+    deduplicator = Deduplicator(store)
+
+    def fail(_: list) -> None:
+        msg = 'database is unavailable'
+        raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError):
+        deduplicator.process([message(1)], fail)
+
+    applied = []
+    deduplicator.process([message(1)], applied.extend)
+    assert applied == [1]
+
+
+def test_partial_failures_are_reported_against_the_original_batch() -> None:
+    store = MemoryStore()
+    deduplicator = Deduplicator(store)
+    deduplicator.process([message(1)], lambda _: None)
+
+    def fail_second(events: list) -> None:
+        assert events == [2, 3]
+        raise PartialBatchError({1: RuntimeError('book is locked')})
+
+    with pytest.raises(PartialBatchError) as raised:
+        deduplicator.process([message(1), message(2), message(3)], fail_second)
+
+    assert list(raised.value.failures) == [2]
+    assert raised.value.skipped == {0}
+    assert store.ids == {'producer:1', 'producer:2'}
+    assert ('producer', 3) not in deduplicator.window
+
+
+def test_events_published_before_a_snapshot_are_skipped() -> None:
+    messages = [message(sequence) for sequence in (1, 2, 3)]
+    for properties, sequence in messages[:2]:
+        properties.headers[PUBLISHED_AT_HEADER] = 1_700_000_000_000 + sequence * 1000
+    applied = []
+
+    Deduplicator(MemoryStore(), applied_before=1_700_000_001.5).process(messages, applied.extend)
+
+    # the last event carries no publish time, so it may not be in the snapshot.
+    assert applied == [2, 3]
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+@pytest.mark.parametrize('consume', ['events', 'batches'])
+def test_skipped_duplicates_are_neither_counted_nor_logged(memory_url: str, tmp_path: Path, consume: str) -> None:
+    courier = BookCourier(memory_url, event_log_directory=str(tmp_path))
+    courier.publish_book_removed('book_one')
+    queue_name = courier.queues['management']
+    transport = transport_factory(memory_url)()
+    delivery = transport.get(queue_name)
+    for _ in range(2):
+        transport.publish(queue_name, delivery.body, delivery.properties)
+    transport.ack(delivery.delivery_tag)
+
+    applied = []
+    deduplicator = Deduplicator(MemoryStore())
+    if consume == 'events':
+        courier.consume_events(queue='management', callback=applied.append, deduplicator=deduplicator)
+    else:
+        courier.consume_batches(queue='management', callback=applied.extend, max_wait=0.01, deduplicator=deduplicator)
+    courier.close()
+
+    events = courier.metrics.events
+    assert [event['book_id'] for event in applied] == ['book_one']
+    assert events.value(queue=queue_name, event='book_removed', outcome='processed') == 1
+    assert events.value(queue=queue_name, event='book_removed', outcome='duplicate') == 1
+    assert courier.metrics.propagation_seconds.count(queue=queue_name, event='book_removed') == 1
+    assert len([logged for batch in read_event_log(tmp_path / queue_name) for logged in batch]) == 1
+
+
+def test_published_events_carry_a_producer_sequence(memory_url: str) -> None:
+    courier = BookCourier(memory_url)
+    courier.publish_book_removed('book_one')
+    courier.publish_book_removed('book_two')
+
+    transport = transport_factory(memory_url)()
+    queue_name = courier.queues['management']
+    first, second = (transport.get(queue_name).properties for _ in range(2))
+    assert first.headers[PRODUCER_ID_HEADER] == second.headers[PRODUCER_ID_HEADER]
+    assert [first.headers[SEQUENCE_HEADER], second.headers[SEQUENCE_HEADER]] == [1, 2]
+    assert second.message_id == f'{second.headers[PRODUCER_ID_HEADER]}:2'
@@ -0,0 +1,104 @@
+import json
+import threading
+
+import pika
+import pytest
+
+from bookcourier import BookCourier, RetryPolicy
+from bookcourier.dedup import SEQUENCE_HEADER
+from bookcourier.codecs import DecodeError
+from bookcourier.routing import bulk_lane_name
+from bookcourier.envelopes import ENVELOPE_HEADER, unpack
+from bookcourier.transports import Delivery, transport_factory
+
+
+def book_removed(book_id: str) -> dict:
+    return {'event': 'book_removed', 'book_id': book_id}
+
+
+def user_registered(user_id: str) -> dict:
+    return {
+        'event': 'user_registered',
+        'user': {'id': user_id, 'email': 'a@b.c', 'is_admin': False, 'first_name': 'A', 'last_name': 'B'},
+    }
+
+
+def drain(url: str, queue_name: str) -> list[Delivery]:
+    transport = transport_factory(url)()
+    deliveries = []
+    while (delivery := transport.get(queue_name)) is not None:
+        deliveries.append(delivery)
+    return deliveries
+
+
+def test_consecutive_events_with_a_routing_key_share_envelopes(memory_url: str) -> None:
+    courier = BookCourier(memory_url, max_envelope_size=3)
+    events = [*(book_removed(str(i)) for i in range(5)), user_registered('user'), book_removed('5')]
+
+    assert courier.publish_many(events) == []
+
+    management = drain(memory_url, bulk_lane_name(courier.queues['management']))
+    assert [delivery.properties.headers.get(ENVELOPE_HEADER) for delivery in management] == [3, 2, None]
+    assert [delivery.properties.headers[SEQUENCE_HEADER] for delivery in management] == [1, 4, 7]
+    assert [item.event for delivery in management for item in unpack(delivery)] == [
+        *(book_removed(str(i)) for i in range(5)),
+        book_removed('5'),
+    ]
+    [transaction] = drain(memory_url, bulk_lane_name(courier.queues['transaction']))
+    assert json.loads(transaction.body) == user_registered('user')
+
+
+def test_unpacked_events_get_their_own_sequence_numbers() -> None:
+    properties = pika.BasicProperties(
+        message_id='producer:7',
+        headers={'x-producer-id': 'producer', SEQUENCE_HEADER: 7, ENVELOPE_HEADER: 2},
+    )
+    body = json.dumps([book_removed('one'), book_removed('two')]).encode()
+
+    first, second = unpack(Delivery(1, properties, body))
+
+    assert [first.properties.message_id, second.properties.message_id] == ['producer:7', 'producer:8']
+    assert second.properties.headers == {'x-producer-id': 'producer', SEQUENCE_HEADER: 8}
+    assert json.loads(second.body) == book_removed('two')
+    assert properties.headers[SEQUENCE_HEADER] == 7
+
+
+def test_envelopes_must_hold_the_events_they_declare() -> None:
+    properties = pika.BasicProperties(headers={ENVELOPE_HEADER: 3})
+
+    with pytest.raises(DecodeError, match='declares'):
+        unpack(Delivery(1, properties, json.dumps([book_removed('one')]).encode()))
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+def test_consumers_unpack_envelopes_and_retry_only_the_failed_events(memory_url: str) -> None:
+    courier = BookCourier(memory_url, retry_policy=RetryPolicy(max_retries=1, base_delay=0.2))
+    courier.publish_many([book_removed('one'), book_removed('two'), book_removed('three')])
+    seen = []
+
+    def fail_two(event: dict) -> None:
+        seen.append(event['book_id'])
+        if event['book_id'] == 'two':
+            msg = 'book is locked'
+            raise RuntimeError(msg)
+
+    courier.consume_events(queue='management', callback=fail_two)
+    courier.close()
+    threading.Event().wait(0.3)
+
+    assert seen == ['one', 'two', 'three']
+    [retried] = drain(memory_url, bulk_lane_name(courier.queues['management']))
+    assert json.loads(retried.body) == book_removed('two')
+    assert ENVELOPE_HEADER not in retried.properties.headers
+    assert retried.properties.headers[SEQUENCE_HEADER] == 2
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+def test_batches_hold_the_events_of_every_envelope(memory_url: str) -> None:
+    courier = BookCourier(memory_url, max_envelope_size=2)
+    courier.publish_many([book_removed(str(i)) for i in range(5)], lane='interactive')
+    batches = []
+
+    courier.consume_batches(queue='management', callback=batches.append, batch_size=10, max_wait=0.01)
+
+    assert [[event['book_id'] for event in batch] for batch in batches] == [['0', '1', '2', '3', '4']]
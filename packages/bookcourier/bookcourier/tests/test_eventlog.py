@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+
+from bookcourier import BookCourier
+from bookcourier.eventlog import EventLog, EventLogInUseError, read_event_log
+
+
+def book_removed(number: int) -> dict:
+    return {'event': 'book_removed', 'book_id': f'book_{number}'}
+
+
+def read_all(directory: Path, *, start: int = 1, batch_size: int = 1000) -> list[tuple[int, str]]:
+    return [
+        (logged.sequence, logged.event['book_id'])
+        for batch in read_event_log(directory, start=start, batch_size=batch_size)
+        for logged in batch
+    ]
+
+
+def test_events_are_numbered_and_read_back_in_batches(tmp_path: Path) -> None:
+    log = EventLog(tmp_path)
+    assert [log.append(book_removed(number)) for number in range(5)] == [1, 2, 3, 4, 5]
+    log.close()
+
+    batches = list(read_event_log(tmp_path, batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert read_all(tmp_path) == [(number + 1, f'book_{number}') for number in range(5)]
+
+
+def test_reading_starts_at_any_sequence_across_segments(tmp_path: Path) -> None:
+    log = EventLog(tmp_path, segment_size=500, index_interval=100)
+    for number in range(50):
+        log.append(book_removed(number))
+    log.close()
+
+    assert len(list(tmp_path.glob('*.log'))) > 1
+    assert all(index.stat().st_size for index in tmp_path.glob('*.index'))
+    for start in (1, 7, 23, 50):
+        assert read_all(tmp_path, start=start) == [(number + 1, f'book_{number}') for number in range(start - 1, 50)]
+    assert read_all(tmp_path, start=51) == []
+
+
+def test_numbering_continues_after_a_torn_record_is_dropped(tmp_path: Path) -> None:
+    log = EventLog(tmp_path, index_interval=1)
+    for number in range(3):
+        log.append(book_removed(number))
+    log.close()
+
+    segment = next(tmp_path.glob('*.log'))
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    log = EventLog(tmp_path, index_interval=1)
+    assert log.next_sequence == 3
+    log.append(book_removed(3))
+    log.close()
+
+    assert read_all(tmp_path) == [(1, 'book_0'), (2, 'book_1'), (3, 'book_3')]
+    assert read_all(tmp_path, start=3) == [(3, 'book_3')]
+
+
+def test_only_one_process_appends_to_a_log(tmp_path: Path) -> None:
+    log = EventLog(tmp_path)
+    with pytest.raises(EventLogInUseError):
+        EventLog(tmp_path)
+    log.close()
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+def test_committed_events_are_logged_and_replayed(memory_url: str, tmp_path: Path) -> None:
+    courier = BookCourier(memory_url, event_log_directory=str(tmp_path))
+    courier.publish_book_removed('book_0')
+    courier.publish_many([book_removed(number) for number in range(1, 4)])
+    courier.publish_book_removed('book_failing')
+
+    def fail(event: dict) -> None:
+        if event['book_id'] == 'book_failing':
+            msg = 'book is locked'
+            raise RuntimeError(msg)
+
+    courier.consume_events(queue='management', callback=fail)
+    courier.close()
+
+    batches = []
+    replayed = courier.replay_event_log(queue='management', callback=batches.append, batch_size=3)
+
+    assert replayed == 4
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert sorted(event['book_id'] for batch in batches for event in batch) == [f'book_{i}' for i in range(4)]
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+def test_batch_consumers_log_the_events_they_commit(memory_url: str, tmp_path: Path) -> None:
+    courier = BookCourier(memory_url, event_log_directory=str(tmp_path))
+    for number in range(3):
+        courier.publish_book_removed(f'book_{number}')
+
+    courier.consume_batches(queue='management', callback=lambda _: None, batch_size=2, max_wait=0.01)
+    courier.close()
+
+    assert read_all(tmp_path / courier.queues['management']) == [(1, 'book_0'), (2, 'book_1'), (3, 'book_2')]
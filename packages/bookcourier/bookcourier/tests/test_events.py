@@ -0,0 +1,55 @@
+import datetime
+
+import pytest
+
+from bookcourier.events import BookBorrowed, BookReturned, InvalidEventError, parse_event
+
+
+def test_events_are_parsed_into_structs() -> None:
+    event = parse_event(
+        {
+            'event': 'book_borrowed',
+            'borrowed_book': {
+                'id': 'borrowed_1',
+                'book_id': 'book_1',
+                'user_id': 'user_1',
+                'created_at': '2024-09-01T10:00:00+00:00',
+                'updated_at': '2024-09-01T10:00:00+00:00',
+                'proposed_return_date': '2024-09-08T10:00:00+00:00',
+            },
+        }
+    )
+
+    assert isinstance(event, BookBorrowed)
+    assert event.borrowed_book.book_id == 'book_1'
+    assert event.borrowed_book.proposed_return_date == datetime.datetime(2024, 9, 8, 10, tzinfo=datetime.UTC)
+    assert not hasattr(event, '__dict__')
+
+
+def test_unknown_events_are_ignored() -> None:
+    assert parse_event({'event': 'book_reviewed'}) is None
+
+
+@pytest.mark.parametrize(
+    'message',
+    [
+        {'event': 'book_returned', 'borrowed_book_id': 'borrowed_1'},
+        {'event': 'book_returned', 'borrowed_book_id': 1, 'actual_return_date': '2024-09-01T10:00:00+00:00'},
+        {'event': 'book_returned', 'borrowed_book_id': 'borrowed_1', 'actual_return_date': 'yesterday'},
+        {'event': 'book_added', 'book': 'book_1'},
+        ['book_returned'],
+    ],
+)
+def test_invalid_events_are_rejected(message) -> None:
+    with pytest.raises(InvalidEventError):
+        parse_event(message)
+
+
+def test_returned_event_dates_are_parsed() -> None:
+    event = parse_event(
+        {'event': 'book_returned', 'borrowed_book_id': 'borrowed_1', 'actual_return_date': '2024-09-01T10:00:00Z'}
+    )
+
+    assert event == BookReturned(
+        borrowed_book_id='borrowed_1', actual_return_date=datetime.datetime(2024, 9, 1, 10, tzinfo=datetime.UTC)
+    )
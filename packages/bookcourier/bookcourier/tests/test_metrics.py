@@ -0,0 +1,128 @@
+import re
+import time
+import urllib.request
+
+import pika
+import pytest
+
+from bookcourier import BookCourier
+from bookcourier.metrics import (
+    PUBLISHED_AT_HEADER,
+    Counter,
+    Histogram,
+    ConsumerMetrics,
+    QueueDepthSampler,
+    start_metrics_server,
+)
+from bookcourier.transports import transport_factory
+
+
+def test_counters_render_one_sample_per_label_combination() -> None:
+    counter = Counter('events_total', 'Events consumed.', ('queue', 'outcome'))
+    counter.inc(queue='books', outcome='processed')
+    counter.inc(2, queue='books', outcome='processed')
+    counter.inc(queue='say "hi"', outcome='failed')
+
+    assert counter.render() == [
+        '# HELP events_total Events consumed.',
+        '# TYPE events_total counter',
+        'events_total{queue="books",outcome="processed"} 3',
+        'events_total{queue="say \\"hi\\"",outcome="failed"} 1',
+    ]
+
+
+def test_labels_must_match_the_metric() -> None:
+    with pytest.raises(ValueError, match='expects labels'):
+        Counter('events_total', 'Events consumed.', ('queue',)).inc(event='book_added')
+
+
+def test_histograms_render_cumulative_buckets() -> None:
+    histogram = Histogram('handling_seconds', 'Handling time.', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+
+    assert histogram.render()[2:] == [
+        'handling_seconds_bucket{le="0.1"} 1',
+        'handling_seconds_bucket{le="1"} 3',
+        'handling_seconds_bucket{le="+Inf"} 4',
+        'handling_seconds_sum 4.25',
+        'handling_seconds_count 4',
+    ]
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+def test_consumers_record_outcomes_latency_and_age(memory_url: str) -> None:
+    courier = BookCourier(memory_url)
+    courier.publish_book_removed('one')
+    courier.publish_book_removed('two')
+    transport_factory(memory_url)().publish(
+        courier.queues['management'], b'not json', pika.BasicProperties(timestamp=int(time.time()))
+    )
+
+    def fail_two(event: dict) -> None:
+        if event['book_id'] == 'two':
+            msg = 'book is locked'
+            raise RuntimeError(msg)
+
+    courier.consume_events(queue='management', callback=fail_two)
+
+    queue_name = courier.queues['management']
+    events = courier.metrics.events
+    assert events.value(queue=queue_name, event='book_removed', outcome='processed') == 1
+    assert events.value(queue=queue_name, event='book_removed', outcome='failed') == 1
+    assert events.value(queue=queue_name, event='unknown', outcome='undecodable') == 1
+    assert courier.metrics.handling_seconds.count(queue=queue_name, event='book_removed') == 2
+    assert courier.metrics.age_seconds.count(queue=queue_name, event='book_removed') == 2
+    assert courier.metrics.propagation_seconds.count(queue=queue_name, event='book_removed') == 1
+
+
+def test_ages_are_measured_to_the_millisecond_when_published_at_is_stamped() -> None:
+    metrics = ConsumerMetrics()
+    event = {'event': 'book_removed', 'book_id': 'one'}
+    now = time.time()
+    metrics.record_received('books', event, pika.BasicProperties(timestamp=int(now) - 1))
+    metrics.record_received(
+        'books', event, pika.BasicProperties(timestamp=int(now) - 1, headers={PUBLISHED_AT_HEADER: int(now * 1000)})
+    )
+
+    assert 'bookcourier_event_age_seconds_bucket{queue="books",event="book_removed",le="0.5"} 1' in metrics.render()
+    assert metrics.age_seconds.count(queue='books', event='book_removed') == 2
+
+
+@pytest.mark.usefixtures('stop_when_idle')
+def test_slow_propagation_is_flagged_with_the_trace_id(memory_url: str, caplog: pytest.LogCaptureFixture) -> None:
+    courier = BookCourier(memory_url, propagation_outlier_seconds=0.05)
+    courier.publish_book_removed('slow')
+    time.sleep(0.1)
+    courier.consume_events(queue='management', callback=lambda _: None)
+    courier.publish_book_removed('fast')
+    courier.consume_batches(queue='management', callback=lambda _: None, max_wait=0.01)
+
+    queue_name = courier.queues['management']
+    assert courier.metrics.propagation_seconds.count(queue=queue_name, event='book_removed') == 2
+    assert courier.metrics.propagation_outliers.value(queue=queue_name, event='book_removed') == 1
+    assert re.search(r'took \d+\.\d+s to propagate to \S+ \(trace [0-9a-f]{32}\)', caplog.text)
+
+
+def test_queue_depths_are_sampled_and_served(memory_url: str) -> None:
+    metrics = ConsumerMetrics()
+    transport = transport_factory(memory_url)()
+    transport.publish('events', b'{}', pika.BasicProperties())
+
+    sampler = QueueDepthSampler(metrics, transport_factory(memory_url), ['events'], interval=0.01)
+    sampler.start()
+    deadline = time.monotonic() + 5
+    while metrics.queue_depth.value(queue='events') != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sampler.stop()
+
+    server = start_metrics_server(metrics, port=0, host='127.0.0.1')
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/metrics') as response:
+            body = response.read().decode()
+            content_type = response.headers['Content-Type']
+    finally:
+        server.shutdown()
+
+    assert content_type.startswith('text/plain; version=0.0.4')
+    assert 'bookcourier_queue_depth{queue="events"} 1\n' in body
@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock
+
+import pika
+import pytest
+
+from bookcourier import BookCourier
+from bookcourier.retries import (
+    LAST_ERROR_HEADER,
+    RETRY_COUNT_HEADER,
+    RetryPolicy,
+    retry_later,
+    declare_retry_queues,
+)
+from bookcourier.transports import transport_factory
+
+
+def test_retry_delays_grow_exponentially() -> None:
+    assert RetryPolicy(max_retries=4, base_delay=1, multiplier=5).delays == [1, 5, 25, 125]
+
+
+def test_retry_queues_dead_letter_back_onto_the_queue() -> None:
+    transport = MagicMock()
+
+    declare_retry_queues(transport, 'events', RetryPolicy(max_retries=2, base_delay=0.5, multiplier=4))
+
+    declared = {c.args[0]: c.kwargs for c in transport.declare_queue.call_args_list}
+    assert declared == {
+        'events.retry.500ms': {'message_ttl': 0.5, 'dead_letter_queue': 'events'},
+        'events.retry.2000ms': {'message_ttl': 2.0, 'dead_letter_queue': 'events'},
+        'events.parking_lot': {},
+    }
+
+
+@pytest.mark.parametrize(
+    ('retry_count', 'routing_key'),
+    [(None, 'events.retry.1000ms'), (1, 'events.retry.5000ms'), (2, 'events.parking_lot')],
+)
+def test_failed_events_move_through_the_tiers_to_the_parking_lot(retry_count: int | None, routing_key: str) -> None:
+    transport = MagicMock()
+    properties = pika.BasicProperties(headers={RETRY_COUNT_HEADER: retry_count} if retry_count else None)
+
+    retry_later(
+        transport,
+        queue_name='events',
+        policy=RetryPolicy(max_retries=2),
+        properties=properties,
+        body=b'{}',
+        error=RuntimeError('boom'),
+    )
+
+    published_to, _, published = transport.publish.call_args.args
+    assert published_to == routing_key
+    assert published.headers == {
+        RETRY_COUNT_HEADER: (retry_count or 0) + 1,
+        LAST_ERROR_HEADER: 'RuntimeError: boom',
+    }
+    assert properties.headers != published.headers
+
+
+def test_replaying_parked_events_resets_their_retries(memory_url: str) -> None:
+    courier = BookCourier(memory_url)
+    queue_name = courier.queues['management']
+    transport = transport_factory(memory_url)()
+    parked = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 5})
+    for body in (b'1', b'2', b'3'):
+        transport.publish(f'{queue_name}.parking_lot', body, parked)
+
+    assert courier.replay_parked_events(queue='management', limit=2) == 2
+
+    replayed = [transport.get(queue_name) for _ in range(2)]
+    assert [delivery.body for delivery in replayed] == [b'1', b'2']
+    assert all(delivery.properties.headers == {} for delivery in replayed)
+    assert transport.get(f'{queue_name}.parking_lot').body == b'3'
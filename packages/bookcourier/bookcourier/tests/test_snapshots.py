@@ -0,0 +1,24 @@
+import io
+
+import pytest
+
+from bookcourier.snapshots import SnapshotError, SnapshotHeader, read_snapshot_header, write_snapshot_header
+
+
+def test_headers_are_read_back_leaving_the_file_at_the_rows() -> None:
+    header = SnapshotHeader(table='books', columns=['id', 'isbn'], rows=1, taken_at=1_700_000_000.25)
+    file = io.StringIO()
+    write_snapshot_header(file, header)
+    file.write('book_1,9780385474542\n')
+    file.seek(0)
+
+    assert read_snapshot_header(file) == header
+    assert file.read() == 'book_1,9780385474542\n'
+
+
+@pytest.mark.parametrize(
+    'first_line', ['id,isbn\n', '{"format": "bookcourier-snapshot/0"}\n', '{"format": "bookcourier-snapshot/1"}\n']
+)
+def test_other_files_are_rejected(first_line: str) -> None:
+    with pytest.raises(SnapshotError):
+        read_snapshot_header(io.StringIO(first_line))
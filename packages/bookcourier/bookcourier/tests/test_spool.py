@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pika
+import pytest
+
+from bookcourier import BookCourier
+from bookcourier.spool import DiskSpool, SpooledMessage, SpoolInUseError, claim_spool
+from bookcourier.transports import TransportError, MemoryTransport, transport_factory
+
+from .test_courier import wait_for
+
+
+def message(number: int) -> SpooledMessage:
+    properties = pika.BasicProperties(message_id=f'producer:{number}', headers={'x-sequence': number})
+    return SpooledMessage('bookcourier_events', 'book.removed', properties, str(number).encode())
+
+
+def test_messages_are_read_in_order_until_committed(tmp_path: Path) -> None:
+    spool = DiskSpool(tmp_path)
+    for number in range(5):
+        spool.append(message(number))
+
+    first = spool.read(3)
+    assert [int(spooled.body) for _, spooled in first] == [0, 1, 2]
+    assert [int(spooled.body) for _, spooled in spool.read(3)] == [0, 1, 2]
+
+    spool.commit(first[-1][0])
+    rest = spool.read(10)
+    assert [int(spooled.body) for _, spooled in rest] == [3, 4]
+    assert rest[0][1].properties.message_id == 'producer:3'
+    assert rest[0][1].routing_key == 'book.removed'
+
+    spool.commit(rest[-1][0])
+    assert not spool.pending
+    spool.close()
+
+
+def test_uncommitted_messages_survive_a_restart(tmp_path: Path) -> None:
+    spool = DiskSpool(tmp_path)
+    for number in range(3):
+        spool.append(message(number))
+    spool.commit(spool.read(1)[0][0])
+    spool.close()
+
+    spool = DiskSpool(tmp_path)
+    assert spool.pending
+    assert [int(spooled.body) for _, spooled in spool.read(10)] == [1, 2]
+    spool.close()
+
+
+def test_a_record_torn_by_a_crash_is_dropped(tmp_path: Path) -> None:
+    spool = DiskSpool(tmp_path)
+    spool.append(message(0))
+    spool.append(message(1))
+    spool.close()
+
+    segment = next(tmp_path.glob('*.seg'))
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    spool = DiskSpool(tmp_path)
+    assert [int(spooled.body) for _, spooled in spool.read(10)] == [0]
+    spool.append(message(2))
+    assert [int(spooled.body) for _, spooled in spool.read(10)] == [0, 2]
+    spool.close()
+
+
+def test_segments_rotate_and_are_deleted_once_committed(tmp_path: Path) -> None:
+    spool = DiskSpool(tmp_path, segment_size=200)
+    for number in range(10):
+        spool.append(message(number))
+    assert len(list(tmp_path.glob('*.seg'))) > 1
+
+    messages = spool.read(100)
+    assert [int(spooled.body) for _, spooled in messages] == list(range(10))
+
+    spool.commit(messages[-1][0])
+    assert len(list(tmp_path.glob('*.seg'))) == 1
+    spool.close()
+
+
+def test_each_process_claims_a_spool_of_its_own(tmp_path: Path) -> None:
+    first = claim_spool(tmp_path)
+    second = claim_spool(tmp_path)
+    assert first.directory != second.directory
+
+    with pytest.raises(SpoolInUseError):
+        DiskSpool(first.directory)
+
+    first.close()
+    third = claim_spool(tmp_path)
+    assert third.directory == first.directory
+    second.close()
+    third.close()
+
+
+def test_events_are_spooled_while_the_broker_is_down_and_drained_in_order(memory_url: str, tmp_path: Path) -> None:
+    courier = BookCourier(memory_url, spool_directory=str(tmp_path))
+    courier.publish_book_removed('book-0')
+    transport = transport_factory(memory_url)()
+
+    with patch.object(MemoryTransport, 'publish', side_effect=TransportError('connection refused')):
+        for number in range(1, 4):
+            courier.publish_book_removed(f'book-{number}')
+        assert transport.queue_depth(courier.queues['management']) == 1
+
+    received = []
+
+    def drained() -> bool:
+        while (delivery := transport.get(courier.queues['management'])) is not None:
+            received.append(json.loads(delivery.body)['book_id'])
+        return len(received) == 4
+
+    assert wait_for(drained)
+    assert received == ['book-0', 'book-1', 'book-2', 'book-3']
+    courier.close()
+    transport.close()
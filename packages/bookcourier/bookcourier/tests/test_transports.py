@@ -0,0 +1,298 @@
+"""Conformance tests every transport must pass.
+
+RabbitMQ is only covered when `BOOKCOURIER_TEST_RABBITMQ_URL` points at a broker the tests may use.
+"""
+
+import os
+import time
+from pathlib import Path
+from secrets import token_hex
+from collections.abc import Callable, Iterator
+
+import pika
+import pytest
+
+from bookcourier.transports import Transport, TransportError, RabbitMQTransport, topic_matches, transport_factory
+
+RABBITMQ_URL = os.environ.get('BOOKCOURIER_TEST_RABBITMQ_URL')
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'rabbitmq'])
+def open_transport(request: pytest.FixtureRequest, tmp_path: Path) -> Iterator[Callable[[], Transport]]:
+    """Open transports that share one broker, closing them all after the test."""
+    match request.param:
+        case 'memory':
+            factory = transport_factory(f'memory://{token_hex(8)}')
+        case 'sqlite':
+            factory = transport_factory(f'sqlite:///{tmp_path / "queue.sqlite3"}')
+        case _:
+            if RABBITMQ_URL is None:
+                pytest.skip('BOOKCOURIER_TEST_RABBITMQ_URL is not set')
+            factory = transport_factory(RABBITMQ_URL)
+
+    transports: list[Transport] = []
+
+    def open_tracked() -> Transport:
+        transport = factory()
+        transports.append(transport)
+        return transport
+
+    yield open_tracked
+    for transport in transports:
+        transport.close()
+
+
+@pytest.fixture
+def queue_name(open_transport: Callable[[], Transport]) -> str:
+    name = f'conformance.{token_hex(4)}'
+    open_transport().declare_queue(name)
+    return name
+
+
+def publish(transport: Transport, queue_name: str, *bodies: bytes) -> None:
+    for body in bodies:
+        transport.publish(queue_name, body, pika.BasicProperties(delivery_mode=2))
+
+
+def receive_all(transport: Transport, count: int, *, timeout: float = 5) -> list[bytes]:
+    bodies: list[bytes] = []
+    deadline = time.monotonic() + timeout
+    while len(bodies) < count and time.monotonic() < deadline:
+        deliveries = transport.receive(max_messages=count - len(bodies), timeout=deadline - time.monotonic())
+        bodies += [delivery.body for delivery in deliveries]
+    return bodies
+
+
+def test_messages_are_received_in_order_with_their_properties(open_transport, queue_name: str) -> None:
+    publisher, consumer = open_transport(), open_transport()
+    properties = pika.BasicProperties(
+        content_type='application/json',
+        delivery_mode=2,
+        message_id='producer:1',
+        timestamp=1_700_000_000,
+        headers={'x-sequence': 1},
+    )
+    publisher.publish(queue_name, b'first', properties)
+    publish(publisher, queue_name, b'second', b'third')
+    consumer.subscribe(queue_name, prefetch_count=10)
+
+    first, *rest = consumer.receive(max_messages=1, timeout=5)
+    assert first.body == b'first'
+    assert first.properties.content_type == 'application/json'
+    assert first.properties.message_id == 'producer:1'
+    assert first.properties.timestamp == 1_700_000_000
+    assert first.properties.headers == {'x-sequence': 1}
+    assert rest == []
+    assert receive_all(consumer, 2) == [b'second', b'third']
+
+
+def test_receive_returns_nothing_once_the_timeout_expires(open_transport, queue_name: str) -> None:
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=1)
+
+    started = time.monotonic()
+    assert consumer.receive(max_messages=1, timeout=0.2) == []
+    assert time.monotonic() - started >= 0.15
+
+
+def test_unacked_messages_are_redelivered_after_close(open_transport, queue_name: str) -> None:
+    publish(open_transport(), queue_name, b'one', b'two')
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=2)
+    deliveries = consumer.receive(max_messages=2, timeout=5)
+    consumer.ack(deliveries[0].delivery_tag)
+    consumer.close()
+
+    other = open_transport()
+    other.subscribe(queue_name, prefetch_count=2)
+    assert receive_all(other, 1) == [b'two']
+
+
+def test_multiple_ack_settles_every_earlier_delivery(open_transport, queue_name: str) -> None:
+    publish(open_transport(), queue_name, b'one', b'two', b'three')
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=3)
+    deliveries = []
+    while len(deliveries) < 3:
+        deliveries += consumer.receive(max_messages=3, timeout=5)
+
+    consumer.ack(deliveries[1].delivery_tag, multiple=True)
+    consumer.close()
+
+    other = open_transport()
+    other.subscribe(queue_name, prefetch_count=3)
+    assert receive_all(other, 3, timeout=0.5) == [b'three']
+
+
+def test_prefetch_limits_unacked_deliveries(open_transport, queue_name: str) -> None:
+    publish(open_transport(), queue_name, b'one', b'two', b'three')
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=2)
+
+    received = consumer.receive(max_messages=3, timeout=5)
+    received += consumer.receive(max_messages=3, timeout=0.3)
+    assert [delivery.body for delivery in received] == [b'one', b'two']
+
+    consumer.ack(received[0].delivery_tag)
+    assert receive_all(consumer, 1) == [b'three']
+
+
+def test_each_subscription_has_a_prefetch_of_its_own(open_transport, queue_name: str) -> None:
+    bulk_queue_name = f'{queue_name}.bulk'
+    publisher = open_transport()
+    publisher.declare_queue(bulk_queue_name)
+    publish(publisher, bulk_queue_name, b'bulk-1', b'bulk-2', b'bulk-3')
+    publish(publisher, queue_name, b'interactive-1', b'interactive-2')
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=5)
+    consumer.subscribe(bulk_queue_name, prefetch_count=1)
+
+    deliveries = []
+    deadline = time.monotonic() + 5
+    while len(deliveries) < 3 and time.monotonic() < deadline:
+        deliveries += consumer.receive(max_messages=10, timeout=0.3)
+
+    assert sorted((delivery.queue_name, delivery.body) for delivery in deliveries) == [
+        (queue_name, b'interactive-1'),
+        (queue_name, b'interactive-2'),
+        (bulk_queue_name, b'bulk-1'),
+    ]
+
+
+def test_multiple_ack_follows_delivery_order_across_subscriptions(open_transport, queue_name: str) -> None:
+    bulk_queue_name = f'{queue_name}.bulk'
+    publisher = open_transport()
+    publisher.declare_queue(bulk_queue_name)
+    publish(publisher, bulk_queue_name, b'bulk-1', b'bulk-2')
+    publish(publisher, queue_name, b'interactive-1')
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=5)
+    consumer.subscribe(bulk_queue_name, prefetch_count=5)
+
+    deliveries = []
+    deadline = time.monotonic() + 5
+    while len(deliveries) < 3 and time.monotonic() < deadline:
+        deliveries += consumer.receive(max_messages=10, timeout=0.3)
+
+    consumer.ack(deliveries[-1].delivery_tag, multiple=True)
+    consumer.close()
+
+    other = open_transport()
+    other.subscribe(queue_name, prefetch_count=5)
+    other.subscribe(bulk_queue_name, prefetch_count=5)
+    assert other.receive(max_messages=10, timeout=0.5) == []
+
+
+def test_competing_consumers_never_share_a_message(open_transport, queue_name: str) -> None:
+    publish(open_transport(), queue_name, *(str(i).encode() for i in range(6)))
+    first, second = open_transport(), open_transport()
+    first.subscribe(queue_name, prefetch_count=3)
+    second.subscribe(queue_name, prefetch_count=3)
+
+    bodies = receive_all(first, 3) + receive_all(second, 3)
+
+    assert sorted(bodies) == [str(i).encode() for i in range(6)]
+
+
+def test_delayed_queues_dead_letter_after_their_ttl(open_transport, queue_name: str) -> None:
+    transport = open_transport()
+    transport.declare_queue(f'{queue_name}.delay', message_ttl=0.3, dead_letter_queue=queue_name)
+    publish(transport, f'{queue_name}.delay', b'later')
+    transport.subscribe(queue_name, prefetch_count=1)
+
+    assert transport.receive(max_messages=1, timeout=0.1) == []
+    assert receive_all(transport, 1) == [b'later']
+
+
+def test_get_takes_one_message_or_returns_none(open_transport, queue_name: str) -> None:
+    transport = open_transport()
+    assert transport.get(queue_name) is None
+
+    publish(transport, queue_name, b'one', b'two')
+    deadline = time.monotonic() + 5
+    while (delivery := transport.get(queue_name)) is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert delivery.body == b'one'
+    transport.ack(delivery.delivery_tag)
+
+
+def test_cancel_stops_new_deliveries(open_transport, queue_name: str) -> None:
+    consumer = open_transport()
+    consumer.subscribe(queue_name, prefetch_count=5)
+    consumer.cancel()
+    publish(open_transport(), queue_name, b'one')
+
+    assert consumer.receive(max_messages=1, timeout=0.3) == []
+    other = open_transport()
+    other.subscribe(queue_name, prefetch_count=1)
+    assert receive_all(other, 1) == [b'one']
+
+
+def test_acking_an_unknown_delivery_fails(open_transport) -> None:
+    transport = open_transport()
+    if isinstance(transport, RabbitMQTransport):
+        pytest.skip('RabbitMQ closes the channel asynchronously')
+
+    with pytest.raises(TransportError):
+        transport.ack(1)
+
+
+def test_queue_depth_counts_ready_messages(open_transport, queue_name: str) -> None:
+    publish(open_transport(), queue_name, b'one', b'two', b'three')
+    consumer = open_transport()
+    deadline = time.monotonic() + 5
+    while consumer.queue_depth(queue_name) < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert consumer.queue_depth(queue_name) == 3
+    consumer.subscribe(queue_name, prefetch_count=1)
+    receive_all(consumer, 1)
+    assert consumer.queue_depth(queue_name) == 2
+
+
+@pytest.mark.parametrize(
+    ('binding_key', 'routing_key', 'matches'),
+    [
+        ('book.added', 'book.added', True),
+        ('book.added', 'book.removed', False),
+        ('book.*', 'book.added', True),
+        ('book.*', 'book.added.late', False),
+        ('#', 'book.added', True),
+        ('#.registered', 'user.registered', True),
+        ('book.#', 'book', True),
+        ('*.*', 'book', False),
+    ],
+)
+def test_topic_matching(binding_key: str, routing_key: str, *, matches: bool) -> None:
+    assert topic_matches(binding_key, routing_key) is matches
+
+
+def test_exchanges_route_to_every_queue_bound_with_a_matching_key(open_transport, queue_name: str) -> None:
+    transport = open_transport()
+    exchange, books, users = f'{queue_name}.exchange', f'{queue_name}.books', f'{queue_name}.users'
+    transport.declare_exchange(exchange)
+    transport.declare_queue(books)
+    transport.declare_queue(users)
+    transport.bind_queue(books, exchange, 'book.*')
+    transport.bind_queue(users, exchange, 'book.added')
+    transport.bind_queue(users, exchange, '#.registered')
+
+    for key in ('book.added', 'user.registered', 'loan.created'):
+        transport.publish(key, key.encode(), pika.BasicProperties(), exchange=exchange)
+
+    consumer = open_transport()
+    consumer.subscribe(books, prefetch_count=5)
+    assert receive_all(consumer, 2, timeout=0.5) == [b'book.added']
+    consumer = open_transport()
+    consumer.subscribe(users, prefetch_count=5)
+    assert receive_all(consumer, 3, timeout=0.5) == [b'book.added', b'user.registered']
+
+
+def test_keepalive_services_an_idle_transport(open_transport, queue_name: str) -> None:
+    transport = open_transport()
+    transport.keepalive()
+    publish(transport, queue_name, b'one')
+    transport.keepalive()
+
+    assert transport.is_open
@@ -0,0 +1,180 @@
+import json
+import time
+import itertools
+import threading
+from collections import Counter, defaultdict
+from collections.abc import Callable
+
+import pika
+import pytest
+
+from bookcourier import BookCourier
+from bookcourier.retries import RetryPolicy
+from bookcourier.routing import bulk_lane_name
+from bookcourier.workers import HashRing, ParallelConsumer, partition_key
+from bookcourier.transports import MemoryTransport, transport_factory
+
+
+def test_hash_ring_spreads_keys_across_nodes() -> None:
+    ring = HashRing(4)
+    counts = Counter(ring.node_for(f'book_{i}') for i in range(4000))
+
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 500
+
+
+def test_hash_ring_moves_few_keys_when_a_node_is_added() -> None:
+    before, after = HashRing(4), HashRing(5)
+    keys = [f'book_{i}' for i in range(4000)]
+
+    moved = sum(before.node_for(key) != after.node_for(key) for key in keys)
+
+    assert moved < len(keys) / 3
+
+
+def test_borrowing_and_return_share_a_partition_key() -> None:
+    borrowed = {'event': 'book_borrowed', 'borrowed_book': {'id': 'borrowed_1', 'book_id': 'book_1'}}
+    returned = {'event': 'book_returned', 'borrowed_book_id': 'borrowed_1', 'actual_return_date': ''}
+
+    assert partition_key(borrowed) == partition_key(returned) == 'borrowed_1'
+
+
+def open_transport(url: str, bodies: list[bytes]) -> MemoryTransport:
+    publisher, transport = transport_factory(url)(), transport_factory(url)()
+    for body in bodies:
+        publisher.publish('events', body, pika.BasicProperties())
+    return transport
+
+
+def stop_after(event_count: int, callback: Callable[[dict], None]) -> tuple[Callable[[dict], None], list]:
+    """Wrap `callback` so that the consumer added to the returned list is stopped after `event_count` events."""
+    handled = itertools.count(1)
+    consumers: list[ParallelConsumer] = []
+
+    def wrapper(event: dict) -> None:
+        try:
+            callback(event)
+        finally:
+            if next(handled) == event_count:
+                consumers[0].stop()
+
+    return wrapper, consumers
+
+
+def test_parallel_consumer_keeps_per_key_order_and_acks_everything(memory_url: str) -> None:
+    events = [{'event': 'book_returned', 'borrowed_book_id': f'borrowed_{i % 10}', 'sequence': i} for i in range(200)]
+    transport = open_transport(memory_url, [json.dumps(event).encode() for event in events])
+    seen = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(event: dict) -> None:
+        time.sleep(0.001)
+        with lock:
+            seen[event['borrowed_book_id']].append(event['sequence'])
+
+    callback, consumers = stop_after(200, record)
+    consumer = ParallelConsumer(transport=transport, queue_name='events', callback=callback, workers=4)
+    consumers.append(consumer)
+    consumer.run()
+    transport.close()
+
+    assert sum(len(sequences) for sequences in seen.values()) == 200
+    assert all(sequences == sorted(sequences) for sequences in seen.values())
+    assert transport_factory(memory_url)().get('events') is None
+
+
+def test_a_full_prefetch_does_not_hold_back_acks(memory_url: str) -> None:
+    events = [{'event': 'book_removed', 'book_id': f'book_{i}'} for i in range(100)]
+    transport = open_transport(memory_url, [json.dumps(event).encode() for event in events])
+
+    callback, consumers = stop_after(100, lambda _: None)
+    consumer = ParallelConsumer(
+        transport=transport, queue_name='events', callback=callback, workers=2, prefetch_per_worker=1
+    )
+    consumers.append(consumer)
+    started = time.monotonic()
+    consumer.run()
+    transport.close()
+
+    # each of the 50 refills of the prefetch used to wait out a receive timeout of 50ms.
+    assert time.monotonic() - started < 1
+
+
+def test_parallel_consumer_retries_failed_events_before_acking_them(memory_url: str) -> None:
+    events = [{'event': 'book_removed', 'book_id': f'book_{i}'} for i in range(4)]
+    transport = open_transport(memory_url, [json.dumps(event).encode() for event in events] + [b'not json'])
+
+    def fail_book_2(event: dict) -> None:
+        if event['book_id'] == 'book_2':
+            msg = 'book is locked'
+            raise RuntimeError(msg)
+
+    callback, consumers = stop_after(4, fail_book_2)
+    consumer = ParallelConsumer(
+        transport=transport,
+        queue_name='events',
+        callback=callback,
+        workers=2,
+        retry_policy=RetryPolicy(max_retries=1, base_delay=0.01),
+    )
+    consumers.append(consumer)
+    consumer.run()
+    transport.close()
+
+    inspector = transport_factory(memory_url)()
+    assert inspector.get('events') is None
+    assert json.loads(inspector.get('events.retry.10ms').body) == events[2]
+    assert inspector.get('events.parking_lot').body == b'not json'
+
+
+# the worker thread is meant to die of it.
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_events_a_worker_dies_on_are_retried_and_the_worker_restarted(memory_url: str) -> None:
+    events = [{'event': 'book_removed', 'book_id': f'book_{i}'} for i in range(4)]
+    transport = open_transport(memory_url, [json.dumps(event).encode() for event in events])
+    seen = []
+
+    def die_on_book_1(event: dict) -> None:
+        if event['book_id'] == 'book_1':
+            # ends the worker thread without an error it would report.
+            raise SystemExit
+        seen.append(event['book_id'])
+
+    callback, consumers = stop_after(4, die_on_book_1)
+    consumer = ParallelConsumer(
+        transport=transport,
+        queue_name='events',
+        callback=callback,
+        workers=1,
+        retry_policy=RetryPolicy(max_retries=1, base_delay=0.01),
+    )
+    consumers.append(consumer)
+    consumer.run()
+    transport.close()
+
+    inspector = transport_factory(memory_url)()
+    assert seen == ['book_0', 'book_2', 'book_3']
+    assert inspector.get('events') is None
+    assert json.loads(inspector.get('events.retry.10ms').body) == events[1]
+
+
+def test_envelopes_are_acked_once_every_event_in_them_is_settled(memory_url: str) -> None:
+    courier = BookCourier(memory_url)
+    courier.publish_many([{'event': 'book_removed', 'book_id': f'book_{i}'} for i in range(8)])
+    transport = transport_factory(memory_url)()
+    seen = []
+
+    callback, consumers = stop_after(8, lambda event: seen.append(event['book_id']))
+    consumer = ParallelConsumer(
+        transport=transport,
+        queue_name=courier.queues['management'],
+        bulk_queue_name=bulk_lane_name(courier.queues['management']),
+        callback=callback,
+        workers=4,
+    )
+    consumers.append(consumer)
+    consumer.run()
+    transport.close()
+
+    assert sorted(seen) == [f'book_{i}' for i in range(8)]
+    assert transport_factory(memory_url)().get(bulk_lane_name(courier.queues['management'])) is None
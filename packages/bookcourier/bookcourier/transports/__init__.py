@@ -0,0 +1,65 @@
+"""Message transports BookCourier can publish and consume through.
+
+Every transport offers the same semantics: queues are FIFO, a received message stays owned by the
+transport that received it until it is acked, unacked messages return to their queue when that transport
+is closed or cancelled, at most `prefetch_count` messages of a queue are unacked at once, and a queue declared with
+a `message_ttl` and `dead_letter_queue` holds each message for `message_ttl` seconds before moving it to
+`dead_letter_queue`. Messages are published either straight to a queue or to a topic exchange, which
+routes them to every queue bound with a matching key. A transport may receive from several queues at once, with
+a prefetch each. A transport must only be used from the thread that opened it.
+"""
+
+from typing import Any
+from urllib.parse import urlsplit
+from collections.abc import Callable
+
+from .base import Delivery, Transport, TransportError, topic_matches, dump_properties, load_properties
+from .memory import MemoryBroker, MemoryTransport, get_broker
+from .rabbitmq import RabbitMQTransport
+
+__all__ = [
+    'Delivery',
+    'MemoryBroker',
+    'MemoryTransport',
+    'RabbitMQTransport',
+    'Transport',
+    'TransportError',
+    'dump_properties',
+    'load_properties',
+    'topic_matches',
+    'transport_factory',
+]
+
+
+def __getattr__(name: str) -> Any:
+    # the SQL transport pulls in sqlite3 and psycopg2, which consumers of other brokers never need.
+    if name == 'SQLTransport':
+        from .sql import SQLTransport
+
+        return SQLTransport
+
+    msg = f'module {__name__!r} has no attribute {name!r}'
+    raise AttributeError(msg)
+
+
+def transport_factory(url: str) -> Callable[[], Transport]:
+    """Return a callable opening a new transport for `url`.
+
+    `amqp://` and `amqps://` URLs connect to RabbitMQ, `memory://<name>` to an in-process broker shared by
+    every transport of that name, and `postgresql://` or `sqlite:///<path>` to a table-backed queue.
+    """
+    scheme = urlsplit(url).scheme
+    if scheme in ('amqp', 'amqps'):
+        return lambda: RabbitMQTransport(url)
+
+    if scheme == 'memory':
+        broker = get_broker(urlsplit(url).netloc)
+        return lambda: MemoryTransport(broker)
+
+    if scheme in ('postgresql', 'postgres', 'sqlite'):
+        from .sql import SQLTransport
+
+        return lambda: SQLTransport(url)
+
+    msg = f'no transport is available for {scheme!r} URLs'
+    raise ValueError(msg)
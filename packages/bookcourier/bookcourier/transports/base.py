@@ -0,0 +1,100 @@
+import json
+from typing import Protocol
+from functools import cache
+from dataclasses import dataclass
+
+import pika
+
+
+class TransportError(Exception):
+    """Raised when a transport loses its connection to the broker or database behind it."""
+
+
+@dataclass(slots=True)
+class Delivery:
+    delivery_tag: int
+    properties: pika.BasicProperties
+    body: bytes
+    # the queue the message was taken from, as a transport may receive from several.
+    queue_name: str = ''
+
+
+class Transport(Protocol):
+    @property
+    def is_open(self) -> bool: ...
+
+    def declare_queue(
+        self, queue_name: str, *, message_ttl: float | None = None, dead_letter_queue: str | None = None
+    ) -> None: ...
+
+    def declare_exchange(self, exchange_name: str) -> None:
+        """Declare a topic exchange."""
+
+    def bind_queue(self, queue_name: str, exchange_name: str, routing_key: str) -> None:
+        """Route messages published to `exchange_name` whose routing key matches `routing_key` to `queue_name`."""
+
+    def publish(self, routing_key: str, body: bytes, properties: pika.BasicProperties, *, exchange: str = '') -> None:
+        """Publish to every queue bound to `exchange` with a matching key, or to the queue named `routing_key`.
+
+        Messages published to an exchange that no queue is bound to for their routing key are dropped.
+        """
+
+    def subscribe(self, queue_name: str, *, prefetch_count: int) -> None:
+        """Start receiving from `queue_name` too, with at most `prefetch_count` of its messages unacked at once.
+
+        Each queue's messages are received in order, and a queue subscribed earlier is preferred where the
+        transport chooses what to deliver next, so a queue's prefetch bounds how many of its messages one
+        from another queue can wait behind.
+        """
+
+    def receive(self, *, max_messages: int, timeout: float | None) -> list[Delivery]:
+        """Return up to `max_messages` deliveries, waiting at most `timeout` seconds for the first one."""
+
+    def queue_depth(self, queue_name: str) -> int:
+        """Return the number of messages ready for delivery from `queue_name`, unacked ones excluded."""
+
+    def get(self, queue_name: str) -> Delivery | None:
+        """Take one message from `queue_name` without subscribing, or return `None` if it is empty."""
+
+    def ack(self, delivery_tag: int, *, multiple: bool = False) -> None: ...
+
+    def keepalive(self) -> None:
+        """Service an idle connection so it is not dropped, raising `TransportError` if it already was."""
+
+    def cancel(self) -> None:
+        """Stop receiving and return messages that were fetched but not yet handed out by `receive`."""
+
+    def close(self) -> None: ...
+
+
+def topic_matches(binding_key: str, routing_key: str) -> bool:
+    """Whether `routing_key` matches `binding_key`, where `*` stands for one word and `#` for any number."""
+    return _topic_matches(tuple(binding_key.split('.')), tuple(routing_key.split('.')))
+
+
+@cache
+def _topic_matches(pattern: tuple[str, ...], words: tuple[str, ...]) -> bool:
+    if not pattern:
+        return not words
+    if pattern[0] == '#':
+        return any(_topic_matches(pattern[1:], words[skip:]) for skip in range(len(words) + 1))
+    if not words or pattern[0] not in ('*', words[0]):
+        return False
+    return _topic_matches(pattern[1:], words[1:])
+
+
+def dump_properties(properties: pika.BasicProperties) -> str:
+    """Serialise the message properties BookCourier uses, for transports that store messages themselves."""
+    return json.dumps(
+        {
+            'content_type': properties.content_type,
+            'delivery_mode': properties.delivery_mode,
+            'message_id': properties.message_id,
+            'timestamp': properties.timestamp,
+            'headers': properties.headers,
+        }
+    )
+
+
+def load_properties(data: str) -> pika.BasicProperties:
+    return pika.BasicProperties(**json.loads(data))
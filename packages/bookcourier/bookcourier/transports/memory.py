@@ -0,0 +1,198 @@
+import copy
+import time
+import heapq
+import itertools
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+
+import pika
+
+from .base import Delivery, TransportError, topic_matches
+
+_brokers: dict[str, 'MemoryBroker'] = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker(name: str) -> 'MemoryBroker':
+    """Return the process-wide broker called `name`, creating it on first use."""
+    with _brokers_lock:
+        return _brokers.setdefault(name, MemoryBroker())
+
+
+@dataclass(slots=True)
+class _Message:
+    properties: pika.BasicProperties
+    body: bytes
+
+
+class MemoryBroker:
+    """In-process queues shared by every `MemoryTransport` opened on it.
+
+    Nothing is persisted, so it is meant for tests, benchmarks and running the consumers locally.
+    """
+
+    def __init__(self) -> None:
+        self.changed = threading.Condition()
+        self.queues: dict[str, deque[_Message]] = {}
+        self._delays: dict[str, tuple[float, str]] = {}
+        self._bindings: dict[str, set[tuple[str, str]]] = {}
+        self._delayed: list[tuple[float, int, str, _Message]] = []
+        self._order = itertools.count()
+
+    def declare(self, queue_name: str, *, message_ttl: float | None, dead_letter_queue: str | None) -> None:
+        with self.changed:
+            self.queues.setdefault(queue_name, deque())
+            if message_ttl is not None:
+                self._delays[queue_name] = (message_ttl, dead_letter_queue)
+
+    def bind(self, queue_name: str, exchange_name: str, routing_key: str) -> None:
+        with self.changed:
+            self._bindings.setdefault(exchange_name, set()).add((routing_key, queue_name))
+
+    def route(self, exchange_name: str, routing_key: str) -> set[str]:
+        """Return the queues a message published to `exchange_name` with `routing_key` is delivered to."""
+        with self.changed:
+            bindings = list(self._bindings.get(exchange_name, ()))
+        return {queue_name for binding_key, queue_name in bindings if topic_matches(binding_key, routing_key)}
+
+    def put(self, queue_name: str, message: _Message) -> None:
+        with self.changed:
+            if queue_name in self._delays:
+                message_ttl, dead_letter_queue = self._delays[queue_name]
+                due = time.monotonic() + message_ttl
+                heapq.heappush(self._delayed, (due, next(self._order), dead_letter_queue, message))
+            else:
+                self.queues.setdefault(queue_name, deque()).append(message)
+            self.changed.notify_all()
+
+    def requeue(self, queue_name: str, messages: list[_Message]) -> None:
+        """Return unacked messages to the front of their queue, in their original order."""
+        with self.changed:
+            self.queues.setdefault(queue_name, deque()).extendleft(reversed(messages))
+            self.changed.notify_all()
+
+    def take(self, queue_name: str, limit: int) -> list[_Message]:
+        """Remove up to `limit` messages from `queue_name`. Must be called with `changed` held."""
+        self._release_due()
+        queue = self.queues.setdefault(queue_name, deque())
+        return [queue.popleft() for _ in range(min(limit, len(queue)))]
+
+    def depth(self, queue_name: str) -> int:
+        with self.changed:
+            self._release_due()
+            return len(self.queues.get(queue_name, ()))
+
+    def next_due(self) -> float | None:
+        return self._delayed[0][0] if self._delayed else None
+
+    def _release_due(self) -> None:
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, queue_name, message = heapq.heappop(self._delayed)
+            self.queues.setdefault(queue_name, deque()).append(message)
+
+
+class MemoryTransport:
+    """A connection to a `MemoryBroker`."""
+
+    def __init__(self, broker: MemoryBroker) -> None:
+        self.broker = broker
+        self.is_open = True
+        self._tags = itertools.count(1)
+        self._subscriptions: dict[str, int] = {}
+        self._unacked: dict[int, tuple[str, _Message]] = {}
+
+    def declare_queue(
+        self, queue_name: str, *, message_ttl: float | None = None, dead_letter_queue: str | None = None
+    ) -> None:
+        self.broker.declare(queue_name, message_ttl=message_ttl, dead_letter_queue=dead_letter_queue)
+
+    def declare_exchange(self, exchange_name: str) -> None:
+        # exchanges are implicit, they only exist through their bindings.
+        pass
+
+    def bind_queue(self, queue_name: str, exchange_name: str, routing_key: str) -> None:
+        self.broker.bind(queue_name, exchange_name, routing_key)
+
+    def publish(self, routing_key: str, body: bytes, properties: pika.BasicProperties, *, exchange: str = '') -> None:
+        message = _Message(_copy_properties(properties), body)
+        for queue_name in self.broker.route(exchange, routing_key) if exchange else [routing_key]:
+            self.broker.put(queue_name, message)
+
+    def subscribe(self, queue_name: str, *, prefetch_count: int) -> None:
+        self._subscriptions[queue_name] = prefetch_count
+
+    def receive(self, *, max_messages: int, timeout: float | None) -> list[Delivery]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.broker.changed:
+            while True:
+                if deliveries := self._take_subscribed(max_messages):
+                    return deliveries
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return []
+
+                waits = [deadline, self.broker.next_due()]
+                wake_at = min((wait for wait in waits if wait is not None), default=None)
+                self.broker.changed.wait(None if wake_at is None else max(wake_at - now, 0))
+
+    def _take_subscribed(self, max_messages: int) -> list[Delivery]:
+        """Take messages from the subscribed queues in subscription order. Must be called with `changed` held."""
+        unacked = Counter(queue_name for queue_name, _ in self._unacked.values())
+        deliveries: list[Delivery] = []
+        for queue_name, prefetch_count in self._subscriptions.items():
+            room = min(max_messages - len(deliveries), prefetch_count - unacked[queue_name])
+            if room > 0:
+                deliveries += [self._deliver(queue_name, message) for message in self.broker.take(queue_name, room)]
+
+        return deliveries
+
+    def queue_depth(self, queue_name: str) -> int:
+        return self.broker.depth(queue_name)
+
+    def get(self, queue_name: str) -> Delivery | None:
+        with self.broker.changed:
+            messages = self.broker.take(queue_name, 1)
+        return self._deliver(queue_name, messages[0]) if messages else None
+
+    def _deliver(self, queue_name: str, message: _Message) -> Delivery:
+        delivery_tag = next(self._tags)
+        self._unacked[delivery_tag] = (queue_name, message)
+        return Delivery(delivery_tag, _copy_properties(message.properties), message.body, queue_name)
+
+    def ack(self, delivery_tag: int, *, multiple: bool = False) -> None:
+        if delivery_tag not in self._unacked:
+            msg = f'unknown delivery tag {delivery_tag}'
+            raise TransportError(msg)
+
+        tags = [tag for tag in self._unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        for tag in tags:
+            del self._unacked[tag]
+
+    def keepalive(self) -> None:
+        if not self.is_open:
+            msg = 'transport is closed'
+            raise TransportError(msg)
+
+    def cancel(self) -> None:
+        self._subscriptions = {}
+
+    def close(self) -> None:
+        unacked, self._unacked = self._unacked, {}
+        by_queue: dict[str, list[_Message]] = {}
+        for queue_name, message in unacked.values():
+            by_queue.setdefault(queue_name, []).append(message)
+        for queue_name, messages in by_queue.items():
+            self.broker.requeue(queue_name, messages)
+
+        self.is_open = False
+
+
+def _copy_properties(properties: pika.BasicProperties) -> pika.BasicProperties:
+    """Copy `properties` so that neither side of the broker sees the other's changes, as over a network."""
+    properties = copy.copy(properties)
+    if properties.headers is not None:
+        properties.headers = dict(properties.headers)
+    return properties
@@ -0,0 +1,145 @@
+import time
+import logging
+import functools
+from collections import deque
+from collections.abc import Callable
+
+import pika
+import pika.exceptions
+from pika.exceptions import AMQPError
+
+from .base import Delivery, TransportError
+
+logger = logging.getLogger(__name__)
+
+
+def _translate_errors(method: Callable) -> Callable:
+    """Raise pika's connection failures as `TransportError`."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except (AMQPError, pika.exceptions.StreamLostError) as e:
+            raise TransportError(str(e) or type(e).__name__) from e
+
+    return wrapper
+
+
+class RabbitMQTransport:
+    """A RabbitMQ connection and channel.
+
+    Queues are durable, delays use per-queue TTLs with dead-lettering, and deliveries are pushed into a
+    local buffer by `basic_consume` while `receive` drives the connection's I/O. Each subscription is a
+    consumer of its own, and RabbitMQ applies a consumer's prefetch to it alone, so deliveries of several
+    queues arrive interleaved, with no more of each in the buffer than its prefetch.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._buffer: deque[Delivery] = deque()
+        # the queue each consumer receives from, by consumer tag.
+        self._consumers: dict[str, str] = {}
+        try:
+            self.connection = pika.BlockingConnection(pika.URLParameters(url))
+            self.channel = self.connection.channel()
+        except AMQPError as e:
+            msg = f'failed to connect to RabbitMQ: {e}'
+            raise TransportError(msg) from e
+
+        logger.info('Connected to RabbitMQ at %s', url)
+
+    @property
+    def is_open(self) -> bool:
+        return self.connection.is_open and self.channel.is_open
+
+    @_translate_errors
+    def declare_queue(
+        self, queue_name: str, *, message_ttl: float | None = None, dead_letter_queue: str | None = None
+    ) -> None:
+        arguments = None
+        if message_ttl is not None:
+            arguments = {
+                'x-message-ttl': int(message_ttl * 1000),
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': dead_letter_queue,
+            }
+        self.channel.queue_declare(queue=queue_name, durable=True, arguments=arguments)
+
+    @_translate_errors
+    def declare_exchange(self, exchange_name: str) -> None:
+        self.channel.exchange_declare(exchange=exchange_name, exchange_type='topic', durable=True)
+
+    @_translate_errors
+    def bind_queue(self, queue_name: str, exchange_name: str, routing_key: str) -> None:
+        self.channel.queue_bind(queue=queue_name, exchange=exchange_name, routing_key=routing_key)
+
+    @_translate_errors
+    def publish(self, routing_key: str, body: bytes, properties: pika.BasicProperties, *, exchange: str = '') -> None:
+        self.channel.basic_publish(exchange=exchange, routing_key=routing_key, body=body, properties=properties)
+
+    @_translate_errors
+    def subscribe(self, queue_name: str, *, prefetch_count: int) -> None:
+        # the prefetch applies to consumers started after it is set, and to each of them separately.
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        consumer_tag = self.channel.basic_consume(queue=queue_name, on_message_callback=self._on_message)
+        self._consumers[consumer_tag] = queue_name
+
+    def _on_message(
+        self,
+        ch: pika.channel.Channel,
+        method: pika.spec.Basic.Deliver,
+        properties: pika.spec.BasicProperties,
+        body: bytes,
+    ) -> None:
+        self._buffer.append(Delivery(method.delivery_tag, properties, body, self._consumers[method.consumer_tag]))
+
+    @_translate_errors
+    def receive(self, *, max_messages: int, timeout: float | None) -> list[Delivery]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._buffer:
+            # the connection is serviced at least once, so that a zero timeout polls for deliveries.
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            self.connection.process_data_events(time_limit=remaining)
+            if remaining == 0:
+                break
+
+        return [self._buffer.popleft() for _ in range(min(max_messages, len(self._buffer)))]
+
+    @_translate_errors
+    def queue_depth(self, queue_name: str) -> int:
+        # a passive declare only reports on the queue, and fails if it does not exist.
+        return self.channel.queue_declare(queue=queue_name, passive=True).method.message_count
+
+    @_translate_errors
+    def get(self, queue_name: str) -> Delivery | None:
+        method, properties, body = self.channel.basic_get(queue=queue_name)
+        if method is None:
+            return None
+
+        return Delivery(method.delivery_tag, properties, body, queue_name)
+
+    @_translate_errors
+    def ack(self, delivery_tag: int, *, multiple: bool = False) -> None:
+        self.channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+
+    @_translate_errors
+    def keepalive(self) -> None:
+        # sends and answers heartbeats without waiting, any delivery that arrives is buffered for `receive`.
+        self.connection.process_data_events(time_limit=0)
+
+    @_translate_errors
+    def cancel(self) -> None:
+        for consumer_tag in list(self._consumers):
+            self.channel.basic_cancel(consumer_tag)
+            del self._consumers[consumer_tag]
+
+        while self._buffer:
+            self.channel.basic_nack(delivery_tag=self._buffer.popleft().delivery_tag, requeue=True)
+
+    def close(self) -> None:
+        if self.connection.is_open:
+            try:
+                self.connection.close()
+            except Exception:
+                logger.exception('Error while closing connection')
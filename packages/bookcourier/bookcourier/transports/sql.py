@@ -0,0 +1,280 @@
+import time
+import logging
+import sqlite3
+import itertools
+from typing import Any, TypeVar
+from collections import Counter
+from urllib.parse import urlsplit
+from collections.abc import Callable
+
+import pika
+
+from .base import Delivery, TransportError, topic_matches, dump_properties, load_properties
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+DATABASE_ERRORS = (sqlite3.Error,) if psycopg2 is None else (sqlite3.Error, psycopg2.Error)
+
+TABLE_NAME = 'bookcourier_messages'
+
+BINDINGS_TABLE_NAME = 'bookcourier_bindings'
+
+_BINDINGS_SCHEMA = f"""CREATE TABLE IF NOT EXISTS {BINDINGS_TABLE_NAME} (
+    exchange VARCHAR(255) NOT NULL,
+    routing_key VARCHAR(255) NOT NULL,
+    queue VARCHAR(255) NOT NULL,
+    PRIMARY KEY (exchange, routing_key, queue)
+)"""
+
+_SCHEMA = {
+    'postgresql': [
+        f"""CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            id BIGSERIAL PRIMARY KEY,
+            queue VARCHAR(255) NOT NULL,
+            body BYTEA NOT NULL,
+            properties TEXT NOT NULL,
+            available_at DOUBLE PRECISION NOT NULL,
+            locked_until DOUBLE PRECISION
+        )""",
+        f'CREATE INDEX IF NOT EXISTS {TABLE_NAME}_queue_id ON {TABLE_NAME} (queue, id)',
+        _BINDINGS_SCHEMA,
+    ],
+    'sqlite': [
+        f"""CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue VARCHAR(255) NOT NULL,
+            body BLOB NOT NULL,
+            properties TEXT NOT NULL,
+            available_at DOUBLE PRECISION NOT NULL,
+            locked_until DOUBLE PRECISION
+        )""",
+        f'CREATE INDEX IF NOT EXISTS {TABLE_NAME}_queue_id ON {TABLE_NAME} (queue, id)',
+        _BINDINGS_SCHEMA,
+    ],
+}
+
+# rows are claimed by setting `locked_until`. On PostgreSQL `SKIP LOCKED` lets concurrent consumers claim
+# different rows without waiting on each other; SQLite serialises writers with `BEGIN IMMEDIATE` instead.
+_READY = 'queue = %s AND available_at <= %s AND (locked_until IS NULL OR locked_until <= %s)'
+
+_CLAIM = f"""
+    SELECT id, body, properties FROM {TABLE_NAME}
+    WHERE {_READY}
+    ORDER BY id
+    LIMIT %s
+"""  # noqa: S608
+
+_DEPTH = f'SELECT COUNT(*) FROM {TABLE_NAME} WHERE {_READY}'  # noqa: S608
+
+
+class SQLTransport:
+    """A queue kept in a database table, for deployments too small to warrant a broker.
+
+    Received rows are locked for `visibility_timeout` seconds and deleted when acked, so the messages of a
+    consumer that dies without closing its transport are redelivered once the timeout expires. Empty
+    queues are polled every `poll_interval` seconds.
+    """
+
+    def __init__(self, url: str, *, visibility_timeout: float = 300, poll_interval: float = 0.2) -> None:
+        self.url = url
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self._tags = itertools.count(1)
+        self._subscriptions: dict[str, int] = {}
+        # delivery tags are handed out in delivery order like a broker's, and map to the queue and id of their row.
+        self._unacked: dict[int, tuple[str, int]] = {}
+        self._delays: dict[str, tuple[float, str]] = {}
+
+        parts = urlsplit(url)
+        self.dialect = 'sqlite' if parts.scheme == 'sqlite' else 'postgresql'
+        if self.dialect == 'postgresql' and psycopg2 is None:
+            msg = 'the PostgreSQL transport requires psycopg2'
+            raise TransportError(msg)
+
+        try:
+            if self.dialect == 'sqlite':
+                # transactions are opened explicitly, with `BEGIN IMMEDIATE` so that claims never deadlock.
+                self._connection = sqlite3.connect(parts.path, isolation_level=None)
+            else:
+                self._connection = psycopg2.connect(url)
+        except DATABASE_ERRORS as e:
+            msg = f'failed to connect to {parts.scheme}: {e}'
+            raise TransportError(msg) from e
+
+        self.is_open = True
+        for statement in _SCHEMA[self.dialect]:
+            self._execute(statement)
+
+    def _transaction(self, work: Callable[[Any], T]) -> T:
+        """Run `work` with a cursor inside a transaction, raising database failures as `TransportError`."""
+        try:
+            cursor = self._connection.cursor()
+            try:
+                if self.dialect == 'sqlite':
+                    cursor.execute('BEGIN IMMEDIATE')
+                result = work(cursor)
+                self._connection.commit()
+            except BaseException:
+                self._connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        except DATABASE_ERRORS as e:
+            self.is_open = False
+            raise TransportError(str(e)) from e
+
+        return result
+
+    def _execute(self, statement: str, parameters: tuple = ()) -> None:
+        self._transaction(lambda cursor: cursor.execute(self._placeholders(statement), parameters))
+
+    def _placeholders(self, statement: str) -> str:
+        return statement.replace('%s', '?') if self.dialect == 'sqlite' else statement
+
+    def declare_queue(
+        self, queue_name: str, *, message_ttl: float | None = None, dead_letter_queue: str | None = None
+    ) -> None:
+        # queues are implicit, but publishing to a delayed queue must know where its messages end up.
+        if message_ttl is not None:
+            self._delays[queue_name] = (message_ttl, dead_letter_queue)
+
+    def declare_exchange(self, exchange_name: str) -> None:
+        # exchanges are implicit, they only exist through their bindings.
+        pass
+
+    def bind_queue(self, queue_name: str, exchange_name: str, routing_key: str) -> None:
+        self._execute(
+            f'INSERT INTO {BINDINGS_TABLE_NAME} (exchange, routing_key, queue) VALUES (%s, %s, %s) '  # noqa: S608
+            'ON CONFLICT DO NOTHING',
+            (exchange_name, routing_key, queue_name),
+        )
+
+    def publish(self, routing_key: str, body: bytes, properties: pika.BasicProperties, *, exchange: str = '') -> None:
+        now = time.time()
+        data = dump_properties(properties)
+
+        def insert(cursor: Any) -> None:
+            queue_names = [routing_key]
+            if exchange:
+                cursor.execute(
+                    self._placeholders(f'SELECT routing_key, queue FROM {BINDINGS_TABLE_NAME} WHERE exchange = %s'),  # noqa: S608
+                    (exchange,),
+                )
+                queue_names = sorted({queue for key, queue in cursor.fetchall() if topic_matches(key, routing_key)})
+
+            for queue_name in queue_names:
+                message_ttl, target = self._delays.get(queue_name, (0, queue_name))
+                cursor.execute(
+                    self._placeholders(
+                        f'INSERT INTO {TABLE_NAME} (queue, body, properties, available_at) VALUES (%s, %s, %s, %s)'  # noqa: S608
+                    ),
+                    (target, body, data, now + message_ttl),
+                )
+
+        self._transaction(insert)
+
+    def subscribe(self, queue_name: str, *, prefetch_count: int) -> None:
+        self._subscriptions[queue_name] = prefetch_count
+
+    def receive(self, *, max_messages: int, timeout: float | None) -> list[Delivery]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if deliveries := self._claim_subscribed(max_messages):
+                return deliveries
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+
+            wait = self.poll_interval if deadline is None else min(self.poll_interval, deadline - time.monotonic())
+            time.sleep(max(wait, 0))
+
+    def _claim_subscribed(self, max_messages: int) -> list[Delivery]:
+        """Claim messages from the subscribed queues in subscription order."""
+        unacked = Counter(queue_name for queue_name, _ in self._unacked.values())
+        deliveries: list[Delivery] = []
+        for queue_name, prefetch_count in self._subscriptions.items():
+            room = min(max_messages - len(deliveries), prefetch_count - unacked[queue_name])
+            if room > 0:
+                deliveries += self._claim(queue_name, room)
+
+        return deliveries
+
+    def queue_depth(self, queue_name: str) -> int:
+        now = time.time()
+
+        def count(cursor: Any) -> int:
+            cursor.execute(self._placeholders(_DEPTH), (queue_name, now, now))
+            return cursor.fetchone()[0]
+
+        return self._transaction(count)
+
+    def get(self, queue_name: str) -> Delivery | None:
+        deliveries = self._claim(queue_name, 1)
+        return deliveries[0] if deliveries else None
+
+    def _claim(self, queue_name: str, limit: int) -> list[Delivery]:
+        now = time.time()
+        claim = _CLAIM + ' FOR UPDATE SKIP LOCKED' if self.dialect == 'postgresql' else _CLAIM
+
+        def claim_rows(cursor: Any) -> list[tuple]:
+            cursor.execute(self._placeholders(claim), (queue_name, now, now, limit))
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ', '.join(['%s'] * len(rows))
+                cursor.execute(
+                    self._placeholders(f'UPDATE {TABLE_NAME} SET locked_until = %s WHERE id IN ({placeholders})'),  # noqa: S608
+                    (now + self.visibility_timeout, *(row[0] for row in rows)),
+                )
+            return rows
+
+        deliveries = []
+        for row_id, body, properties in self._transaction(claim_rows):
+            delivery_tag = next(self._tags)
+            self._unacked[delivery_tag] = (queue_name, row_id)
+            deliveries.append(Delivery(delivery_tag, load_properties(properties), bytes(body), queue_name))
+        return deliveries
+
+    def ack(self, delivery_tag: int, *, multiple: bool = False) -> None:
+        if delivery_tag not in self._unacked:
+            msg = f'unknown delivery tag {delivery_tag}'
+            raise TransportError(msg)
+
+        acked = [tag for tag in self._unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        self._delete_or_release([self._unacked[tag][1] for tag in acked], delete=True)
+        for tag in acked:
+            del self._unacked[tag]
+
+    def _delete_or_release(self, ids: list[int], *, delete: bool) -> None:
+        placeholders = ', '.join(['%s'] * len(ids))
+        if delete:
+            self._execute(f'DELETE FROM {TABLE_NAME} WHERE id IN ({placeholders})', tuple(ids))  # noqa: S608
+        else:
+            self._execute(f'UPDATE {TABLE_NAME} SET locked_until = NULL WHERE id IN ({placeholders})', tuple(ids))  # noqa: S608
+
+    def keepalive(self) -> None:
+        # keeps the database connection from being closed as idle by the server or a proxy in between.
+        self._execute('SELECT 1')
+
+    def cancel(self) -> None:
+        self._subscriptions = {}
+
+    def close(self) -> None:
+        if not self.is_open:
+            return
+
+        try:
+            if self._unacked:
+                self._delete_or_release([row_id for _, row_id in self._unacked.values()], delete=False)
+                self._unacked = {}
+        except TransportError:
+            logger.exception('Failed to release unacked messages, they are redelivered after the visibility timeout')
+        finally:
+            self._connection.close()
+            self.is_open = False
@@ -22,6 +22,14 @@ class BorrowedBookData(TypedDict):
     proposed_return_date: str
 
 
+class UserData(TypedDict):
+    id: str
+    email: str
+    is_admin: bool
+    last_name: str
+    first_name: str
+
+
 class AddBookMessage(TypedDict):
     event: Literal['book_added']
     book: BookData
@@ -43,4 +51,9 @@ class RemoveBookMessage(TypedDict):
     book_id: str
 
 
-LibraryMessage = AddBookMessage | BorrowBookMessage | RemoveBookMessage | ReturnBookMessage
+class RegisterUserMessage(TypedDict):
+    event: Literal['user_registered']
+    user: UserData
+
+
+LibraryMessage = AddBookMessage | BorrowBookMessage | RemoveBookMessage | ReturnBookMessage | RegisterUserMessage
@@ -0,0 +1,261 @@
+import time
+import queue
+import bisect
+import signal
+import hashlib
+import logging
+import threading
+from typing import Any
+from collections.abc import Callable
+
+from .dedup import Deduplicator
+from .types import LibraryMessage
+from .codecs import DecodeError
+from .metrics import ConsumerMetrics
+from .retries import RetryPolicy, park, retry_later
+from .routing import bulk_prefetch
+from .eventlog import EventLog
+from .envelopes import ReceivedEvent, unpack
+from .transports import Delivery, Transport
+
+logger = logging.getLogger(__name__)
+
+
+def partition_key(event: LibraryMessage) -> str:
+    """Return the key whose events must be applied in order.
+
+    A borrowing and its return share the borrowed book id, and catalogue changes share the book id.
+    """
+    match event.get('event'):
+        case 'book_added':
+            return event.get('book', {}).get('id', '')
+        case 'book_removed':
+            return event.get('book_id', '')
+        case 'book_borrowed':
+            return event.get('borrowed_book', {}).get('id', '')
+        case 'book_returned':
+            return event.get('borrowed_book_id', '')
+        case 'user_registered':
+            return event.get('user', {}).get('id', '')
+        case _:
+            return ''
+
+
+class HashRing:
+    """Maps keys onto `nodes` slots with consistent hashing.
+
+    Each node is placed on the ring `replicas` times so keys spread evenly, and changing the number of
+    nodes only moves the keys of the affected arcs.
+    """
+
+    def __init__(self, nodes: int, *, replicas: int = 64) -> None:
+        points = sorted(
+            (self._hash(f'{node}:{replica}'), node) for node in range(nodes) for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+
+class ParallelConsumer:
+    """Applies events from one queue, and its bulk lane if given, on `workers` threads while keeping per-key ordering.
+
+    The transport stays on the calling thread, which dispatches every delivery to the worker owning its
+    `partition_key`, so events sharing a key are handled one after another by the same worker. Workers
+    report each outcome back to the calling thread, which acks the event or moves it to its retry queue,
+    and a worker that dies is restarted, with the event it died on retried. On SIGINT or SIGTERM no new
+    deliveries are accepted and the events already dispatched are finished and acked, for up to
+    `drain_timeout` seconds, before returning.
+    Events are appended to `event_log`, if given, by the calling thread as their outcomes are settled.
+    """
+
+    def __init__(
+        self,
+        *,
+        transport: Transport,
+        queue_name: str,
+        callback: Callable[[LibraryMessage], None],
+        workers: int,
+        bulk_queue_name: str | None = None,
+        bulk_prefetch_ratio: float = 0.2,
+        retry_policy: RetryPolicy | None = None,
+        deduplicator: Deduplicator | None = None,
+        metrics: ConsumerMetrics | None = None,
+        event_log: EventLog | None = None,
+        prefetch_per_worker: int = 10,
+        drain_timeout: float = 30,
+    ) -> None:
+        self.workers = workers
+        self.callback = callback
+        self.transport = transport
+        self.queue_name = queue_name
+        self.bulk_queue_name = bulk_queue_name
+        self.bulk_prefetch_ratio = bulk_prefetch_ratio
+        self.deduplicator = deduplicator
+        self.drain_timeout = drain_timeout
+        self.prefetch_per_worker = prefetch_per_worker
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or ConsumerMetrics()
+        self.event_log = event_log
+
+        self.ring = HashRing(workers)
+        self._stopping = threading.Event()
+        self._queues: list[queue.SimpleQueue] = [queue.SimpleQueue() for _ in range(workers)]
+        # every finished event, with its error if it failed and whether it was applied or skipped as a duplicate.
+        self._outcomes: queue.SimpleQueue[tuple[ReceivedEvent, BaseException | None, bool]] = queue.SimpleQueue()
+        self._unsettled: dict[int, int] = {}
+        self._threads: list[threading.Thread | None] = [None] * workers
+
+    def run(self) -> None:
+        prefetch_count = self.workers * self.prefetch_per_worker
+        self.transport.subscribe(self.queue_name, prefetch_count=prefetch_count)
+        if self.bulk_queue_name is not None:
+            bulk_prefetch_count = bulk_prefetch(prefetch_count, self.bulk_prefetch_ratio)
+            self.transport.subscribe(self.bulk_queue_name, prefetch_count=bulk_prefetch_count)
+            prefetch_count += bulk_prefetch_count
+        previous_handlers = self._install_signal_handlers()
+        for index in range(self.workers):
+            self._start_worker(index)
+
+        logger.info('Consuming %s with %d workers. To exit press CTRL+C', self.queue_name, self.workers)
+        try:
+            while not self._stopping.is_set():
+                # while workers hold deliveries the transport is only polled, and the wait is for their
+                # outcomes instead, so a full prefetch never holds back the acks that make room for more.
+                deliveries = self.transport.receive(
+                    max_messages=prefetch_count, timeout=0 if self._unsettled else 0.05
+                )
+                for delivery in deliveries:
+                    self._dispatch(delivery)
+                self._settle(timeout=0.005 if self._unsettled and not deliveries else 0)
+                self._supervise()
+
+            logger.info('Draining %d workers consuming %s', self.workers, self.queue_name)
+            self.transport.cancel()
+            self._drain()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _install_signal_handlers(self) -> dict[int, Any]:
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+
+        def handle_signal(signum: int, frame: Any) -> None:  # noqa: ARG001
+            logger.info('Received %s, shutting down', signal.Signals(signum).name)
+            self.stop()
+
+        return {signum: signal.signal(signum, handle_signal) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+    def _dispatch(self, delivery: Delivery) -> None:
+        try:
+            received = unpack(delivery)
+        except DecodeError as e:
+            logger.exception('Failed to decode event')
+            park(
+                self.transport,
+                queue_name=delivery.queue_name,
+                properties=delivery.properties,
+                body=delivery.body,
+                error=e,
+            )
+            self.transport.ack(delivery.delivery_tag)
+            self.metrics.record_outcome(delivery.queue_name, None, outcome='undecodable')
+            return
+
+        if not received:
+            self.transport.ack(delivery.delivery_tag)
+            return
+
+        # the events of an envelope may go to different workers, it is acked once all of them are settled.
+        self._unsettled[delivery.delivery_tag] = len(received)
+        for item in received:
+            self._queues[self.ring.node_for(partition_key(item.event))].put(item)
+
+    def _start_worker(self, index: int) -> None:
+        thread = threading.Thread(target=self._work, args=(index,), name=f'bookcourier-worker-{index}', daemon=True)
+        self._threads[index] = thread
+        thread.start()
+
+    def _supervise(self) -> None:
+        for index, thread in enumerate(self._threads):
+            if not thread.is_alive():
+                logger.error('Worker %d died, restarting it', index)
+                self._start_worker(index)
+
+    def _work(self, index: int) -> None:
+        while (item := self._queues[index].get()) is not None:
+            # reported if the worker dies mid-event, so the delivery is still retried and acked.
+            msg = f'worker {index} died while processing the event'
+            outcome = (item, RuntimeError(msg), False)
+            try:
+                with self.metrics.track(item.delivery.queue_name, item.event, item.properties) as tracked:
+                    if self.deduplicator is None:
+                        self.callback(item.event)
+                    else:
+                        tracked.applied = not self.deduplicator.process(
+                            [(item.properties, item.event)], lambda events: self.callback(events[0])
+                        )
+            except Exception as e:
+                logger.exception('Worker %d failed to process event', index)
+                outcome = (item, e, False)
+            else:
+                outcome = (item, None, tracked.applied)
+            finally:
+                self._outcomes.put(outcome)
+
+    def _settle(self, *, timeout: float = 0) -> None:
+        """Ack the events workers have finished, moving failed ones to their retry queue first.
+
+        Waits up to `timeout` seconds for the first one to finish if none has yet.
+        """
+        while True:
+            try:
+                item, error, applied = self._outcomes.get(timeout=timeout) if timeout else self._outcomes.get_nowait()
+            except queue.Empty:
+                return
+
+            timeout = 0
+            if error is not None:
+                retry_later(
+                    self.transport,
+                    queue_name=item.delivery.queue_name,
+                    policy=self.retry_policy,
+                    properties=item.properties,
+                    body=item.body,
+                    error=error,
+                )
+            elif applied and self.event_log is not None:
+                self.event_log.append(item.event)
+
+            delivery_tag = item.delivery.delivery_tag
+            self._unsettled[delivery_tag] -= 1
+            if not self._unsettled[delivery_tag]:
+                del self._unsettled[delivery_tag]
+                self.transport.ack(delivery_tag)
+
+    def _drain(self) -> None:
+        for worker_queue in self._queues:
+            worker_queue.put(None)
+
+        deadline = time.monotonic() + self.drain_timeout
+        while any(thread.is_alive() for thread in self._threads) and time.monotonic() < deadline:
+            # keeps the transport's connection serviced, the consumer is cancelled so nothing new arrives.
+            self.transport.receive(max_messages=1, timeout=0.1)
+            self._settle()
+
+        self._settle()
+        if any(thread.is_alive() for thread in self._threads):
+            logger.warning(
+                'Workers did not drain within %ss, unfinished events will be redelivered', self.drain_timeout
+            )
@@ -0,0 +1,112 @@
+import asyncio
+import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+import shortuuid
+
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework import status
+
+from bookworm.common.views import AsyncAPIView
+from bookworm.common.loaders import get_user_loader
+from bookworm.apps.books.views import filter_available_books
+from bookworm.common.responses import error_json_response, success_json_response
+from bookworm.apps.books.models import Book, BorrowedBook
+from bookworm.apps.books.serializers import BookSerializer, UserSerializer, BorrowBookSerializer
+
+# bookcourier gives every thread a transport of its own, so publishes are spread over a pool of them.
+publisher = ThreadPoolExecutor(max_workers=settings.EVENTS_PUBLISH_THREADS, thread_name_prefix='bookcourier')
+
+
+async def publish(fn, *args, **kwargs) -> None:
+    await asyncio.get_running_loop().run_in_executor(publisher, partial(fn, *args, **kwargs))
+
+
+class AsyncBookListView(AsyncAPIView):
+    async def get(self, request, *args, **kwargs):
+        queryset = filter_available_books(Book.objects.get_queryset(), request.GET)
+        books = [book async for book in queryset]
+        return success_json_response(BookSerializer(books, many=True).data)
+
+
+class AsyncBookDetailView(AsyncAPIView):
+    async def get(self, request, id):  # noqa: A002
+        instance = await Book.objects.filter(id=id).afirst()
+        if instance is None:
+            return error_json_response(['No Book matches the given query.'], status_code=status.HTTP_404_NOT_FOUND)
+
+        added_by_user = await get_user_loader(request).aload(instance.added_by)
+
+        data = BookSerializer(instance).data
+        data['added_by'] = UserSerializer(added_by_user).data if added_by_user else None
+        return success_json_response(data)
+
+
+class AsyncBorrowBookView(AsyncAPIView):
+    async def post(self, request, book_id):
+        serializer = BorrowBookSerializer(data=self.get_data(request))
+        if not serializer.is_valid():
+            return error_json_response(serializer.errors)
+
+        book = await Book.objects.filter(id=book_id).afirst()
+        if not book:
+            return error_json_response(error='book not found', status_code=status.HTTP_404_NOT_FOUND)
+
+        if not await book.ais_available():
+            return error_json_response(error='book is already borrowed', status_code=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        duration = serializer.validated_data['duration']
+        proposed_return_date = now + datetime.timedelta(days=duration)
+
+        borrowed_book = await BorrowedBook.objects.acreate(
+            book=book,
+            updated_at=now,
+            created_at=now,
+            is_returned=False,
+            borrower=request.user.id,
+            id=f'borrow_{shortuuid.uuid()}',
+            proposed_return_date=proposed_return_date,
+        )
+
+        await publish(
+            settings.BOOKCOURIER.publish_book_borrowed,
+            {
+                'book_id': str(book.id),
+                'id': str(borrowed_book.id),
+                'created_at': now.isoformat(),
+                'updated_at': now.isoformat(),
+                'user_id': str(request.user.id),
+                'proposed_return_date': proposed_return_date.isoformat(),
+            },
+        )
+
+        return success_json_response(None)
+
+
+class AsyncReturnBookView(AsyncAPIView):
+    async def post(self, request, book_id):
+        borrow_record = await BorrowedBook.objects.filter(
+            book_id=book_id,
+            is_returned=False,
+            borrower=request.user.id,
+        ).afirst()
+
+        if not borrow_record:
+            return error_json_response('no active borrow record found for this book and user')
+
+        now = timezone.now()
+
+        borrow_record.is_returned = True
+        borrow_record.actual_return_date = now
+        await borrow_record.asave()
+
+        await publish(
+            settings.BOOKCOURIER.publish_book_returned,
+            actual_return_date=now.isoformat(),
+            borrowed_book_id=borrow_record.id,
+        )
+        return success_json_response(None)
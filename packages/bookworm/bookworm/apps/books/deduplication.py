@@ -0,0 +1,28 @@
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from bookworm.apps.books.models import ProcessedEvent
+
+
+class DatabaseDeduplicationStore:
+    """Records processed event ids in `ProcessedEvent`, in the same transaction as the events' changes."""
+
+    def atomic(self) -> transaction.Atomic:
+        return transaction.atomic()
+
+    def claim(self, message_ids: list[str]) -> set[str]:
+        seen = set(ProcessedEvent.objects.filter(id__in=message_ids).values_list('id', flat=True))
+        ProcessedEvent.objects.bulk_create(
+            [ProcessedEvent(id=message_id) for message_id in message_ids if message_id not in seen]
+        )
+        return seen
+
+    def release(self, message_ids: list[str]) -> None:
+        ProcessedEvent.objects.filter(id__in=message_ids).delete()
+
+    def purge(self, older_than: float) -> int:
+        cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+        deleted, _ = ProcessedEvent.objects.filter(processed_at__lt=cutoff).delete()
+        return deleted
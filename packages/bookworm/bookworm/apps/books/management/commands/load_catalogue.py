@@ -0,0 +1,91 @@
+import csv
+import itertools
+from typing import IO, Any
+from pathlib import Path
+from datetime import UTC, datetime
+
+from django.db import connection, transaction
+from django.db.models import Field
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from bookcourier.snapshots import SnapshotError, SnapshotHeader, read_snapshot_header
+
+from bookworm.apps.books.models import Book, CatalogueSnapshot
+
+# rows are inserted this many at a time where COPY is not available.
+INSERT_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Load a catalogue snapshot exported by librarian, process_events then resumes from when it was taken'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', type=Path, help='Snapshot written by librarian export_catalogue')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        table = Book._meta.db_table  # noqa: SLF001
+        with options['path'].open(newline='') as file:
+            try:
+                header = read_snapshot_header(file)
+            except SnapshotError as e:
+                raise CommandError(str(e)) from e
+
+            if header.table != table or set(header.columns) != set(book_fields()):
+                msg = f'the snapshot holds {header.table} ({", ".join(header.columns)}), not the books kept here'
+                raise CommandError(msg)
+
+            with transaction.atomic():
+                # books are referenced by this service's own borrowings, so they are never replaced wholesale.
+                if Book.objects.exists():
+                    msg = 'the catalogue already has books, snapshots can only be loaded into an empty one'
+                    raise CommandError(msg)
+
+                if connection.vendor == 'postgresql':
+                    copy_rows(file, header)
+                else:
+                    insert_rows(file, header)
+
+                loaded = Book.objects.count()
+                if loaded != header.rows:
+                    msg = f'the snapshot should hold {header.rows} books but {loaded} were read, is it truncated?'
+                    raise CommandError(msg)
+
+                taken_at = datetime.fromtimestamp(header.taken_at, UTC)
+                CatalogueSnapshot.objects.create(taken_at=taken_at, books=loaded)
+
+        self.stdout.write(f'Loaded {loaded} books as of {taken_at.isoformat()}')
+
+
+def book_fields() -> dict[str, Field]:
+    """Return the fields of `Book` by the columns they are stored in."""
+    return {field.column: field for field in Book._meta.concrete_fields}  # noqa: SLF001
+
+
+def copy_rows(file: IO[str], header: SnapshotHeader) -> None:
+    quote_name = connection.ops.quote_name
+    columns = ', '.join(quote_name(column) for column in header.columns)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {quote_name(header.table)} ({columns}) FROM STDIN WITH (FORMAT csv)', file)
+
+
+def insert_rows(file: IO[str], header: SnapshotHeader) -> None:
+    """Insert the rows of `file` with plain parameterised statements, skipping the ORM's per-object work."""
+    quote_name = connection.ops.quote_name
+    fields = [book_fields()[column] for column in header.columns]
+    columns = ', '.join(quote_name(column) for column in header.columns)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {quote_name(header.table)} ({columns}) VALUES ({placeholders})'  # noqa: S608
+
+    rows = csv.reader(file)
+    with connection.cursor() as cursor:
+        while batch := list(itertools.islice(rows, INSERT_BATCH_SIZE)):
+            cursor.executemany(
+                sql,
+                [
+                    [
+                        field.get_db_prep_save(field.to_python(value), connection)
+                        for field, value in zip(fields, row, strict=True)
+                    ]
+                    for row in batch
+                ],
+            )
@@ -1,12 +1,16 @@
 import logging
 from typing import Any
+from itertools import groupby
 
+from django.db import transaction
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError, CommandParser
 
-from bookcourier import BookCourier, LibraryMessage
+from bookcourier import BookCourier, Deduplicator, LibraryMessage, PartialBatchError
+from bookcourier.events import BookAdded, BookRemoved, parse_event
 
-from bookworm.apps.books.models import Book
+from bookworm.apps.books.models import Book, CatalogueSnapshot
+from bookworm.apps.books.deduplication import DatabaseDeduplicationStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,40 +18,141 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Process book management events from RabbitMQ queue'
 
-    def process_event(self, event: LibraryMessage) -> None:
-        try:
-            event_type = event.get('event')
-            if event_type == 'book_added':
-                data = event.get('book')
-                Book.objects.create(
-                    id=data.get('id'),
-                    isbn=data.get('isbn'),
-                    title=data.get('title'),
-                    author=data.get('author'),
-                    added_by=data.get('added_by'),
-                    category=data.get('category'),
-                    publisher=data.get('publisher'),
-                    created_at=data.get('created_at'),
-                    updated_at=data.get('updated_at'),
-                )
-            elif event_type == 'book_removed':
-                Book.objects.delete(id=event.get('book_id'))
+    def process_event(self, message: LibraryMessage) -> None:
+        """Apply one event. Errors propagate so that bookcourier moves the event to its retry queue."""
+        with transaction.atomic():
+            event = parse_event(message)
+            if isinstance(event, BookAdded):
+                book_from_event(event).save()
+            elif isinstance(event, BookRemoved):
+                deleted, _ = Book.objects.filter(id=event.book_id).delete()
+                if not deleted:
+                    # the book may still be on its way through the retry queues, so it is retried too.
+                    msg = f'book {event.book_id} has not been added yet'
+                    raise Book.DoesNotExist(msg)
             else:
-                logger.debug('Skipping unsupported event: %s', event_type)
+                logger.debug('Skipping unsupported event: %s', message.get('event'))
+
+    def process_batch(self, messages: list[LibraryMessage]) -> None:
+        """Apply a batch of events in one transaction, falling back to one at a time if any of them fails.
+
+        Events that still fail on their own are reported with `PartialBatchError` so only they are retried.
+        """
+        try:
+            with transaction.atomic():
+                events = [parse_event(message) for message in messages]
+                for event_type, group in groupby(events, key=type):
+                    group_events = list(group)
+                    if event_type is BookAdded:
+                        Book.objects.bulk_create([book_from_event(event) for event in group_events])
+                    elif event_type is BookRemoved:
+                        remove_books(group_events)
+                    else:
+                        logger.debug('Skipping %d unsupported events', len(group_events))
         except Exception:
-            logger.exception('Error processing event: %s', event)
+            logger.exception('Error processing batch of %d events, retrying them one at a time', len(messages))
+            failures = {}
+            for index, message in enumerate(messages):
+                try:
+                    self.process_event(message)
+                except Exception as e:
+                    logger.exception('Error processing event: %s', message)
+                    failures[index] = e
+
+            if failures:
+                raise PartialBatchError(failures) from None
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=1, help='Number of events to apply per transaction')
+        parser.add_argument('--batch-wait', type=int, default=200, help='Milliseconds to wait for a batch to fill')
+        parser.add_argument(
+            '--prefetch', type=int, default=None, help='Unacknowledged events to prefetch, defaults to the batch size'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1, help='Number of worker threads, events for a book stay in order'
+        )
+        parser.add_argument('--drain-timeout', type=int, default=30, help='Seconds to finish in-flight events on exit')
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=settings.EVENTS_METRICS_PORT,
+            help='Port to serve Prometheus metrics on, defaults to the EVENTS_METRICS_PORT setting',
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         bookcourier: BookCourier = settings.BOOKCOURIER
+        deduplicator = Deduplicator(
+            DatabaseDeduplicationStore(), ttl=settings.EVENTS_DEDUP_TTL, applied_before=snapshot_watermark()
+        )
         logger.info('Starting to management events...')
+        if options['batch_size'] > 1 and options['workers'] > 1:
+            msg = '--batch-size and --workers cannot be combined'
+            raise CommandError(msg)
+
+        if options['metrics_port']:
+            bookcourier.serve_metrics(port=options['metrics_port'], queues=['management'])
+
         try:
-            bookcourier.consume_events(
-                queue='management',
-                callback=self.process_event,
-            )
+            if options['workers'] > 1:
+                bookcourier.consume_parallel(
+                    queue='management',
+                    callback=self.process_event,
+                    workers=options['workers'],
+                    prefetch_per_worker=options['prefetch'] or 10,
+                    drain_timeout=options['drain_timeout'],
+                    deduplicator=deduplicator,
+                )
+            elif options['batch_size'] > 1:
+                bookcourier.consume_batches(
+                    queue='management',
+                    callback=self.process_batch,
+                    batch_size=options['batch_size'],
+                    max_wait=options['batch_wait'] / 1000,
+                    prefetch_count=options['prefetch'],
+                    deduplicator=deduplicator,
+                )
+            else:
+                bookcourier.consume_events(
+                    queue='management',
+                    callback=self.process_event,
+                    deduplicator=deduplicator,
+                )
         except KeyboardInterrupt:
             logger.info('Stopped processing events due to keyboard interrupt')
         except Exception:
             logger.exception('Error occurred while processing book management events')
         finally:
             logger.info('Finished processing book management events')
+
+
+def snapshot_watermark() -> float | None:
+    """Return the publish time before which events are reflected in the catalogue snapshot loaded last, if any."""
+    snapshot = CatalogueSnapshot.objects.order_by('-loaded_at').first()
+    if snapshot is None:
+        return None
+
+    return snapshot.taken_at.timestamp() - settings.EVENTS_SNAPSHOT_OVERLAP
+
+
+def remove_books(events: list[BookRemoved]) -> None:
+    book_ids = {event.book_id for event in events}
+    books = Book.objects.filter(id__in=book_ids)
+    if missing := book_ids - set(books.values_list('id', flat=True)):
+        msg = f'books {", ".join(sorted(missing))} have not been added yet'
+        raise Book.DoesNotExist(msg)
+
+    books.delete()
+
+
+def book_from_event(event: BookAdded) -> Book:
+    return Book(
+        id=event.book.id,
+        isbn=event.book.isbn,
+        title=event.book.title,
+        author=event.book.author,
+        added_by=event.book.added_by,
+        category=event.book.category,
+        publisher=event.book.publisher,
+        created_at=event.book.created_at,
+        updated_at=event.book.updated_at,
+    )
@@ -0,0 +1,40 @@
+import logging
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from bookcourier import LibraryMessage, PartialBatchError
+
+from bookworm.apps.books.management.commands.process_events import Command as ProcessEventsCommand
+
+if TYPE_CHECKING:
+    from bookcourier import BookCourier
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalogue by replaying the book management events logged by process_events'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--start', type=int, default=1, help='Sequence number of the first event to replay')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of events to apply per transaction')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        bookcourier: BookCourier = settings.BOOKCOURIER
+        process_batch = ProcessEventsCommand().process_batch
+        failed = 0
+
+        def apply(events: list[LibraryMessage]) -> None:
+            nonlocal failed
+            try:
+                process_batch(events)
+            except PartialBatchError as e:
+                # every failed event was logged by `process_batch`, the rest of the batch is committed.
+                failed += len(e.failures)
+
+        replayed = bookcourier.replay_event_log(
+            queue='management', callback=apply, batch_size=options['batch_size'], start=options['start']
+        )
+        self.stdout.write(f'Replayed {replayed} logged events, {failed} of which failed')
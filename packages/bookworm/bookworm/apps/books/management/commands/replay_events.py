@@ -0,0 +1,19 @@
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+if TYPE_CHECKING:
+    from bookcourier import BookCourier
+
+
+class Command(BaseCommand):
+    help = 'Move book management events that ran out of retries from the parking lot back onto their queue'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of events to replay')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        bookcourier: BookCourier = settings.BOOKCOURIER
+        replayed = bookcourier.replay_parked_events(queue='management', limit=options['limit'])
+        self.stdout.write(f'Replayed {replayed} parked events')
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-19 11:40
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedEvent',
+            fields=[
+                ('id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('processed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-19 12:24
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('books', '0002_processedevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('loaded_at', models.DateTimeField(auto_now_add=True)),
+                ('books', models.PositiveIntegerField()),
+            ],
+        ),
+    ]
@@ -35,6 +35,9 @@ class Book(TimestampedModel):
     def is_available(self):
         return not self.borrowing_records.filter(is_returned=False).exists()
 
+    async def ais_available(self):
+        return not await self.borrowing_records.filter(is_returned=False).aexists()
+
     def current_borrowing(self):
         return self.borrowing_records.filter(is_returned=False).first()
 
@@ -64,3 +67,27 @@ class BorrowedBook(TimestampedModel):
             self.id = f'borrowed_{shortuuid.uuid()}'
 
         return super().save(*args, **kwargs)
+
+
+class ProcessedEvent(models.Model):
+    """The id of an event this service has applied, kept so that a redelivered copy is skipped."""
+
+    id = models.CharField(max_length=64, primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.id
+
+
+class CatalogueSnapshot(models.Model):
+    """A snapshot of librarian's catalogue that `load_catalogue` loaded the books from.
+
+    Events published before it was taken are already reflected in those books, so `process_events` skips them.
+    """
+
+    taken_at = models.DateTimeField()
+    loaded_at = models.DateTimeField(auto_now_add=True)
+    books = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'{self.books} books as of {self.taken_at.isoformat()}'
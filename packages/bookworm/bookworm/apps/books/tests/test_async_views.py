@@ -0,0 +1,170 @@
+import json
+import datetime
+from unittest.mock import patch
+
+import grpc
+
+from django.test import TestCase, AsyncRequestFactory, override_settings
+from django.utils import timezone
+
+from rest_framework import status
+
+from pagekeeper import PageKeeperServicer, add_PageKeeperServicer_to_server
+from pagekeeper.protos import pagekeeper_pb2
+from pagekeeper.helpers import create_token
+
+from bookworm.apps.books.models import Book, BorrowedBook
+from bookworm.apps.books.async_views import (
+    AsyncBookListView,
+    AsyncBookDetailView,
+    AsyncBorrowBookView,
+    AsyncReturnBookView,
+)
+
+
+class FakePageKeeper(PageKeeperServicer):
+    def __init__(self):
+        self.requests = []
+
+    async def FetchUsers(self, request, context):  # noqa: N802
+        self.requests.append(list(request.ids))
+        users = [
+            pagekeeper_pb2.User(id=user_id, email='admin@library.com', first_name='Jane', last_name='Doe')
+            for user_id in request.ids
+        ]
+        return pagekeeper_pb2.FetchUsersResponse(users=users)
+
+
+@override_settings(AUTHENTICATION_MODE='offline', AUTHENTICATION_SIGNING_KEYS=['not-secret-enough'])
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.book1 = Book.objects.create(
+            id='book_to_kill_a_mockingbird',
+            title='To Kill a Mockingbird',
+            author='Harper Lee',
+            added_by='user_admin',
+            isbn='9780446310789',
+            category='Fiction',
+            publisher='Grand Central Publishing',
+        )
+        self.book2 = Book.objects.create(
+            id='book_1984',
+            title='1984',
+            author='George Orwell',
+            added_by='user_admin',
+            isbn='9780451524935',
+            category='Fiction',
+            publisher='Signet Classic',
+        )
+        self.borrowed_book = BorrowedBook.objects.create(
+            id='borrowed_to_kill_a_mockingbird',
+            book=self.book1,
+            borrower='user_regular',
+            proposed_return_date=timezone.now() + datetime.timedelta(days=14),
+        )
+
+    def auth_headers(self, user_id='user_regular', is_admin=False):
+        token = create_token(
+            user_id=user_id,
+            is_admin=is_admin,
+            secret='not-secret-enough',
+            expiration=datetime.timedelta(hours=1),
+        )
+        return {'headers': {'Authorization': f'Bearer {token}'}}
+
+    async def test_book_list_view(self):
+        request = self.factory.get('/api/books', {'publishers': 'Signet Classic'}, **self.auth_headers())
+        response = await AsyncBookListView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in self.decode(response)['data']], ['book_1984'])
+
+    async def test_requests_without_credentials_are_rejected(self):
+        response = await AsyncBookListView.as_view()(self.factory.get('/api/books'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_admins_are_rejected(self):
+        request = self.factory.get('/api/books', **self.auth_headers('user_admin', is_admin=True))
+        response = await AsyncBookListView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_book_detail_view(self):
+        pagekeeper = FakePageKeeper()
+        server = grpc.aio.server()
+        add_PageKeeperServicer_to_server(pagekeeper, server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        await server.start()
+
+        request = self.factory.get('/api/books/book_1984', **self.auth_headers())
+        try:
+            with override_settings(AUTHENTICATION_SERVER_URL=f'127.0.0.1:{port}'):
+                response = await AsyncBookDetailView.as_view()(request, id='book_1984')
+        finally:
+            await server.stop(None)
+
+        data = self.decode(response)['data']
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['id'], 'book_1984')
+        self.assertEqual(data['added_by']['email'], 'admin@library.com')
+        self.assertEqual(pagekeeper.requests, [['user_admin']])
+
+    async def test_book_detail_view_nonexistent_book(self):
+        request = self.factory.get('/api/books/nonexistent_book', **self.auth_headers())
+        response = await AsyncBookDetailView.as_view()(request, id='nonexistent_book')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('django.conf.settings.BOOKCOURIER.publish_book_borrowed')
+    async def test_borrow_book_view(self, publish_book_borrowed):
+        request = self.factory.post(
+            '/api/books/book_1984/borrow',
+            {'duration': 14},
+            content_type='application/json',
+            **self.auth_headers(),
+        )
+        response = await AsyncBorrowBookView.as_view()(request, book_id='book_1984')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(await BorrowedBook.objects.filter(book_id='book_1984', borrower='user_regular').aexists())
+        publish_book_borrowed.assert_called_once()
+
+    @patch('django.conf.settings.BOOKCOURIER.publish_book_borrowed')
+    async def test_borrow_book_view_malformed_json(self, publish_book_borrowed):
+        request = self.factory.post(
+            '/api/books/book_1984/borrow',
+            b'{"duration": ',
+            content_type='application/json',
+            **self.auth_headers(),
+        )
+        response = await AsyncBorrowBookView.as_view()(request, book_id='book_1984')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.decode(response)['success'])
+        self.assertTrue(self.decode(response)['error'][0].startswith('JSON parse error'))
+        publish_book_borrowed.assert_not_called()
+
+    @patch('django.conf.settings.BOOKCOURIER.publish_book_borrowed')
+    async def test_borrow_book_view_already_borrowed(self, publish_book_borrowed):
+        request = self.factory.post(
+            '/api/books/book_to_kill_a_mockingbird/borrow',
+            {'duration': 14},
+            content_type='application/json',
+            **self.auth_headers(),
+        )
+        response = await AsyncBorrowBookView.as_view()(request, book_id='book_to_kill_a_mockingbird')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        publish_book_borrowed.assert_not_called()
+
+    @patch('django.conf.settings.BOOKCOURIER.publish_book_returned')
+    async def test_return_book_view(self, publish_book_returned):
+        request = self.factory.post('/api/books/book_to_kill_a_mockingbird/return', **self.auth_headers())
+        response = await AsyncReturnBookView.as_view()(request, book_id='book_to_kill_a_mockingbird')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        await self.borrowed_book.arefresh_from_db()
+        self.assertTrue(self.borrowed_book.is_returned)
+        publish_book_returned.assert_called_once()
+
+    def decode(self, response):
+        return json.loads(response.content)
@@ -0,0 +1,182 @@
+import json
+import time
+import datetime
+import tempfile
+import threading
+from types import SimpleNamespace
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from pagekeeper.helpers import create_token
+
+from bookworm.common.authentication import (
+    CustomUser,
+    SingleFlight,
+    JWTAuthentication,
+    InMemoryTokenCache,
+    get_keyset,
+    get_token_cache,
+    get_cache_timeout,
+)
+
+
+def make_user(user_id='user_regular_user'):
+    return CustomUser(
+        SimpleNamespace(id=user_id, email='user@library.com', is_admin=False, first_name='John', last_name='Smith')
+    )
+
+
+def make_token(user_id='user_regular_user', expires_in=3600, signing_key='not-secret-enough'):
+    return create_token(
+        secret=signing_key,
+        user_id=user_id,
+        is_admin=False,
+        expiration=datetime.timedelta(seconds=expires_in),
+        profile={'email': 'user@library.com', 'first_name': 'John', 'last_name': 'Smith'},
+    )
+
+
+class InMemoryTokenCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used_entry(self):
+        cache = InMemoryTokenCache(max_entries=2)
+        cache.set('a', make_user('user_a'), 60)
+        cache.set('b', make_user('user_b'), 60)
+        cache.get('a')
+        cache.set('c', make_user('user_c'), 60)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').id, 'user_a')
+        self.assertEqual(cache.get('c').id, 'user_c')
+
+    def test_expired_entries_are_not_returned(self):
+        cache = InMemoryTokenCache(max_entries=2)
+        cache.set('a', make_user(), 0.01)
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get('a'))
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def verify():
+            calls.append(1)
+            release.wait(1)
+            return make_user()
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', verify))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+
+    def test_errors_are_not_remembered(self):
+        flight = SingleFlight()
+
+        def fail():
+            msg = 'access token is invalid'
+            raise AuthenticationFailed(msg)
+
+        with self.assertRaises(AuthenticationFailed):
+            flight.do('key', fail)
+
+        self.assertEqual(flight.do('key', make_user).id, 'user_regular_user')
+
+
+class JWTAuthenticationCacheTest(SimpleTestCase):
+    def setUp(self):
+        get_token_cache.cache_clear()
+        self.addCleanup(get_token_cache.cache_clear)
+
+    @patch.object(JWTAuthentication, 'verify_credentials', return_value=make_user())
+    def test_repeated_tokens_are_verified_once(self, verify_credentials):
+        token = make_token()
+        authentication = JWTAuthentication()
+
+        for _ in range(3):
+            user, _ = authentication.authenticate_credentials(token)
+            self.assertEqual(user.id, 'user_regular_user')
+
+        verify_credentials.assert_called_once_with(token)
+
+    @patch.object(JWTAuthentication, 'verify_credentials', return_value=make_user())
+    def test_caching_can_be_disabled(self, verify_credentials):
+        token = make_token()
+        authentication = JWTAuthentication()
+
+        with self.settings(AUTHENTICATION_CACHE_TIMEOUT=0):
+            get_token_cache.cache_clear()
+            authentication.authenticate_credentials(token)
+            authentication.authenticate_credentials(token)
+
+        self.assertEqual(verify_credentials.call_count, 2)
+
+    def test_cache_timeout_is_bounded_by_token_expiry(self):
+        token = make_token(expires_in=10)
+        self.assertLessEqual(get_cache_timeout(token), 10)
+
+        with self.settings(AUTHENTICATION_CACHE_TIMEOUT=5):
+            self.assertEqual(get_cache_timeout(token), 5)
+
+        self.assertEqual(get_cache_timeout('invalid.token.here'), 0)
+
+
+class OfflineAuthenticationTest(SimpleTestCase):
+    def setUp(self):
+        get_keyset.cache_clear()
+        self.addCleanup(get_keyset.cache_clear)
+
+    @patch.object(JWTAuthentication, 'verify_credentials')
+    def test_user_is_built_from_claims(self, verify_credentials):
+        with self.settings(
+            AUTHENTICATION_MODE='offline', AUTHENTICATION_SIGNING_KEYS=['old-key', 'not-secret-enough']
+        ):
+            user, _ = JWTAuthentication().authenticate_credentials(make_token())
+
+        verify_credentials.assert_not_called()
+        self.assertEqual(user.id, 'user_regular_user')
+        self.assertEqual(user.email, 'user@library.com')
+        self.assertEqual(user.first_name, 'John')
+        self.assertFalse(user.is_admin)
+
+    def test_tokens_with_unknown_keys_are_rejected(self):
+        with (
+            self.settings(AUTHENTICATION_MODE='offline', AUTHENTICATION_SIGNING_KEYS=['not-secret-enough']),
+            self.assertRaises(AuthenticationFailed),
+        ):
+            JWTAuthentication().authenticate_credentials(make_token(signing_key='another-secret'))
+
+    def test_expired_tokens_are_rejected(self):
+        with (
+            self.settings(AUTHENTICATION_MODE='offline', AUTHENTICATION_SIGNING_KEYS=['not-secret-enough']),
+            self.assertRaises(AuthenticationFailed),
+        ):
+            JWTAuthentication().authenticate_credentials(make_token(expires_in=-10))
+
+    def test_keyset_file_revokes_tokens(self):
+        token = make_token()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'keyset.json'
+            path.write_text(json.dumps({'keys': ['not-secret-enough'], 'revoked': {'user_regular_user': time.time()}}))
+
+            with (
+                self.settings(
+                    AUTHENTICATION_MODE='offline',
+                    AUTHENTICATION_KEYSET_PATH=str(path),
+                    AUTHENTICATION_KEYSET_REFRESH_INTERVAL=0,
+                ),
+                self.assertRaisesMessage(AuthenticationFailed, 'access token has been revoked'),
+            ):
+                JWTAuthentication().authenticate_credentials(token)
@@ -0,0 +1,85 @@
+import csv
+import tempfile
+from io import StringIO
+from pathlib import Path
+from datetime import UTC, datetime
+
+from django.test import TestCase, override_settings
+from django.core.management import CommandError, call_command
+
+from bookcourier.snapshots import SnapshotHeader, write_snapshot_header
+
+from bookworm.apps.books.models import Book, CatalogueSnapshot
+from bookworm.apps.books.management.commands.process_events import snapshot_watermark
+
+COLUMNS = ['id', 'isbn', 'title', 'author', 'added_by', 'category', 'publisher', 'created_at', 'updated_at']
+
+TAKEN_AT = datetime(2026, 1, 1, tzinfo=UTC)
+
+
+def write_snapshot(path, *, books, rows=None):
+    with path.open('w', newline='') as file:
+        header = SnapshotHeader(
+            table='books_book',
+            columns=COLUMNS,
+            rows=books if rows is None else rows,
+            taken_at=TAKEN_AT.timestamp(),
+        )
+        write_snapshot_header(file, header)
+        csv.writer(file).writerows(
+            [
+                f'book_{number}',
+                f'978000000000{number}',
+                'Things Fall Apart',
+                'Chinua Achebe',
+                'user_admin',
+                'Fiction',
+                'Heinemann',
+                '2025-12-31 10:00:00+00:00',
+                '2025-12-31 10:00:00+00:00',
+            ]
+            for number in range(books)
+        )
+
+
+class LoadCatalogueTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'catalogue.snapshot'
+
+    @override_settings(EVENTS_SNAPSHOT_OVERLAP=60)
+    def test_snapshot_is_loaded_and_consuming_resumes_from_it(self):
+        self.assertIsNone(snapshot_watermark())
+        write_snapshot(self.path, books=3)
+
+        stdout = StringIO()
+        call_command('load_catalogue', self.path, stdout=stdout)
+
+        self.assertEqual(sorted(Book.objects.values_list('id', flat=True)), ['book_0', 'book_1', 'book_2'])
+        self.assertEqual(Book.objects.get(id='book_0').created_at, datetime(2025, 12, 31, 10, tzinfo=UTC))
+        self.assertEqual(CatalogueSnapshot.objects.get().books, 3)
+        self.assertEqual(snapshot_watermark(), TAKEN_AT.timestamp() - 60)
+        self.assertEqual(stdout.getvalue(), f'Loaded 3 books as of {TAKEN_AT.isoformat()}\n')
+
+    def test_snapshots_are_only_loaded_into_an_empty_catalogue(self):
+        write_snapshot(self.path, books=1)
+        call_command('load_catalogue', self.path, stdout=StringIO())
+
+        with self.assertRaisesMessage(CommandError, 'already has books'):
+            call_command('load_catalogue', self.path, stdout=StringIO())
+        self.assertEqual(CatalogueSnapshot.objects.count(), 1)
+
+    def test_truncated_snapshots_are_rejected(self):
+        write_snapshot(self.path, books=2, rows=3)
+
+        with self.assertRaisesMessage(CommandError, 'is it truncated?'):
+            call_command('load_catalogue', self.path, stdout=StringIO())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(CatalogueSnapshot.objects.exists())
+
+    def test_files_that_are_not_snapshots_are_rejected(self):
+        self.path.write_text('id,isbn\n')
+
+        with self.assertRaisesMessage(CommandError, 'not a bookcourier-snapshot/1 file'):
+            call_command('load_catalogue', self.path, stdout=StringIO())
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from bookworm.common.loaders import UserLoader, get_user_loader
+
+
+class FakeAuthService:
+    def __init__(self, known_ids):
+        self.known_ids = set(known_ids)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def FetchUsers(self, request):  # noqa: N802
+        with self.lock:
+            self.requests.append(list(request.ids))
+        users = [SimpleNamespace(id=user_id) for user_id in request.ids if user_id in self.known_ids]
+        return SimpleNamespace(users=users)
+
+
+class FakeAsyncAuthService(FakeAuthService):
+    def __init__(self, known_ids):
+        super().__init__(known_ids)
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def FetchUsers(self, request):  # noqa: N802
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return super().FetchUsers(request)
+
+
+class UserLoaderTest(SimpleTestCase):
+    def setUp(self):
+        self.auth_service = FakeAuthService(known_ids=[f'user_{i}' for i in range(10)])
+        patcher = patch('bookworm.common.loaders.init_authentication_service', return_value=self.auth_service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookups_are_deduplicated_and_memoized(self):
+        loader = UserLoader(batch_size=100, max_workers=4)
+        users = loader.load_many(['user_1', 'user_2', 'user_1', 'user_unknown'])
+
+        self.assertEqual(set(users), {'user_1', 'user_2'})
+        self.assertIsNone(loader.load('user_unknown'))
+        self.assertEqual(loader.load('user_2').id, 'user_2')
+        self.assertEqual(self.auth_service.requests, [['user_1', 'user_2', 'user_unknown']])
+
+    def test_primed_ids_are_fetched_in_bounded_chunks(self):
+        loader = UserLoader(batch_size=3, max_workers=2)
+        loader.prime(f'user_{i}' for i in range(8))
+
+        self.assertEqual(loader.load('user_7').id, 'user_7')
+        self.assertEqual(sorted(len(ids) for ids in self.auth_service.requests), [2, 3, 3])
+
+        loader.load_many(f'user_{i}' for i in range(8))
+        self.assertEqual(len(self.auth_service.requests), 3)
+
+    def test_loader_is_scoped_to_the_request(self):
+        request, other_request = SimpleNamespace(), SimpleNamespace()
+
+        self.assertIs(get_user_loader(request), get_user_loader(request))
+        self.assertIsNot(get_user_loader(request), get_user_loader(other_request))
+
+    async def test_async_lookups_await_concurrent_bounded_chunks(self):
+        auth_service = FakeAsyncAuthService(known_ids=[f'user_{i}' for i in range(10)])
+
+        @asynccontextmanager
+        async def async_authentication_service():
+            yield auth_service
+
+        loader = UserLoader(batch_size=2, max_workers=2)
+        with patch('bookworm.common.loaders.async_authentication_service', async_authentication_service):
+            users = await loader.aload_many([f'user_{i}' for i in range(7)] + ['user_unknown'])
+            self.assertEqual(set(users), {f'user_{i}' for i in range(7)})
+            self.assertIsNone(await loader.aload('user_unknown'))
+
+        self.assertEqual(sorted(len(ids) for ids in auth_service.requests), [2, 2, 2, 2])
+        self.assertEqual(auth_service.most_in_flight, 2)
+        self.assertEqual(self.auth_service.requests, [])
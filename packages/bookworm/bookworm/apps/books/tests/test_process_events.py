@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from io import StringIO
+from pathlib import Path
+
+import pika
+
+from django.conf import settings
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.utils import timezone
+from django.core.management import call_command
+
+from bookcourier import BookCourier, Deduplicator, PartialBatchError
+from bookcourier.dedup import SEQUENCE_HEADER, PRODUCER_ID_HEADER
+from bookcourier.eventlog import EventLog
+
+from bookworm.apps.books.models import Book, ProcessedEvent
+from bookworm.apps.books.deduplication import DatabaseDeduplicationStore
+from bookworm.apps.books.management.commands.process_events import Command
+
+
+def book_added(book_id, isbn):
+    now = timezone.now().isoformat()
+    return {
+        'event': 'book_added',
+        'book': {
+            'id': book_id,
+            'isbn': isbn,
+            'title': 'Things Fall Apart',
+            'author': 'Chinua Achebe',
+            'added_by': 'user_admin',
+            'category': 'Fiction',
+            'publisher': 'Heinemann',
+            'created_at': now,
+            'updated_at': now,
+        },
+    }
+
+
+class ProcessBatchTest(TestCase):
+    def test_batch_is_applied_in_order(self):
+        Command().process_batch(
+            [
+                book_added('book_one', '9780385474542'),
+                book_added('book_two', '9780435905255'),
+                {'event': 'book_removed', 'book_id': 'book_one'},
+                book_added('book_three', '9780143039952'),
+            ]
+        )
+
+        self.assertQuerySetEqual(Book.objects.order_by('id').values_list('id', flat=True), ['book_three', 'book_two'])
+
+    def test_failing_batch_is_retried_one_event_at_a_time(self):
+        with self.assertRaises(PartialBatchError) as raised:
+            Command().process_batch(
+                [
+                    book_added('book_one', '9780385474542'),
+                    book_added('book_two', '9780385474542'),
+                    book_added('book_three', '9780143039952'),
+                ]
+            )
+
+        self.assertEqual(list(raised.exception.failures), [1])
+
+        self.assertQuerySetEqual(Book.objects.order_by('id').values_list('id', flat=True), ['book_one', 'book_three'])
+
+    def test_removals_that_overtake_their_book_are_retried(self):
+        book_removed = {'event': 'book_removed', 'book_id': 'book_one'}
+        with self.assertRaises(Book.DoesNotExist):
+            Command().process_event(book_removed)
+
+        with self.assertRaises(PartialBatchError) as raised:
+            Command().process_batch([book_removed, book_added('book_two', '9780435905255')])
+        self.assertEqual(list(raised.exception.failures), [0])
+
+        # the book is delivered from its retry queue, then the removal from its own.
+        Command().process_event(book_added('book_one', '9780385474542'))
+        Command().process_event(book_removed)
+
+        self.assertQuerySetEqual(Book.objects.values_list('id', flat=True), ['book_two'])
+
+
+def delivered(sequence, message):
+    properties = pika.BasicProperties(
+        message_id=f'producer:{sequence}',
+        headers={PRODUCER_ID_HEADER: 'producer', SEQUENCE_HEADER: sequence},
+    )
+    return properties, message
+
+
+class DeduplicationTest(TestCase):
+    def test_redelivered_batch_is_skipped_after_a_restart(self):
+        batch = [
+            delivered(1, book_added('book_one', '9780385474542')),
+            delivered(2, book_added('book_two', '9780435905255')),
+        ]
+        Deduplicator(DatabaseDeduplicationStore()).process(batch, Command().process_batch)
+
+        Deduplicator(DatabaseDeduplicationStore()).process(
+            [*batch, delivered(3, book_added('book_three', '9780143039952'))], Command().process_batch
+        )
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(ProcessedEvent.objects.count(), 3)
+
+
+class ReplayEventLogTest(TestCase):
+    def test_logged_events_rebuild_the_catalogue(self):
+        with tempfile.TemporaryDirectory() as directory:
+            courier = BookCourier('memory://replay-event-log', event_log_directory=directory)
+            log = EventLog(Path(directory) / courier.queues['management'])
+            for number in range(5):
+                log.append(book_added(f'book_{number}', f'978000000000{number}'))
+            log.append({'event': 'book_removed', 'book_id': 'book_1'})
+            log.append(book_added('book_5', '9780000000002'))
+            log.close()
+
+            stdout = StringIO()
+            with override_settings(BOOKCOURIER=courier):
+                call_command('replay_event_log', start=2, batch_size=2, stdout=stdout)
+
+        self.assertEqual(sorted(Book.objects.values_list('id', flat=True)), ['book_2', 'book_3', 'book_4'])
+        self.assertEqual(stdout.getvalue(), 'Replayed 6 logged events, 1 of which failed\n')
+
+
+BOOT_CONSUMER = """
+import sys, json, django
+django.setup()
+from django.apps import apps
+from bookworm.apps.books.management.commands import process_events
+web_stack = ('rest_framework', 'drf_yasg', 'django.contrib.admin', 'whitenoise', 'corsheaders', 'grpc')
+print(json.dumps({
+    'apps': [config.name for config in apps.get_app_configs()],
+    'web_stack': [module for module in web_stack if module in sys.modules],
+}))
+"""
+
+
+class ConsumerSettingsTest(SimpleTestCase):
+    def test_consumer_boots_without_the_web_stack(self):
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, '-c', BOOT_CONSUMER],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'conf.consumer_settings'},
+            capture_output=True,
+            check=True,
+        )
+        booted = json.loads(result.stdout)
+
+        self.assertEqual(booted['apps'], ['bookworm.apps.books'])
+        self.assertEqual(booted['web_stack'], [])
@@ -1,10 +1,25 @@
+from django.conf import settings
 from django.urls import path
 
 from bookworm.apps.books.views import BookListAPIView, BookDetailAPIView, BorrowBookAPIView, ReturnBookAPIView
+from bookworm.apps.books.async_views import (
+    AsyncBookListView,
+    AsyncBookDetailView,
+    AsyncBorrowBookView,
+    AsyncReturnBookView,
+)
 
-urlpatterns = [
-    path('books', BookListAPIView.as_view(), name='book-list'),
-    path('books/<str:book_id>/borrow', BorrowBookAPIView.as_view(), name='borrow-book'),
-    path('books/<str:book_id>/return', ReturnBookAPIView.as_view(), name='return-book'),
-    path('books/<str:id>', BookDetailAPIView.as_view(), name='book-detail'),
-]
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('books', AsyncBookListView.as_view(), name='book-list'),
+        path('books/<str:book_id>/borrow', AsyncBorrowBookView.as_view(), name='borrow-book'),
+        path('books/<str:book_id>/return', AsyncReturnBookView.as_view(), name='return-book'),
+        path('books/<str:id>', AsyncBookDetailView.as_view(), name='book-detail'),
+    ]
+else:
+    urlpatterns = [
+        path('books', BookListAPIView.as_view(), name='book-list'),
+        path('books/<str:book_id>/borrow', BorrowBookAPIView.as_view(), name='borrow-book'),
+        path('books/<str:book_id>/return', ReturnBookAPIView.as_view(), name='return-book'),
+        path('books/<str:id>', BookDetailAPIView.as_view(), name='book-detail'),
+    ]
@@ -12,33 +12,34 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView
 
-from pagekeeper import FetchUsersRequest
-
+from bookworm.common.loaders import get_user_loader
 from bookworm.common.responses import error_response, success_response
 from bookworm.apps.books.models import Book, BorrowedBook
-from bookworm.common.authentication import init_authentication_service
 from bookworm.apps.books.serializers import BookSerializer, UserSerializer, DummySerializer, BorrowBookSerializer
 
 if TYPE_CHECKING:
     from bookcourier import BookCourier
 
 
+def filter_available_books(qs, query_params):
+    publishers = query_params.getlist('publishers')
+    categories = query_params.getlist('categories')
+
+    if publishers:
+        qs = qs.filter(publisher__in=publishers)
+
+    if categories:
+        qs = qs.filter(category__in=categories)
+
+    return qs.exclude(borrowing_records__is_returned=False)
+
+
 class BookListAPIView(GenericAPIView):
     queryset = Book.objects.get_queryset()
     serializer_class = BookSerializer
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        publishers = self.request.query_params.getlist('publishers')
-        categories = self.request.query_params.getlist('categories')
-
-        if publishers:
-            qs = qs.filter(publisher__in=publishers)
-
-        if categories:
-            qs = qs.filter(category__in=categories)
-
-        return qs.exclude(borrowing_records__is_returned=False)
+        return filter_available_books(super().get_queryset(), self.request.query_params)
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -73,9 +74,7 @@ class BookDetailAPIView(GenericAPIView):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
 
-        auth_service = init_authentication_service()
-        response = auth_service.FetchUsers(FetchUsersRequest(ids=[instance.added_by]))
-        added_by_user = response.users[0] if response.users else None
+        added_by_user = get_user_loader(request).load(instance.added_by)
 
         data = serializer.data
         data['added_by'] = UserSerializer(added_by_user).data if added_by_user else None
@@ -1,3 +1,5 @@
+from django.conf import settings
+
 from rest_framework import serializers
 
 from pagekeeper import RegisterRequest
@@ -22,6 +24,15 @@ class UserEnrollmentSerializer(serializers.Serializer):
                 first_name=validated_data['first_name'],
             )
         )
+        settings.BOOKCOURIER.publish_user_registered(
+            {
+                'is_admin': False,
+                'id': response.id,
+                'email': validated_data['email'],
+                'last_name': validated_data['last_name'],
+                'first_name': validated_data['first_name'],
+            }
+        )
         return response.id
 
 
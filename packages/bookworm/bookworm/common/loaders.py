@@ -0,0 +1,117 @@
+import asyncio
+from itertools import batched
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from pagekeeper import FetchUsersRequest
+
+from bookworm.common.authentication import init_authentication_service, async_authentication_service
+
+
+class UserLoader:
+    """Resolves pagekeeper user lookups made while handling a single request.
+
+    Ids are queued with `prime` and fetched together the next time a result is needed.
+    Each id is requested at most once: lookups are deduplicated, split into `FetchUsers`
+    calls of at most `batch_size` ids which run concurrently, and memoized for the
+    lifetime of the loader. `aload` and `aload_many` do the same over a `grpc.aio` channel,
+    for async views.
+    """
+
+    def __init__(self, *, batch_size: int, max_workers: int) -> None:
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._users: dict[str, object | None] = {}
+        self._pending: dict[str, None] = {}
+        self._auth_service = None
+
+    def prime(self, ids) -> None:
+        for user_id in ids:
+            if user_id and user_id not in self._users:
+                self._pending[user_id] = None
+
+    def load(self, user_id):
+        """Return the user with the given id, or `None` if pagekeeper does not know it."""
+        self.prime([user_id])
+        self.dispatch()
+        return self._users.get(user_id)
+
+    def load_many(self, ids) -> dict:
+        """Return a mapping of id to user for the ids pagekeeper knows about."""
+        ids = list(ids)
+        self.prime(ids)
+        self.dispatch()
+        return self._found(ids)
+
+    async def aload(self, user_id):
+        self.prime([user_id])
+        await self.adispatch()
+        return self._users.get(user_id)
+
+    async def aload_many(self, ids) -> dict:
+        ids = list(ids)
+        self.prime(ids)
+        await self.adispatch()
+        return self._found(ids)
+
+    def _found(self, ids) -> dict:
+        return {user_id: self._users[user_id] for user_id in ids if self._users.get(user_id) is not None}
+
+    def dispatch(self) -> None:
+        if not self._pending:
+            return
+
+        if self._auth_service is None:
+            self._auth_service = init_authentication_service()
+
+        pending, self._pending = self._pending, {}
+        chunks = list(batched(pending, self.batch_size))
+
+        if len(chunks) == 1:
+            results = [self._fetch(chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+                results = list(executor.map(self._fetch, chunks))
+
+        self._store(pending, results)
+
+    async def adispatch(self) -> None:
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        chunks = list(batched(pending, self.batch_size))
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async with async_authentication_service() as auth_service:
+            results = await asyncio.gather(*(self._afetch(auth_service, semaphore, ids) for ids in chunks))
+
+        self._store(pending, results)
+
+    def _fetch(self, ids):
+        response = self._auth_service.FetchUsers(FetchUsersRequest(ids=ids))
+        return response.users
+
+    async def _afetch(self, auth_service, semaphore, ids):
+        async with semaphore:
+            response = await auth_service.FetchUsers(FetchUsersRequest(ids=ids))
+        return response.users
+
+    def _store(self, pending, results) -> None:
+        self._users.update(dict.fromkeys(pending))
+        for users in results:
+            self._users.update({user.id: user for user in users})
+
+
+def get_user_loader(request) -> UserLoader:
+    """Return the user loader bound to `request`, creating it on first use."""
+    loader = getattr(request, 'user_loader', None)
+    if loader is None:
+        loader = UserLoader(
+            batch_size=settings.USER_LOADER_BATCH_SIZE,
+            max_workers=settings.USER_LOADER_MAX_WORKERS,
+        )
+        request.user_loader = loader
+
+    return loader
@@ -1,5 +1,7 @@
 from typing import Any
 
+from django.http import JsonResponse
+
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 from rest_framework.response import Response
 
@@ -13,3 +15,13 @@ def error_response(error: Any, status_code: int = HTTP_400_BAD_REQUEST) -> Respo
     """Generate an error response with the provided message, error, and status code."""
     error_data = {'error': error, 'success': False}
     return Response(error_data, status=status_code)
+
+
+def success_json_response(data: Any, status_code: int = HTTP_200_OK) -> JsonResponse:
+    """Generate a plain Django success response for views that do not go through DRF."""
+    return JsonResponse({'success': True, 'data': data}, status=status_code)
+
+
+def error_json_response(error: Any, status_code: int = HTTP_400_BAD_REQUEST) -> JsonResponse:
+    """Generate a plain Django error response for views that do not go through DRF."""
+    return JsonResponse({'error': error, 'success': False}, status=status_code)
@@ -1,9 +1,18 @@
+import json
+
 from django.http import HttpRequest, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import status, permissions
 from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import ParseError, NotAuthenticated, PermissionDenied, AuthenticationFailed
+
+from bookworm.common.responses import error_json_response
+from bookworm.common.authentication import JWTAuthentication
 
 
 def handler_400(request, exception, *args, **kwargs):  # noqa: ARG001
@@ -27,6 +36,49 @@ def handler_500(request: HttpRequest) -> JsonResponse:  # noqa: ARG001
     )
 
 
+class AsyncAPIView(View):
+    """Base class for async endpoints meant to be served under ASGI.
+
+    DRF views are synchronous, so this mirrors what they do for us: bearer token
+    authentication, the default permission classes and the standard error envelope.
+    """
+
+    authentication = JWTAuthentication()
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            result = await self.authentication.aauthenticate(request)
+        except AuthenticationFailed as e:
+            return error_json_response([e.detail], status_code=status.HTTP_403_FORBIDDEN)
+
+        if result is None:
+            return error_json_response([NotAuthenticated.default_detail], status_code=status.HTTP_403_FORBIDDEN)
+
+        request.user = result[0]
+        for permission_class in self.permission_classes:
+            if not permission_class().has_permission(request, self):
+                return error_json_response([PermissionDenied.default_detail], status_code=status.HTTP_403_FORBIDDEN)
+
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ParseError as e:
+            return error_json_response([e.detail], status_code=status.HTTP_400_BAD_REQUEST)
+
+    def get_data(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                msg = f'JSON parse error - {e}'
+                raise ParseError(msg) from e
+        return request.POST
+
+
 class HttpAndHttpsOpenAPISchemaGenerator(OpenAPISchemaGenerator):
     def get_schema(self, request=None, public=False):  # noqa: FBT002
         schema = super().get_schema(request, public)
@@ -0,0 +1,22 @@
+"""
+Django settings for the bookworm event consumer.
+
+The consumer only needs the ORM, bookcourier and the models its handler writes to, so it inherits every
+setting from `conf.settings` but registers none of the web stack: no admin, auth, sessions, DRF, drf_yasg,
+whitenoise or middleware are imported, which keeps each consumer replica quick to start and small.
+
+Used by `consumer.py`, which takes the same options as `manage.py process_events`.
+"""
+
+from conf.settings import *  # noqa: F403
+
+INSTALLED_APPS = ['bookworm.apps.books']
+
+MIDDLEWARE = []
+
+TEMPLATES = []
+
+STORAGES = {}
+
+# nothing is served, so nothing should resolve URLs; this also keeps system checks from importing the views.
+ROOT_URLCONF = None
@@ -14,7 +14,7 @@ from pathlib import Path
 
 from environs import Env
 
-from bookcourier import BookCourier
+from bookcourier import BookCourier, RetryPolicy
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -54,6 +54,9 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 WSGI_APPLICATION = 'conf.wsgi.application'
 
+# route the hot book endpoints to their async variants; only worthwhile when served by an ASGI server.
+ASYNC_VIEWS = env.bool('BOOKWORM_ASYNC_VIEWS', False)
+
 ROOT_URLCONF = 'conf.urls'
 
 # ==============================================================================
@@ -186,10 +189,68 @@ CORS_ALLOW_ALL_ORIGINS = True
 # ==============================================================================
 AUTHENTICATION_SERVER_URL = env.str('BOOKWORM_AUTHENTICATION_SERVER_URL')
 
+# `remote` verifies every token with pagekeeper, `offline` checks signatures locally against the key set.
+AUTHENTICATION_MODE = env.str('BOOKWORM_AUTHENTICATION_MODE', 'remote')
+
+AUTHENTICATION_SIGNING_KEYS = env.list('BOOKWORM_AUTHENTICATION_SIGNING_KEYS', default=[])
+
+AUTHENTICATION_KEYSET_PATH = env.str('BOOKWORM_AUTHENTICATION_KEYSET_PATH', None)
+
+AUTHENTICATION_KEYSET_REFRESH_INTERVAL = env.int('BOOKWORM_AUTHENTICATION_KEYSET_REFRESH_INTERVAL', 30)
+
+# verified tokens are cached in-process (`memory`) or in a Django cache (`django`); a timeout of 0 disables caching.
+AUTHENTICATION_CACHE_BACKEND = env.str('BOOKWORM_AUTHENTICATION_CACHE_BACKEND', 'memory')
+
+AUTHENTICATION_CACHE_ALIAS = env.str('BOOKWORM_AUTHENTICATION_CACHE_ALIAS', 'default')
+
+AUTHENTICATION_CACHE_TIMEOUT = env.int('BOOKWORM_AUTHENTICATION_CACHE_TIMEOUT', 60)
+
+AUTHENTICATION_CACHE_MAX_ENTRIES = env.int('BOOKWORM_AUTHENTICATION_CACHE_MAX_ENTRIES', 10_000)
+
+# user lookups made while handling a request are sent to pagekeeper in concurrent batches of this size.
+USER_LOADER_BATCH_SIZE = env.int('BOOKWORM_USER_LOADER_BATCH_SIZE', 100)
+
+USER_LOADER_MAX_WORKERS = env.int('BOOKWORM_USER_LOADER_MAX_WORKERS', 4)
+
 # ==============================================================================
 # BOOKCOURIER SETTINGS
 # ==============================================================================
-BOOKCOURIER = BookCourier(env.str('BOOKWORM_RABBITMQ_URL'))
+BOOKCOURIER = BookCourier(
+    # a `postgresql://`, `sqlite:///` or `memory://` transport URL takes the place of RabbitMQ when set.
+    env.str('BOOKWORM_EVENTS_TRANSPORT_URL', None) or env.str('BOOKWORM_RABBITMQ_URL'),
+    publisher_confirms=env.bool('BOOKWORM_RABBITMQ_PUBLISHER_CONFIRMS', False),
+    background_publishing=env.bool('BOOKWORM_RABBITMQ_BACKGROUND_PUBLISHING', False),
+    max_pending_publishes=env.int('BOOKWORM_RABBITMQ_MAX_PENDING_PUBLISHES', 10_000),
+    # `block`, `drop` or `raise` once `max_pending_publishes` events are waiting to be published.
+    overflow_policy=env.str('BOOKWORM_RABBITMQ_OVERFLOW_POLICY', 'block'),
+    # `application/json` or `application/msgpack`, consumers accept either.
+    content_type=env.str('BOOKWORM_RABBITMQ_CONTENT_TYPE', 'application/json'),
+    # connections idle this long are checked before their next use, so one the broker dropped is replaced up front.
+    keepalive_interval=env.float('BOOKWORM_RABBITMQ_KEEPALIVE_INTERVAL', 20),
+    spool_directory=env.str('BOOKWORM_EVENTS_SPOOL_DIRECTORY', str(BASE_DIR / 'spool')),
+    bulk_prefetch_ratio=env.float('BOOKWORM_EVENTS_BULK_PREFETCH_RATIO', 0.2),
+    propagation_outlier_seconds=env.float('BOOKWORM_EVENTS_PROPAGATION_OUTLIER_SECONDS', 5),
+    # committed events are also logged here for `manage.py replay_event_log`.
+    event_log_directory=env.str('BOOKWORM_EVENTS_LOG_DIRECTORY', None),
+    # failed events are retried after exponentially growing delays, then parked for `manage.py replay_events`.
+    retry_policy=RetryPolicy(
+        max_retries=env.int('BOOKWORM_EVENTS_MAX_RETRIES', 4),
+        base_delay=env.float('BOOKWORM_EVENTS_RETRY_BASE_DELAY', 1),
+        multiplier=env.float('BOOKWORM_EVENTS_RETRY_MULTIPLIER', 5),
+    ),
+)
+
+# async views publish from a pool of this many threads, each with a transport of its own.
+EVENTS_PUBLISH_THREADS = env.int('BOOKWORM_EVENTS_PUBLISH_THREADS', 8)
+
+# ids of applied events are kept this many seconds, so redeliveries within it are skipped.
+EVENTS_DEDUP_TTL = env.int('BOOKWORM_EVENTS_DEDUP_TTL', 7 * 24 * 60 * 60)
+
+# events published up to this many seconds before a `manage.py load_catalogue` snapshot was taken are still applied.
+EVENTS_SNAPSHOT_OVERLAP = env.int('BOOKWORM_EVENTS_SNAPSHOT_OVERLAP', 60)
+
+# `process_events` serves consumer metrics for Prometheus on this port, when set.
+EVENTS_METRICS_PORT = env.int('BOOKWORM_EVENTS_METRICS_PORT', None)
 
 # ==============================================================================
 # LOGGING SETTINGS
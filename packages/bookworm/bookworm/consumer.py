@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+"""Run the book management event consumer without booting the web stack.
+
+Takes the same options as `manage.py process_events`, see `conf.consumer_settings` for what is left out.
+"""
+
+import os
+import sys
+
+
+def main() -> None:
+    """Consume book management events."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.consumer_settings')
+    try:
+        from django.core.management import execute_from_command_line
+    except ImportError as exc:
+        msg = (
+            "Couldn't import Django. Are you sure it's installed and "
+            'available on your PYTHONPATH environment variable? Did you '
+            'forget to activate a virtual environment?'
+        )
+        raise ImportError(msg) from exc
+    # system checks only cover the web stack, which is not loaded here.
+    execute_from_command_line([sys.argv[0], 'process_events', '--skip-checks', *sys.argv[1:]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import csv
+import time
+from typing import IO, Any
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand, CommandParser
+
+from bookcourier.snapshots import SnapshotHeader, write_snapshot_header
+
+from librarian.apps.books.models import Book
+
+# the columns bookworm keeps of every book.
+SNAPSHOT_COLUMNS = ['id', 'isbn', 'title', 'author', 'added_by', 'category', 'publisher', 'created_at', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = 'Export a consistent snapshot of the catalogue, for bookworm load_catalogue to initialise its books from'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', type=Path, help='File to write the snapshot to')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        # the count, the rows and the time they are as of all come from one transaction.
+        with transaction.atomic(), options['path'].open('w', newline='') as file:
+            header = copy_snapshot(file) if connection.vendor == 'postgresql' else write_snapshot(file)
+
+        self.stdout.write(f'Exported {header.rows} books to {options["path"]}')
+
+
+def copy_snapshot(file: IO[str]) -> SnapshotHeader:
+    """Stream the books out with COPY, from a read-only snapshot taken as the transaction starts."""
+    quote_name = connection.ops.quote_name
+    table = quote_name(Book._meta.db_table)  # noqa: SLF001
+    columns = ', '.join(quote_name(column) for column in SNAPSHOT_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        cursor.execute(f'SELECT extract(epoch FROM now()), count(*) FROM {table}')  # noqa: S608
+        taken_at, rows = cursor.fetchone()
+        header = SnapshotHeader(
+            table=Book._meta.db_table,  # noqa: SLF001
+            columns=SNAPSHOT_COLUMNS,
+            rows=rows,
+            taken_at=float(taken_at),
+        )
+        write_snapshot_header(file, header)
+        cursor.copy_expert(f'COPY (SELECT {columns} FROM {table}) TO STDOUT WITH (FORMAT csv)', file)  # noqa: S608
+
+    return header
+
+
+def write_snapshot(file: IO[str]) -> SnapshotHeader:
+    """Write the books out through the ORM, for databases without COPY."""
+    taken_at = time.time()
+    books = Book.objects.values_list(*SNAPSHOT_COLUMNS)
+    header = SnapshotHeader(
+        table=Book._meta.db_table,  # noqa: SLF001
+        columns=SNAPSHOT_COLUMNS,
+        rows=books.count(),
+        taken_at=taken_at,
+    )
+    write_snapshot_header(file, header)
+    csv.writer(file).writerows(books.iterator(chunk_size=5000))
+    return header
@@ -1,12 +1,18 @@
 import logging
+import dataclasses
 from typing import Any
+from itertools import groupby
 
+from django.db import transaction
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError, CommandParser
 
-from bookcourier import BookCourier, LibraryMessage
+from bookcourier import BookCourier, Deduplicator, LibraryMessage, PartialBatchError
+from bookcourier.events import BookBorrowed, BookReturned, UserRegistered, parse_event
 
 from librarian.apps.books.models import BorrowedBook
+from librarian.apps.users.models import DirectoryUser
+from librarian.apps.books.deduplication import DatabaseDeduplicationStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,49 +20,149 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Process book transactions events from RabbitMQ queue'
 
-    def process_event(self, event: LibraryMessage) -> None:
-        try:
-            event_type = event.get('event')
-            if event_type == 'book_borrowed':
-                data = event.get('borrowed_book')
-                user_id = data.get('user_id')
-                book_id = data.get('book_id')
-
-                logger.info('Processing borrowed book with id %s by %s...', book_id, user_id)
-                BorrowedBook.objects.create(
-                    book_id=book_id,
-                    borrower=user_id,
-                    id=data.get('id'),
-                    created_at=data.get('created_at'),
-                    updated_at=data.get('updated_at'),
-                    proposed_return_date=data.get('proposed_return_date'),
+    def process_event(self, message: LibraryMessage) -> None:
+        """Apply one event. Errors propagate so that bookcourier moves the event to its retry queue."""
+        with transaction.atomic():
+            event = parse_event(message)
+            if isinstance(event, BookBorrowed):
+                logger.info(
+                    'Processing borrowed book with id %s by %s...',
+                    event.borrowed_book.book_id,
+                    event.borrowed_book.user_id,
                 )
-            elif event_type == 'book_returned':
-                borrowed_book_id = event.get('borrowed_book_id')
-                actual_return_date = event.get('actual_return_date')
-
-                logger.info('Processing returned book with id %s...', borrowed_book_id)
-                BorrowedBook.objects.filter(id=borrowed_book_id).update(
+                borrowed_book_from_event(event).save()
+            elif isinstance(event, BookReturned):
+                logger.info('Processing returned book with id %s...', event.borrowed_book_id)
+                returned = BorrowedBook.objects.filter(id=event.borrowed_book_id).update(
                     is_returned=True,
-                    updated_at=actual_return_date,
-                    actual_return_date=actual_return_date,
+                    updated_at=event.actual_return_date,
+                    actual_return_date=event.actual_return_date,
                 )
+                if not returned:
+                    # the borrowing may still be on its way through the retry queues, so it is retried too.
+                    msg = f'borrowed book {event.borrowed_book_id} has not been recorded yet'
+                    raise BorrowedBook.DoesNotExist(msg)
+            elif isinstance(event, UserRegistered):
+                logger.info('Processing registered user with id %s...', event.user.id)
+                DirectoryUser.upsert_many([dataclasses.asdict(event.user)])
             else:
-                logger.debug('Skipping unsupported event: %s', event_type)
+                logger.debug('Skipping unsupported event: %s', message.get('event'))
+
+    def process_batch(self, messages: list[LibraryMessage]) -> None:
+        """Apply a batch of events in one transaction, falling back to one at a time if any of them fails.
+
+        Events that still fail on their own are reported with `PartialBatchError` so only they are retried.
+        """
+        try:
+            with transaction.atomic():
+                events = [parse_event(message) for message in messages]
+                for event_type, group in groupby(events, key=type):
+                    group_events = list(group)
+                    if event_type is BookBorrowed:
+                        BorrowedBook.objects.bulk_create([borrowed_book_from_event(event) for event in group_events])
+                    elif event_type is BookReturned:
+                        return_borrowed_books(group_events)
+                    elif event_type is UserRegistered:
+                        DirectoryUser.upsert_many([dataclasses.asdict(event.user) for event in group_events])
+                    else:
+                        logger.debug('Skipping %d unsupported events', len(group_events))
         except Exception:
-            logger.exception('Error processing event: %s', event)
+            logger.exception('Error processing batch of %d events, retrying them one at a time', len(messages))
+            failures = {}
+            for index, message in enumerate(messages):
+                try:
+                    self.process_event(message)
+                except Exception as e:
+                    logger.exception('Error processing event: %s', message)
+                    failures[index] = e
+
+            if failures:
+                raise PartialBatchError(failures) from None
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=1, help='Number of events to apply per transaction')
+        parser.add_argument('--batch-wait', type=int, default=200, help='Milliseconds to wait for a batch to fill')
+        parser.add_argument(
+            '--prefetch', type=int, default=None, help='Unacknowledged events to prefetch, defaults to the batch size'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1, help='Number of worker threads, events for a book stay in order'
+        )
+        parser.add_argument('--drain-timeout', type=int, default=30, help='Seconds to finish in-flight events on exit')
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=settings.EVENTS_METRICS_PORT,
+            help='Port to serve Prometheus metrics on, defaults to the EVENTS_METRICS_PORT setting',
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         bookcourier: BookCourier = settings.BOOKCOURIER
+        deduplicator = Deduplicator(DatabaseDeduplicationStore(), ttl=settings.EVENTS_DEDUP_TTL)
         logger.info('Starting to process book transaction events...')
+        if options['batch_size'] > 1 and options['workers'] > 1:
+            msg = '--batch-size and --workers cannot be combined'
+            raise CommandError(msg)
+
+        if options['metrics_port']:
+            bookcourier.serve_metrics(port=options['metrics_port'], queues=['transaction'])
+
         try:
-            bookcourier.consume_events(
-                queue='transaction',
-                callback=self.process_event,
-            )
+            if options['workers'] > 1:
+                bookcourier.consume_parallel(
+                    queue='transaction',
+                    callback=self.process_event,
+                    workers=options['workers'],
+                    prefetch_per_worker=options['prefetch'] or 10,
+                    drain_timeout=options['drain_timeout'],
+                    deduplicator=deduplicator,
+                )
+            elif options['batch_size'] > 1:
+                bookcourier.consume_batches(
+                    queue='transaction',
+                    callback=self.process_batch,
+                    batch_size=options['batch_size'],
+                    max_wait=options['batch_wait'] / 1000,
+                    prefetch_count=options['prefetch'],
+                    deduplicator=deduplicator,
+                )
+            else:
+                bookcourier.consume_events(
+                    queue='transaction',
+                    callback=self.process_event,
+                    deduplicator=deduplicator,
+                )
         except KeyboardInterrupt:
             logger.info('Stopped processing events due to keyboard interrupt')
         except Exception:
             logger.exception('Error occurred while processing book transaction events')
         finally:
             logger.info('Finished processing booktransaction events')
+
+
+def borrowed_book_from_event(event: BookBorrowed) -> BorrowedBook:
+    return BorrowedBook(
+        id=event.borrowed_book.id,
+        book_id=event.borrowed_book.book_id,
+        borrower=event.borrowed_book.user_id,
+        created_at=event.borrowed_book.created_at,
+        updated_at=event.borrowed_book.updated_at,
+        proposed_return_date=event.borrowed_book.proposed_return_date,
+    )
+
+
+def return_borrowed_books(events: list[BookReturned]) -> None:
+    return_dates = {event.borrowed_book_id: event.actual_return_date for event in events}
+    borrowed_books = BorrowedBook.objects.in_bulk(list(return_dates))
+    if missing := return_dates.keys() - borrowed_books.keys():
+        msg = f'borrowed books {", ".join(sorted(missing))} have not been recorded yet'
+        raise BorrowedBook.DoesNotExist(msg)
+
+    for borrowed_book_id, borrowed_book in borrowed_books.items():
+        borrowed_book.is_returned = True
+        borrowed_book.updated_at = return_dates[borrowed_book_id]
+        borrowed_book.actual_return_date = return_dates[borrowed_book_id]
+
+    BorrowedBook.objects.bulk_update(
+        borrowed_books.values(), fields=['is_returned', 'updated_at', 'actual_return_date']
+    )
@@ -72,3 +72,13 @@ class BorrowedBook(TimestampedModel):
         self.is_returned = True
         self.actual_return_date = timezone.now()
         self.save()
+
+
+class ProcessedEvent(models.Model):
+    """The id of an event this service has applied, kept so that a redelivered copy is skipped."""
+
+    id = models.CharField(max_length=64, primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.id
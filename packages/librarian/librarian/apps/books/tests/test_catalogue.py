@@ -0,0 +1,44 @@
+import csv
+import time
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.test import TestCase
+from django.core.management import call_command
+
+from bookcourier.snapshots import read_snapshot_header
+
+from librarian.apps.books.models import Book
+from librarian.apps.books.management.commands.export_catalogue import SNAPSHOT_COLUMNS
+
+
+class ExportCatalogueTest(TestCase):
+    def test_books_are_exported_with_a_header(self):
+        for number in range(3):
+            Book.objects.create(
+                id=f'book_{number}',
+                title='Things Fall Apart',
+                author='Chinua Achebe',
+                added_by='user_admin',
+                isbn=f'978000000000{number}',
+                category='Fiction',
+                publisher='Heinemann',
+            )
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'catalogue.snapshot'
+            stdout = StringIO()
+            started = time.time()
+            call_command('export_catalogue', path, stdout=stdout)
+
+            with path.open(newline='') as file:
+                header = read_snapshot_header(file)
+                rows = list(csv.reader(file))
+
+        self.assertEqual(header.table, 'books_book')
+        self.assertEqual(header.columns, SNAPSHOT_COLUMNS)
+        self.assertEqual(header.rows, 3)
+        self.assertGreaterEqual(header.taken_at, started)
+        self.assertEqual(sorted(row[0] for row in rows), ['book_0', 'book_1', 'book_2'])
+        self.assertEqual(stdout.getvalue(), f'Exported 3 books to {path}\n')
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import subprocess
+from datetime import timedelta
+
+import pika
+
+from django.conf import settings
+from django.test import TestCase, SimpleTestCase
+from django.utils import timezone
+
+from bookcourier import Deduplicator, PartialBatchError
+from bookcourier.dedup import SEQUENCE_HEADER, PRODUCER_ID_HEADER
+
+from librarian.apps.books.models import Book, BorrowedBook, ProcessedEvent
+from librarian.apps.users.models import DirectoryUser
+from librarian.apps.books.deduplication import DatabaseDeduplicationStore
+from librarian.apps.books.management.commands.process_events import Command
+
+
+def book_borrowed(borrowed_book_id, book_id):
+    now = timezone.now()
+    return {
+        'event': 'book_borrowed',
+        'borrowed_book': {
+            'id': borrowed_book_id,
+            'book_id': book_id,
+            'user_id': 'user_regular_user',
+            'created_at': now.isoformat(),
+            'updated_at': now.isoformat(),
+            'proposed_return_date': (now + timedelta(days=7)).isoformat(),
+        },
+    }
+
+
+class ProcessBatchTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title='Things Fall Apart',
+            author='Chinua Achebe',
+            added_by='user_admin',
+            isbn='9780385474542',
+            category='Fiction',
+            publisher='Heinemann',
+        )
+
+    def test_batch_is_applied_in_order(self):
+        returned_at = timezone.now()
+        Command().process_batch(
+            [
+                book_borrowed('borrowed_one', self.book.id),
+                {
+                    'event': 'book_returned',
+                    'borrowed_book_id': 'borrowed_one',
+                    'actual_return_date': returned_at.isoformat(),
+                },
+                {
+                    'event': 'user_registered',
+                    'user': {
+                        'id': 'user_regular_user',
+                        'email': 'user@library.com',
+                        'is_admin': False,
+                        'first_name': 'John',
+                        'last_name': 'Smith',
+                    },
+                },
+                book_borrowed('borrowed_two', self.book.id),
+            ]
+        )
+
+        returned = BorrowedBook.objects.get(id='borrowed_one')
+        self.assertTrue(returned.is_returned)
+        self.assertEqual(returned.actual_return_date, returned_at)
+        self.assertFalse(BorrowedBook.objects.get(id='borrowed_two').is_returned)
+        self.assertTrue(DirectoryUser.objects.filter(id='user_regular_user').exists())
+
+    def test_failing_batch_is_retried_one_event_at_a_time(self):
+        with self.assertRaises(PartialBatchError) as raised:
+            Command().process_batch(
+                [
+                    book_borrowed('borrowed_one', self.book.id),
+                    book_borrowed('borrowed_one', self.book.id),
+                    {'event': 'book_borrowed', 'borrowed_book': {'id': 'borrowed_three'}},
+                    book_borrowed('borrowed_two', self.book.id),
+                ]
+            )
+
+        self.assertEqual(list(raised.exception.failures), [2])
+
+        self.assertQuerySetEqual(
+            BorrowedBook.objects.order_by('id').values_list('id', flat=True), ['borrowed_one', 'borrowed_two']
+        )
+
+    def test_returns_that_overtake_their_borrowing_are_retried(self):
+        returned_at = timezone.now()
+        book_returned = {
+            'event': 'book_returned',
+            'borrowed_book_id': 'borrowed_one',
+            'actual_return_date': returned_at.isoformat(),
+        }
+        with self.assertRaises(BorrowedBook.DoesNotExist):
+            Command().process_event(book_returned)
+
+        with self.assertRaises(PartialBatchError) as raised:
+            Command().process_batch([book_returned, book_borrowed('borrowed_two', self.book.id)])
+        self.assertEqual(list(raised.exception.failures), [0])
+
+        # the borrowing is delivered from its retry queue, then the return from its own.
+        Command().process_event(book_borrowed('borrowed_one', self.book.id))
+        Command().process_event(book_returned)
+
+        returned = BorrowedBook.objects.get(id='borrowed_one')
+        self.assertTrue(returned.is_returned)
+        self.assertEqual(returned.actual_return_date, returned_at)
+
+
+def delivered(sequence, message):
+    properties = pika.BasicProperties(
+        message_id=f'producer:{sequence}',
+        headers={PRODUCER_ID_HEADER: 'producer', SEQUENCE_HEADER: sequence},
+    )
+    return properties, message
+
+
+class DeduplicationTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title='Things Fall Apart',
+            author='Chinua Achebe',
+            added_by='user_admin',
+            isbn='9780385474542',
+            category='Fiction',
+            publisher='Heinemann',
+        )
+
+    def test_redelivered_batch_is_skipped_after_a_restart(self):
+        batch = [
+            delivered(1, book_borrowed('borrowed_one', self.book.id)),
+            delivered(2, book_borrowed('borrowed_two', self.book.id)),
+        ]
+        Deduplicator(DatabaseDeduplicationStore()).process(batch, Command().process_batch)
+
+        Deduplicator(DatabaseDeduplicationStore()).process(
+            [*batch, delivered(3, book_borrowed('borrowed_three', self.book.id))], Command().process_batch
+        )
+
+        self.assertEqual(BorrowedBook.objects.count(), 3)
+        self.assertEqual(ProcessedEvent.objects.count(), 3)
+
+    def test_purge_removes_expired_ids(self):
+        ProcessedEvent.objects.create(id='producer:1')
+        ProcessedEvent.objects.filter(id='producer:1').update(processed_at=timezone.now() - timedelta(days=8))
+        ProcessedEvent.objects.create(id='producer:2')
+
+        self.assertEqual(DatabaseDeduplicationStore().purge(older_than=timedelta(days=7).total_seconds()), 1)
+        self.assertQuerySetEqual(ProcessedEvent.objects.values_list('id', flat=True), ['producer:2'])
+
+
+BOOT_CONSUMER = """
+import sys, json, django
+django.setup()
+from django.apps import apps
+from librarian.apps.books.management.commands import process_events
+web_stack = ('rest_framework', 'drf_yasg', 'django.contrib.admin', 'whitenoise', 'corsheaders', 'grpc')
+print(json.dumps({
+    'apps': [config.name for config in apps.get_app_configs()],
+    'web_stack': [module for module in web_stack if module in sys.modules],
+}))
+"""
+
+
+class ConsumerSettingsTest(SimpleTestCase):
+    def test_consumer_boots_without_the_web_stack(self):
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, '-c', BOOT_CONSUMER],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'conf.consumer_settings'},
+            capture_output=True,
+            check=True,
+        )
+        booted = json.loads(result.stdout)
+
+        self.assertEqual(booted['apps'], ['librarian.apps.books', 'librarian.apps.users'])
+        self.assertEqual(booted['web_stack'], [])
@@ -17,6 +17,7 @@ from pagekeeper.config import AppConfig
 from pagekeeper.helpers import create_token, hash_password, initialize_database
 
 from librarian.apps.books.models import Book, BorrowedBook
+from librarian.apps.users.models import DirectoryUser
 
 
 class TestViews(TestCase):
@@ -94,6 +95,13 @@ class TestViews(TestCase):
                 'hashed_password': hash_password('password123'),
             }
         )
+        DirectoryUser.objects.create(
+            id=user_id,
+            email=email,
+            is_admin=is_admin,
+            last_name=last_name,
+            first_name=first_name,
+        )
         return user_id
 
     def get_token(self, user_id, is_admin=False):
@@ -168,6 +176,20 @@ class TestViews(TestCase):
         self.assertEqual(user_data['user']['email'], 'user@library.com')
         self.assertEqual(len(user_data['borrowed_books']), 2)
 
+    def test_user_borrowed_books_api_view_lists_borrowers_missing_from_the_directory(self):
+        BorrowedBook.objects.filter(id='borrowed_1984').update(borrower='user_not_synced_yet')
+
+        response = self.client.get(reverse('user-borrowed-book-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        users = {item['user']['id']: item for item in response.data['data']}
+        self.assertEqual(users.keys(), {self.regular_user, 'user_not_synced_yet'})
+        self.assertEqual(
+            users['user_not_synced_yet']['user'],
+            {'id': 'user_not_synced_yet', 'email': None, 'first_name': None, 'last_name': None},
+        )
+        self.assertEqual(len(users['user_not_synced_yet']['borrowed_books']), 1)
+
     def test_user_borrowed_books_api_view_empty(self):
         # Return all borrowed books
         BorrowedBook.objects.all().delete()
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 
 from django.conf import settings
-from django.db.models import F
+from django.db.models import F, OuterRef, Subquery
 from django.db.models.functions import JSONObject
 from django.contrib.postgres.aggregates import ArrayAgg
 
@@ -10,11 +10,9 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, CreateAPIView, GenericAPIView
 
-from pagekeeper import FetchUsersRequest
-
 from librarian.common.responses import success_response
 from librarian.apps.books.models import Book, BorrowedBook
-from librarian.common.authentication import init_authentication_service
+from librarian.apps.users.models import DirectoryUser
 from librarian.apps.books.serializers import BookSerializer, UserSerializer, DummySerializer, BorrowedBookSerializer
 
 if TYPE_CHECKING:
@@ -25,23 +23,12 @@ class EnrolledUsersAPIView(ListAPIView):
     """Endpoint to fetch all users enrolled in the library."""
 
     serializer_class = UserSerializer
+    # admin users are left out since they dont akshually enroll
+    queryset = DirectoryUser.objects.filter(is_admin=False).order_by('email')
 
     def list(self, request, *args, **kwargs):
-        auth_service = init_authentication_service()
-        response = auth_service.FetchUsers(FetchUsersRequest())
-
-        # remove admin users from the response since they dont akshually enroll
-        users = [
-            {
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'email': user.email,
-                'id': user.id,
-            }
-            for user in response.users
-            if not user.is_admin
-        ]
-        return success_response(users)
+        response = super().list(request, *args, **kwargs)
+        return success_response(response.data)
 
 
 class DeleteBookAPIView(GenericAPIView):
@@ -105,10 +92,16 @@ class UserBorrowedBooksAPIView(APIView):
     """Endpoint to fetch users and the books they have borrowed."""
 
     def get_grouped_borrowed_books(self):
+        # borrowers the directory has not caught up with yet are listed without their details.
+        borrowers = DirectoryUser.objects.filter(id=OuterRef('borrower'))
         return (
             BorrowedBook.objects.filter(is_returned=False)
-            .select_related('book')
-            .values('borrower')
+            .annotate(
+                email=Subquery(borrowers.values('email')),
+                last_name=Subquery(borrowers.values('last_name')),
+                first_name=Subquery(borrowers.values('first_name')),
+            )
+            .values('borrower', 'email', 'first_name', 'last_name')
             .annotate(
                 borrowed_books=ArrayAgg(
                     JSONObject(
@@ -126,32 +119,18 @@ class UserBorrowedBooksAPIView(APIView):
             .order_by('borrower')
         )
 
-    def fetch_user_details(self, borrower_ids):
-        auth_service = init_authentication_service()
-        response = auth_service.FetchUsers(FetchUsersRequest(ids=borrower_ids))
-        return {user.id: user for user in response.users}
-
     @swagger_auto_schema(responses={status.HTTP_200_OK: DummySerializer})
     def get(self, request):
-        grouped_books = self.get_grouped_borrowed_books()
-        borrower_ids = [item['borrower'] for item in grouped_books]
-        user_details = self.fetch_user_details(borrower_ids)
-
-        result = []
-        for item in grouped_books:
-            borrower_id = item['borrower']
-            user = user_details.get(borrower_id)
-            if user:
-                result.append(
-                    {
-                        'user': {
-                            'id': user.id,
-                            'email': user.email,
-                            'first_name': user.first_name,
-                            'last_name': user.last_name,
-                        },
-                        'borrowed_books': item['borrowed_books'],
-                    }
-                )
-
+        result = [
+            {
+                'user': {
+                    'id': item['borrower'],
+                    'email': item['email'],
+                    'first_name': item['first_name'],
+                    'last_name': item['last_name'],
+                },
+                'borrowed_books': item['borrowed_books'],
+            }
+            for item in self.get_grouped_borrowed_books()
+        ]
         return success_response(result)
@@ -0,0 +1,47 @@
+import logging
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from pagekeeper import FetchUsersRequest
+
+from librarian.apps.users.models import DirectoryUser
+from librarian.common.authentication import init_authentication_service
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Copy every pagekeeper user into the local user directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=500, help='number of users fetched per request')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        auth_service = init_authentication_service()
+        page_size = options['page_size']
+
+        page, synced = 1, 0
+        while True:
+            response = auth_service.FetchUsers(FetchUsersRequest(page=page, page_size=page_size))
+            if not response.users:
+                break
+
+            DirectoryUser.upsert_many(
+                {
+                    'id': user.id,
+                    'email': user.email,
+                    'is_admin': user.is_admin,
+                    'last_name': user.last_name,
+                    'first_name': user.first_name,
+                }
+                for user in response.users
+            )
+            synced += len(response.users)
+            logger.info('Synced %d of %d users', synced, response.total_users)
+
+            if synced >= response.total_users:
+                break
+            page += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Synced {synced} users from pagekeeper'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 11:19
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryUser',
+            fields=[
+                ('id', models.CharField(max_length=27, primary_key=True, serialize=False, unique=True)),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('last_name', models.CharField(max_length=200)),
+                ('first_name', models.CharField(max_length=200)),
+                ('is_admin', models.BooleanField(db_index=True, default=False)),
+                ('synced_at', models.DateTimeField(auto_now=True, verbose_name='synced at')),
+            ],
+        ),
+    ]
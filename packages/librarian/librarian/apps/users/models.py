@@ -1 +1,44 @@
-# Create your models here.
+from typing import TYPE_CHECKING
+
+from django.db import models
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from bookcourier import UserData
+
+
+class DirectoryUser(models.Model):
+    """A local replica of a pagekeeper user.
+
+    Rows are bulk loaded by the `sync_users` command and kept current from `user_registered` events.
+    """
+
+    id = models.CharField(max_length=27, unique=True, primary_key=True)
+
+    email = models.EmailField(db_index=True)
+    last_name = models.CharField(max_length=200)
+    first_name = models.CharField(max_length=200)
+    is_admin = models.BooleanField(default=False, db_index=True)
+    synced_at = models.DateTimeField('synced at', auto_now=True)
+
+    def __str__(self):
+        return self.email
+
+    @classmethod
+    def upsert_many(cls, users: 'Iterable[UserData]') -> None:
+        cls.objects.bulk_create(
+            [
+                cls(
+                    id=user['id'],
+                    email=user['email'],
+                    is_admin=user['is_admin'],
+                    last_name=user['last_name'],
+                    first_name=user['first_name'],
+                )
+                for user in users
+            ],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=['email', 'is_admin', 'last_name', 'first_name', 'synced_at'],
+        )
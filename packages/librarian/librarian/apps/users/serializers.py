@@ -2,6 +2,7 @@ from rest_framework import serializers
 
 from pagekeeper import RegisterRequest
 
+from librarian.apps.users.models import DirectoryUser
 from librarian.common.authentication import init_authentication_service
 
 
@@ -22,6 +23,17 @@ class AdminRegistrationSerializer(serializers.Serializer):
                 first_name=validated_data['first_name'],
             )
         )
+        DirectoryUser.upsert_many(
+            [
+                {
+                    'is_admin': True,
+                    'id': response.id,
+                    'email': validated_data['email'],
+                    'last_name': validated_data['last_name'],
+                    'first_name': validated_data['first_name'],
+                }
+            ]
+        )
         return response.id
 
 
@@ -0,0 +1,76 @@
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.core.management import call_command
+
+from librarian.apps.users.models import DirectoryUser
+from librarian.apps.books.management.commands.process_events import Command as ProcessEventsCommand
+
+
+class FakeAuthService:
+    def __init__(self, users):
+        self.users = users
+        self.requests = []
+
+    def FetchUsers(self, request):  # noqa: N802
+        self.requests.append((request.page, request.page_size))
+        start = (request.page - 1) * request.page_size
+        page = self.users[start : start + request.page_size]
+        return SimpleNamespace(users=page, total_users=len(self.users))
+
+
+def make_user(index, is_admin=False):
+    return SimpleNamespace(
+        id=f'user_{index}',
+        email=f'user{index}@library.com',
+        is_admin=is_admin,
+        last_name='Smith',
+        first_name=f'John {index}',
+    )
+
+
+class SyncUsersCommandTest(TestCase):
+    def test_all_pages_are_synced(self):
+        auth_service = FakeAuthService([make_user(i, is_admin=i == 0) for i in range(5)])
+        with patch(
+            'librarian.apps.users.management.commands.sync_users.init_authentication_service',
+            return_value=auth_service,
+        ):
+            call_command('sync_users', page_size=2, stdout=StringIO())
+
+        self.assertEqual(auth_service.requests, [(1, 2), (2, 2), (3, 2)])
+        self.assertEqual(DirectoryUser.objects.count(), 5)
+        self.assertTrue(DirectoryUser.objects.get(id='user_0').is_admin)
+
+    def test_existing_users_are_refreshed(self):
+        DirectoryUser.objects.create(id='user_1', email='old@library.com', last_name='Old', first_name='Name')
+        auth_service = FakeAuthService([make_user(1)])
+        with patch(
+            'librarian.apps.users.management.commands.sync_users.init_authentication_service',
+            return_value=auth_service,
+        ):
+            call_command('sync_users', stdout=StringIO())
+
+        user = DirectoryUser.objects.get(id='user_1')
+        self.assertEqual(user.email, 'user1@library.com')
+        self.assertEqual(user.first_name, 'John 1')
+
+
+class UserRegisteredEventTest(TestCase):
+    def test_registered_users_are_added_to_the_directory(self):
+        ProcessEventsCommand().process_event(
+            {
+                'event': 'user_registered',
+                'user': {
+                    'id': 'user_new',
+                    'email': 'new@library.com',
+                    'is_admin': False,
+                    'last_name': 'Doe',
+                    'first_name': 'Jane',
+                },
+            }
+        )
+
+        self.assertEqual(DirectoryUser.objects.get(id='user_new').email, 'new@library.com')
@@ -1,12 +1,27 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from pathlib import Path
+from functools import cache
+from collections import OrderedDict
+from collections.abc import Callable
+
+import jwt
 import grpc
 
 from django.conf import settings
+from django.core.cache import caches
 
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication, get_authorization_header
 
 from pagekeeper import VerifyRequest, PageKeeperStub
 
+logger = logging.getLogger(__name__)
+
 
 class CustomUser:
     def __init__(self, user_proto):
@@ -18,13 +33,162 @@ class CustomUser:
         self.last_name = user_proto.last_name
         self.first_name = user_proto.first_name
 
+    @classmethod
+    def from_claims(cls, claims):
+        return cls(
+            SimpleNamespace(
+                id=claims['user_id'],
+                email=claims.get('email', ''),
+                is_admin=claims.get('is_admin', False),
+                last_name=claims.get('last_name', ''),
+                first_name=claims.get('first_name', ''),
+            )
+        )
+
     @property
     def is_anonymous(self):
         return False
 
 
+class KeySet:
+    """Signing keys and revocations used to verify access tokens without calling pagekeeper.
+
+    When `path` is set, it points to a JSON document of the form
+    `{"keys": ["<secret>", ...], "revoked": {"<user_id>": <issued-before timestamp>}}` which is
+    re-read whenever it changes, at most once every `refresh_interval` seconds. Otherwise the
+    static `keys` are used and nothing is revoked.
+    """
+
+    def __init__(self, *, keys: list[str], path: str | None, refresh_interval: float) -> None:
+        self.path = Path(path) if path else None
+        self.refresh_interval = refresh_interval
+        self.keys = keys
+        self.revoked: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._mtime: float | None = None
+        self._checked_at = float('-inf')
+
+    def refresh(self) -> None:
+        if self.path is None or time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = self.path.stat().st_mtime
+                if mtime == self._mtime:
+                    return
+
+                document = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                logger.exception('Failed to load authentication key set from %s', self.path)
+                return
+
+            self.keys = document.get('keys', [])
+            self.revoked = document.get('revoked', {})
+            self._mtime = mtime
+
+    def decode(self, token: str) -> dict:
+        self.refresh()
+        for key in self.keys:
+            try:
+                return jwt.decode(token, key, algorithms=['HS256'], options={'require': ['exp', 'user_id']})
+            except jwt.InvalidSignatureError:
+                continue
+
+        raise jwt.InvalidSignatureError
+
+    def is_revoked(self, claims: dict) -> bool:
+        revoked_before = self.revoked.get(claims['user_id'])
+        return revoked_before is not None and claims.get('iat', 0) <= revoked_before
+
+
+class InMemoryTokenCache:
+    """A thread-safe, process-local LRU cache of verified users."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, CustomUser]] = OrderedDict()
+
+    def get(self, key: str) -> CustomUser | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key: str, user: CustomUser, timeout: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DjangoTokenCache:
+    """Stores verified users in one of the configured Django cache backends."""
+
+    def __init__(self, alias: str) -> None:
+        self.alias = alias
+
+    def get(self, key: str) -> CustomUser | None:
+        return caches[self.alias].get(key)
+
+    def set(self, key: str, user: CustomUser, timeout: float) -> None:
+        caches[self.alias].set(key, user, timeout)
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.result = None
+        self.error: Exception | None = None
+        self.done = threading.Event()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single execution."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], CustomUser]) -> CustomUser:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+
 class JWTAuthentication(BaseAuthentication):
     keyword = 'Bearer'
+    verifications = SingleFlight()
 
     def authenticate(self, request):
         auth = get_authorization_header(request).split()
@@ -48,15 +212,85 @@ class JWTAuthentication(BaseAuthentication):
         return self.authenticate_credentials(token)
 
     def authenticate_credentials(self, key):
+        if settings.AUTHENTICATION_MODE == 'offline':
+            return (self.verify_credentials_offline(key), None)
+
+        token_cache = get_token_cache()
+        if token_cache is None:
+            return (self.verify_credentials(key), None)
+
+        cache_key = f'pagekeeper:token:{hashlib.sha256(key.encode()).hexdigest()}'
+        user = token_cache.get(cache_key)
+        if user is None:
+            user = self.verifications.do(cache_key, lambda: self.verify_and_cache(key, cache_key, token_cache))
+
+        return (user, None)
+
+    def verify_and_cache(self, key, cache_key, token_cache):
+        user = self.verify_credentials(key)
+        timeout = get_cache_timeout(key)
+        if timeout > 0:
+            token_cache.set(cache_key, user, timeout)
+
+        return user
+
+    def verify_credentials(self, key):
         auth_service = init_authentication_service()
 
         try:
             response = auth_service.Verify(VerifyRequest(access_token=key))
-            user = CustomUser(response.user)
         except grpc.RpcError as e:
             raise AuthenticationFailed(e.details) from e
 
-        return (user, None)
+        return CustomUser(response.user)
+
+    def verify_credentials_offline(self, key):
+        keyset = get_keyset()
+        try:
+            claims = keyset.decode(key)
+        except jwt.InvalidTokenError as e:
+            msg = 'access token is invalid'
+            raise AuthenticationFailed(msg) from e
+
+        if keyset.is_revoked(claims):
+            msg = 'access token has been revoked'
+            raise AuthenticationFailed(msg)
+
+        return CustomUser.from_claims(claims)
+
+
+def get_cache_timeout(token: str) -> float:
+    """Return how long a verified token may be cached, never outliving its own `exp` claim."""
+    try:
+        claims = jwt.decode(token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return 0
+
+    timeout = settings.AUTHENTICATION_CACHE_TIMEOUT
+    if 'exp' in claims:
+        timeout = min(timeout, claims['exp'] - time.time())
+
+    return timeout
+
+
+@cache
+def get_token_cache() -> InMemoryTokenCache | DjangoTokenCache | None:
+    if settings.AUTHENTICATION_CACHE_TIMEOUT <= 0:
+        return None
+
+    if settings.AUTHENTICATION_CACHE_BACKEND == 'django':
+        return DjangoTokenCache(settings.AUTHENTICATION_CACHE_ALIAS)
+
+    return InMemoryTokenCache(settings.AUTHENTICATION_CACHE_MAX_ENTRIES)
+
+
+@cache
+def get_keyset() -> KeySet:
+    return KeySet(
+        keys=settings.AUTHENTICATION_SIGNING_KEYS,
+        path=settings.AUTHENTICATION_KEYSET_PATH,
+        refresh_interval=settings.AUTHENTICATION_KEYSET_REFRESH_INTERVAL,
+    )
 
 
 def init_authentication_service():
@@ -14,7 +14,7 @@ from pathlib import Path
 
 from environs import Env
 
-from bookcourier import BookCourier
+from bookcourier import BookCourier, RetryPolicy
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -186,10 +186,55 @@ CORS_ALLOW_ALL_ORIGINS = True
 # ==============================================================================
 AUTHENTICATION_SERVER_URL = env.str('LIBRARIAN_AUTHENTICATION_SERVER_URL')
 
+# `remote` verifies every token with pagekeeper, `offline` checks signatures locally against the key set.
+AUTHENTICATION_MODE = env.str('LIBRARIAN_AUTHENTICATION_MODE', 'remote')
+
+AUTHENTICATION_SIGNING_KEYS = env.list('LIBRARIAN_AUTHENTICATION_SIGNING_KEYS', default=[])
+
+AUTHENTICATION_KEYSET_PATH = env.str('LIBRARIAN_AUTHENTICATION_KEYSET_PATH', None)
+
+AUTHENTICATION_KEYSET_REFRESH_INTERVAL = env.int('LIBRARIAN_AUTHENTICATION_KEYSET_REFRESH_INTERVAL', 30)
+
+# verified tokens are cached in-process (`memory`) or in a Django cache (`django`); a timeout of 0 disables caching.
+AUTHENTICATION_CACHE_BACKEND = env.str('LIBRARIAN_AUTHENTICATION_CACHE_BACKEND', 'memory')
+
+AUTHENTICATION_CACHE_ALIAS = env.str('LIBRARIAN_AUTHENTICATION_CACHE_ALIAS', 'default')
+
+AUTHENTICATION_CACHE_TIMEOUT = env.int('LIBRARIAN_AUTHENTICATION_CACHE_TIMEOUT', 60)
+
+AUTHENTICATION_CACHE_MAX_ENTRIES = env.int('LIBRARIAN_AUTHENTICATION_CACHE_MAX_ENTRIES', 10_000)
+
 # ==============================================================================
 # BOOKCOURIER SETTINGS
 # ==============================================================================
-BOOKCOURIER = BookCourier(env.str('LIBRARIAN_RABBITMQ_URL'))
+BOOKCOURIER = BookCourier(
+    # a `postgresql://`, `sqlite:///` or `memory://` transport URL takes the place of RabbitMQ when set.
+    env.str('LIBRARIAN_EVENTS_TRANSPORT_URL', None) or env.str('LIBRARIAN_RABBITMQ_URL'),
+    publisher_confirms=env.bool('LIBRARIAN_RABBITMQ_PUBLISHER_CONFIRMS', False),
+    background_publishing=env.bool('LIBRARIAN_RABBITMQ_BACKGROUND_PUBLISHING', False),
+    max_pending_publishes=env.int('LIBRARIAN_RABBITMQ_MAX_PENDING_PUBLISHES', 10_000),
+    # `block`, `drop` or `raise` once `max_pending_publishes` events are waiting to be published.
+    overflow_policy=env.str('LIBRARIAN_RABBITMQ_OVERFLOW_POLICY', 'block'),
+    # `application/json` or `application/msgpack`, consumers accept either.
+    content_type=env.str('LIBRARIAN_RABBITMQ_CONTENT_TYPE', 'application/json'),
+    # connections idle this long are checked before their next use, so one the broker dropped is replaced up front.
+    keepalive_interval=env.float('LIBRARIAN_RABBITMQ_KEEPALIVE_INTERVAL', 20),
+    spool_directory=env.str('LIBRARIAN_EVENTS_SPOOL_DIRECTORY', str(BASE_DIR / 'spool')),
+    bulk_prefetch_ratio=env.float('LIBRARIAN_EVENTS_BULK_PREFETCH_RATIO', 0.2),
+    propagation_outlier_seconds=env.float('LIBRARIAN_EVENTS_PROPAGATION_OUTLIER_SECONDS', 5),
+    # failed events are retried after exponentially growing delays, then parked for `manage.py replay_events`.
+    retry_policy=RetryPolicy(
+        max_retries=env.int('LIBRARIAN_EVENTS_MAX_RETRIES', 4),
+        base_delay=env.float('LIBRARIAN_EVENTS_RETRY_BASE_DELAY', 1),
+        multiplier=env.float('LIBRARIAN_EVENTS_RETRY_MULTIPLIER', 5),
+    ),
+)
+
+# ids of applied events are kept this many seconds, so redeliveries within it are skipped.
+EVENTS_DEDUP_TTL = env.int('LIBRARIAN_EVENTS_DEDUP_TTL', 7 * 24 * 60 * 60)
+
+# `process_events` serves consumer metrics for Prometheus on this port, when set.
+EVENTS_METRICS_PORT = env.int('LIBRARIAN_EVENTS_METRICS_PORT', None)
 
 # ==============================================================================
 # LOGGING SETTINGS
@@ -9,11 +9,21 @@ from pymongo.database import Database
 from argon2.exceptions import VerifyMismatchError
 
 
-def create_token(*, secret: str, user_id: str, is_admin: bool, expiration: datetime.timedelta) -> str:
+def create_token(
+    *,
+    secret: str,
+    user_id: str,
+    is_admin: bool,
+    expiration: datetime.timedelta,
+    profile: dict[str, str] | None = None,
+) -> str:
+    now = datetime.datetime.now(datetime.UTC)
     payload = {
+        **(profile or {}),
+        'iat': now,
         'user_id': user_id,
         'is_admin': is_admin,
-        'exp': datetime.datetime.now(datetime.UTC) + expiration,
+        'exp': now + expiration,
     }
     return jwt.encode(payload, secret, algorithm='HS256')
 
@@ -32,6 +42,7 @@ def initialize_database(*, url: str, db_name: str) -> Database:
     database = client[db_name]
 
     database.users.create_index([('email', pymongo.ASCENDING)], unique=True)
+    database.users.create_index([('user_id', pymongo.ASCENDING)])
     return database
 
 
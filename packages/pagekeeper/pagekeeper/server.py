@@ -2,6 +2,7 @@ import logging
 from concurrent.futures import ThreadPoolExecutor
 
 import grpc
+import pymongo
 from pymongo.errors import DuplicateKeyError
 from pymongo.database import Database
 
@@ -74,6 +75,11 @@ class PageKeeperService(pagekeeper_pb2_grpc.PageKeeperServicer):
             is_admin=result['is_admin'],
             secret=self.config.SECRET_KEY,
             expiration=self.config.ACCESS_TOKEN_EXPIRATION,
+            profile={
+                'email': result['email'],
+                'last_name': result['last_name'],
+                'first_name': result['first_name'],
+            },
         )
 
         return pagekeeper_pb2.AuthenticateResponse(
@@ -133,7 +139,8 @@ class PageKeeperService(pagekeeper_pb2_grpc.PageKeeperServicer):
 
         skip = (page - 1) * page_size
         total_users = self.database.users.count_documents(query)
-        user_entries = self.database.users.find(query).skip(skip).limit(page_size)
+        # a stable order, so paging never skips a user. one registered meanwhile at most repeats another across pages.
+        user_entries = self.database.users.find(query).sort('user_id', pymongo.ASCENDING).skip(skip).limit(page_size)
 
         users = [
             pagekeeper_pb2.User(
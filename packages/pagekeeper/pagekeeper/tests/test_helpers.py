@@ -25,6 +25,23 @@ def test_create_and_verify_token() -> None:
     assert payload['is_admin'] == is_admin
 
 
+def test_create_token_with_profile() -> None:
+    profile = {'email': 'jane@library.com', 'first_name': 'Jane', 'last_name': 'Doe'}
+    token = create_token(
+        secret='test_secret',
+        user_id='test_user',
+        is_admin=True,
+        expiration=datetime.timedelta(hours=1),
+        profile=profile,
+    )
+    payload = verify_token(token=token, secret='test_secret')
+
+    assert payload is not None
+    assert payload['user_id'] == 'test_user'
+    assert payload['iat'] < payload['exp']
+    assert {key: payload[key] for key in profile} == profile
+
+
 def test_verify_token_expired() -> None:
     secret = 'test_secret'
     user_id = 'test_user'
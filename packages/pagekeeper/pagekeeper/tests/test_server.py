@@ -2,6 +2,7 @@ import grpc
 import pytest
 
 from pagekeeper.protos import pagekeeper_pb2
+from pagekeeper.helpers import verify_token
 
 
 def test_register(stub):
@@ -40,7 +41,7 @@ def test_register_duplicate_email(stub):
     assert excinfo.value.code() == grpc.StatusCode.ALREADY_EXISTS
 
 
-def test_authenticate_success(stub):
+def test_authenticate_success(stub, config):
     email = 'sophia.lee@example.com'
     password = 'SecureP@ss123!'
     register_request = pagekeeper_pb2.RegisterRequest(
@@ -58,6 +59,11 @@ def test_authenticate_success(stub):
     assert response.access_token
     assert response.user.email == email
 
+    claims = verify_token(token=response.access_token, secret=config.SECRET_KEY)
+    assert claims['email'] == email
+    assert claims['first_name'] == 'Sophia'
+    assert claims['last_name'] == 'Lee'
+
 
 def test_authenticate_failure(stub):
     auth_request = pagekeeper_pb2.AuthenticateRequest(email='nonexistent@example.com', password='WrongP@ssword!')
@@ -189,6 +195,10 @@ def test_fetch_users_without_ids(stub):
     unique_emails = {user.email for user in response_page1.users}.union(user.email for user in response_page2.users)
     assert len(unique_emails) == 60
 
+    # pages follow user id order
+    user_ids = [user.id for user in response_page1.users] + [user.id for user in response_page2.users]
+    assert user_ids == sorted(user_ids)
+
     # Try to fetch a non-existent page
     response_non_existent = stub.FetchUsers(pagekeeper_pb2.FetchUsersRequest(page=3, page_size=30))
     assert response_non_existent.message == 'users fetched successfully'